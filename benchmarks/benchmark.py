@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+import sys
+if sys.version_info < (3, 4):
+    raise Exception("Must use Python 3.4 or later")
+
+import json
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmark the tree this script lives in, not an installed copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import hpOneView as hpov
+from hpOneView.mockappliance import mock_appliance
+
+
+# Metrics where a larger value is better; for the others smaller is better
+HigherIsBetter = ['ops_per_sec', 'mb_per_sec']
+Compared = ['ops_per_sec', 'mb_per_sec', 'p50_ms', 'p99_ms']
+
+# With fewer latency samples than this p99 is really the maximum, which is
+# too noisy to fail a run on
+MinPercentileSamples = {'p99_ms': 100}
+
+# Tail latencies jitter by a few milliseconds from run to run, so these
+# must also grow by a minimum number of milliseconds to be a regression
+TailMetrics = ['p99_ms']
+
+# Throughput of measured benchmarks is the median rate over this many equal
+# slices of the run, so a stall in one slice does not drag the figure down
+RateWindows = 10
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def summarize(latencies, elapsed, operations=None):
+    if operations is None:
+        operations = len(latencies)
+    return {
+        'operations': operations,
+        'samples': len(latencies),
+        'seconds': round(elapsed, 4),
+        'ops_per_sec': round(operations / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(1000 * sum(latencies) / len(latencies), 3)
+        if latencies else 0.0,
+        'p50_ms': round(1000 * percentile(latencies, 50), 3),
+        'p99_ms': round(1000 * percentile(latencies, 99), 3),
+        'max_ms': round(1000 * max(latencies), 3) if latencies else 0.0}
+
+
+def windowed_rate(finished, start, elapsed):
+    # Median operations/sec over RateWindows equal slices of the run
+    counts = [0] * RateWindows
+    for end in finished:
+        index = int((end - start) / elapsed * RateWindows)
+        counts[min(index, RateWindows - 1)] += 1
+    return percentile(counts, 50) * RateWindows / elapsed
+
+
+def measure(func, iterations, threads=1, afterWarmup=None):
+    # Call func iterations times from threads threads and summarize the
+    # latency of each call and the overall throughput. One untimed call
+    # first warms up connections, caches and lazily built state;
+    # afterWarmup, if given, is called once it is done.
+    func()
+    if afterWarmup is not None:
+        afterWarmup()
+    latencies = []
+    finished = []
+
+    def worker(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            func()
+            end = time.perf_counter()
+            latencies.append(end - start)
+            finished.append(end)
+
+    shares = [iterations // threads + (1 if i < iterations % threads else 0)
+              for i in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker, n) for n in shares if n]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    result = summarize(latencies, elapsed)
+    if elapsed and len(finished) >= RateWindows * 10:
+        result['ops_per_sec'] = round(windowed_rate(finished, start,
+                                                    elapsed), 2)
+    return result
+
+
+def login(appliance):
+    con = hpov.connection(appliance.get_host())
+    con.login({'userName': 'Administrator', 'password': 'benchmark'})
+    return con
+
+
+def start_appliance(args, **kwargs):
+    kwargs.setdefault('latency', args.latency)
+    kwargs.setdefault('maxPageSize', args.pageSize)
+    return mock_appliance(seed=args.seed, **kwargs).start()
+
+
+###############################################################################
+# Benchmarks
+###############################################################################
+def bench_get(args):
+    appliance = start_appliance(args)
+    try:
+        con = login(appliance)
+        result = measure(lambda: con.get(hpov.uri['version']),
+                         args.requests)
+    finally:
+        appliance.stop()
+    return result
+
+
+def bench_get_concurrent(args):
+    appliance = start_appliance(args)
+    try:
+        con = login(appliance)
+        result = measure(lambda: con.get(hpov.uri['version']),
+                         args.requests, args.threads)
+        result['threads'] = args.threads
+        result['connections'] = appliance.get_stats().get('connections', 0)
+    finally:
+        appliance.stop()
+    return result
+
+
+def bench_get_servers(args):
+    appliance = start_appliance(args, servers=args.servers)
+    try:
+        con = login(appliance)
+        srv = hpov.servers(con)
+        result = measure(srv.get_servers, args.repeat, 1,
+                         appliance.reset_stats)
+        result['members'] = args.servers
+        result['requests_per_op'] = \
+            appliance.get_stats().get('GET', 0) / float(args.repeat)
+    finally:
+        appliance.stop()
+    return result
+
+
+def bench_get_alerts(args):
+    appliance = start_appliance(args, alerts=args.alerts)
+    try:
+        con = login(appliance)
+        act = hpov.activity(con)
+        result = measure(act.get_alerts, args.repeat, 1,
+                         appliance.reset_stats)
+        result['members'] = args.alerts
+        result['requests_per_op'] = \
+            appliance.get_stats().get('GET', 0) / float(args.repeat)
+    finally:
+        appliance.stop()
+    return result
+
+
+def bench_wait4task(args):
+    # Each thread waits for its own task; the time over taskDuration is the
+    # cost of noticing that a task has finished
+    appliance = start_appliance(args, taskDuration=args.taskDuration)
+    try:
+        con = login(appliance)
+        act = hpov.activity(con)
+
+        def wait():
+            task, body = con.post('/rest/benchmark-actions', {})
+            act.wait4task(task, tout=600)
+
+        result = measure(wait, args.tasks, args.threads,
+                         appliance.reset_stats)
+        result['task_duration'] = args.taskDuration
+        result['polls_per_task'] = \
+            appliance.get_stats().get('GET', 0) / float(args.tasks)
+    finally:
+        appliance.stop()
+    return result
+
+
+def bench_wait4tasks(args):
+    appliance = start_appliance(args, taskDuration=args.taskDuration)
+    try:
+        con = login(appliance)
+        act = hpov.activity(con)
+        latencies = []
+        start = None
+        # The first round only warms up
+        for index in range(args.repeat + 1):
+            tasks = [con.post('/rest/benchmark-actions', {})[0]
+                     for _ in range(args.tasks)]
+            begin = time.perf_counter()
+            act.wait4tasks(tasks, tout=600)
+            if start is None:
+                appliance.reset_stats()
+                start = time.perf_counter()
+                continue
+            latencies.append(time.perf_counter() - begin)
+        result = summarize(latencies, time.perf_counter() - start,
+                           args.tasks * args.repeat)
+        result['tasks'] = args.tasks
+        result['task_duration'] = args.taskDuration
+        result['polls_per_task'] = appliance.get_stats().get('GET', 0) / \
+            float(args.tasks * args.repeat)
+    finally:
+        appliance.stop()
+    return result
+
+
+def bench_post_multipart(args):
+    # A sparse file, so that multi-GB sizes do not need the disk space
+    size = int(args.uploadMb * 1024 * 1024)
+    fd, path = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    appliance = start_appliance(args, latency=0)
+    try:
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        con = login(appliance)
+        result = measure(lambda: con.post_multipart(hpov.uri['archive'], '',
+                                                    path, 'benchmark.bin'),
+                         args.repeat)
+        seconds = result['seconds']
+        result['bytes'] = size
+        result['mb_per_sec'] = round(size * args.repeat / 1048576.0 /
+                                     seconds, 2) if seconds else 0.0
+    finally:
+        appliance.stop()
+        os.remove(path)
+    return result
+
+
+def bench_download(args):
+    size = int(args.uploadMb * 1024 * 1024)
+    fd, path = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    appliance = start_appliance(args, latency=0, downloadSize=size)
+    try:
+        con = login(appliance)
+        result = measure(lambda: con.download(hpov.uri['audit-logs-download'],
+                                              path), args.repeat)
+        seconds = result['seconds']
+        result['bytes'] = size
+        result['mb_per_sec'] = round(size * args.repeat / 1048576.0 /
+                                     seconds, 2) if seconds else 0.0
+    finally:
+        appliance.stop()
+        os.remove(path)
+    return result
+
+
+def bench_create_enet_networks(args):
+    appliance = start_appliance(args, taskDuration=args.taskDuration)
+    try:
+        con = login(appliance)
+        net = hpov.networking(con)
+        bw = hpov.make_bw_dict(maxbw=10000, minbw=1000)
+        net.create_enet_networks('warmup-', 1, args.networks, bw)
+        latencies = []
+        start = time.perf_counter()
+        for index in range(args.repeat):
+            begin = time.perf_counter()
+            net.create_enet_networks('bench%d-' % index, 1, args.networks, bw)
+            latencies.append(time.perf_counter() - begin)
+        result = summarize(latencies, time.perf_counter() - start,
+                           args.networks * args.repeat)
+        result['networks'] = args.networks
+    finally:
+        appliance.stop()
+    return result
+
+
+Benchmarks = [
+    ('get', bench_get),
+    ('get_concurrent', bench_get_concurrent),
+    ('get_servers', bench_get_servers),
+    ('get_alerts', bench_get_alerts),
+    ('wait4task', bench_wait4task),
+    ('wait4tasks', bench_wait4tasks),
+    ('post_multipart', bench_post_multipart),
+    ('download', bench_download),
+    ('create_enet_networks', bench_create_enet_networks)]
+
+
+def median_of_runs(runs):
+    # One result with the median of every numeric metric over the runs
+    result = dict(runs[0])
+    for key, value in list(result.items()):
+        if type(value) in (int, float) and type(value) is not bool:
+            values = sorted(run[key] for run in runs)
+            middle = len(values) // 2
+            if len(values) % 2:
+                result[key] = values[middle]
+            elif type(value) is int:
+                result[key] = (values[middle - 1] + values[middle]) // 2
+            else:
+                result[key] = round((values[middle - 1] +
+                                     values[middle]) / 2.0, 4)
+    result['runs'] = len(runs)
+    return result
+
+
+###############################################################################
+# Baseline comparison
+###############################################################################
+def compare(results, baseline, threshold, minLatencyMs=0):
+    # Returns {benchmark: {metric: {...}}} and whether anything regressed
+    # by more than threshold (a fraction). A tail latency must also have
+    # grown by at least minLatencyMs.
+    comparison = {}
+    regressed = False
+    for name, metrics in list(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        comparison[name] = {}
+        for metric in Compared:
+            if metric not in metrics or not base.get(metric):
+                continue
+            minSamples = MinPercentileSamples.get(metric)
+            if minSamples and (metrics.get('samples', 0) < minSamples or
+                               base.get('samples', 0) < minSamples):
+                continue
+            change = (metrics[metric] - base[metric]) / float(base[metric])
+            if metric in HigherIsBetter:
+                worse = change < -threshold
+            else:
+                worse = change > threshold
+                if metric in TailMetrics:
+                    worse = (worse and
+                             metrics[metric] - base[metric] >= minLatencyMs)
+            regressed = regressed or worse
+            comparison[name][metric] = {'baseline': base[metric],
+                                        'current': metrics[metric],
+                                        'change': round(change, 4),
+                                        'regression': worse}
+    return comparison, regressed
+
+
+def print_comparison(comparison):
+    for name in sorted(comparison):
+        for metric, values in sorted(comparison[name].items()):
+            print(('%-22s %-12s %12s %12s %+8.1f%% %s' % (
+                name, metric, values['baseline'], values['current'],
+                100 * values['change'],
+                'REGRESSION' if values['regression'] else '')))
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=True,
+                        formatter_class=argparse.RawTextHelpFormatter,
+                                     description='''
+    Benchmark the library against a local mock appliance and write the
+    results as JSON, optionally comparing them with a stored baseline.
+
+    Usage: ''')
+    parser.add_argument('-k', dest='select', required=False, nargs='+',
+                        choices=[name for name, _ in Benchmarks],
+                        help='''
+    Benchmarks to run (default all)''')
+    parser.add_argument('-o', dest='output', required=False,
+                        help='''
+    File to write the JSON results to (default standard output)''')
+    parser.add_argument('-b', dest='baseline', required=False,
+                        help='''
+    JSON results of an earlier run to compare against; exits with status 1
+    if any benchmark regressed''')
+    parser.add_argument('-t', dest='threshold', type=float, required=False,
+                        default=0.2,
+                        help='''
+    Fraction a metric may get worse before it is reported as a regression''')
+    parser.add_argument('-m', dest='min_latency_ms', type=float,
+                        required=False, default=5.0,
+                        help='''
+    Milliseconds p99 must grow by, on top of -t, to be a regression''')
+    parser.add_argument('-l', dest='latency', type=float, required=False,
+                        default=0.001,
+                        help='''
+    Seconds of simulated latency per request''')
+    parser.add_argument('-c', dest='pageSize', type=int, required=False,
+                        default=500,
+                        help='''
+    Maximum page size of the mock appliance''')
+    parser.add_argument('-n', dest='requests', type=int, required=False,
+                        default=2000,
+                        help='''
+    Requests for the get benchmarks''')
+    parser.add_argument('-w', dest='threads', type=int, required=False,
+                        default=16,
+                        help='''
+    Client threads for the concurrent benchmarks''')
+    parser.add_argument('-R', dest='runs', type=int, required=False,
+                        default=3,
+                        help='''
+    Times each benchmark is run; the median of each metric is reported''')
+    parser.add_argument('-r', dest='repeat', type=int, required=False,
+                        default=5,
+                        help='''
+    Repetitions of the collection, upload and bulk benchmarks''')
+    parser.add_argument('--servers', dest='servers', type=int, default=5000,
+                        help='''
+    Server hardware in the get_servers inventory''')
+    parser.add_argument('--alerts', dest='alerts', type=int, default=20000,
+                        help='''
+    Alerts in the get_alerts inventory''')
+    parser.add_argument('--tasks', dest='tasks', type=int, default=200,
+                        help='''
+    Tasks for the wait4task and wait4tasks benchmarks''')
+    parser.add_argument('--task-duration', dest='taskDuration', type=float,
+                        default=2.0,
+                        help='''
+    Seconds each mock task runs for''')
+    parser.add_argument('--upload-mb', dest='uploadMb', type=float,
+                        default=256,
+                        help='''
+    Size of the post_multipart and download file in MB''')
+    parser.add_argument('--networks', dest='networks', type=int, default=100,
+                        help='''
+    Networks for create_enet_networks''')
+    parser.add_argument('--seed', dest='seed', type=int, default=1,
+                        help='''
+    Seed for the mock inventory''')
+
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in Benchmarks:
+        if args.select and name not in args.select:
+            continue
+        sys.stderr.write('%s...\n' % name)
+        results[name] = median_of_runs([func(args)
+                                        for _ in range(max(1, args.runs))])
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': vars(args)},
+        'results': results}
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison, regressed = compare(results, baseline.get('results', {}),
+                                        args.threshold,
+                                        args.min_latency_ms)
+        report['comparison'] = comparison
+        print_comparison(comparison)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    elif not args.baseline:
+        print(output)
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    import argparse
+    sys.exit(main())
@@ -65,26 +65,25 @@ def get_server(con, srv, server_id, server_hwt, forcePowerOff):
         return None, sht
 
     # Get handle for named server and power off in necessary
-    servers = srv.get_servers()
-    located_server = None
-    for server in servers:
-        if server_id == server['name'] or server_id == server['mpIpAddress']:
-            located_server = server
-            if server['state'] != 'NoProfileApplied':
-                print('\nError: server', server_id, 'already has a profile '
-                      'defined\n')
-                sys.exit(1)
-            if server['powerState'] == 'On':
-                if forcePowerOff:
-                    srv.set_server_powerstate(server, 'Off', force=True)
-                else:
-                    print('Error: Server', server_id,
-                          ' needs to be powered off')
-                    sys.exit(1)
-            break
-    if not located_server:
+    index = srv.get_server_index()
+    server = index.get_by_name(server_id)
+    if not server:
+        server = index.get_by_mp_ip_address(server_id)
+    if not server:
         print('Server ', server_id, ' not found')
         sys.exit(1)
+    if server['state'] != 'NoProfileApplied':
+        print('\nError: server', server_id, 'already has a profile '
+              'defined\n')
+        sys.exit(1)
+    if server['powerState'] == 'On':
+        if forcePowerOff:
+            srv.set_server_powerstate(server, 'Off', force=True)
+        else:
+            print('Error: Server', server_id,
+                  ' needs to be powered off')
+            sys.exit(1)
+    located_server = server
 
     sht = con.get(server['serverHardwareTypeUri'])
     if not sht:
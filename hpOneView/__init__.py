@@ -52,6 +52,24 @@ from hpOneView.storage import *
 from hpOneView.fcsans import *
 from hpOneView.facilities import *
 from hpOneView.uncategorized import *
+from hpOneView.instrumentation import *
+from hpOneView.retry import *
+from hpOneView.throttle import *
+from hpOneView.cache import *
+from hpOneView.query import *
+from hpOneView.inventory import *
+from hpOneView.fleet import *
+from hpOneView.session import *
+from hpOneView.scmb import *
+
+# The asyncio client needs async generators
+if sys.version_info >= (3, 6):
+    from hpOneView.aconnection import *
+    from hpOneView.aactivity import *
+    from hpOneView.aservers import *
+    from hpOneView.anetworking import *
+    from hpOneView.astorage import *
+    from hpOneView.asettings import *
 
 
 def main():
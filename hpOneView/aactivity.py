@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+aactivity.py
+~~~~~~~~~~~~
+
+This module implements the Activity HP OneView REST API for asyncio
+"""
+
+__title__ = 'aactivity'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import asyncio
+import sys  # For verbose
+
+from hpOneView.common import *
+from hpOneView.activity import TaskPendingStates, get_default_poller, \
+    raise_task_error
+from hpOneView.exceptions import *
+from hpOneView.query import query_builder
+
+
+class aactivity(object):
+
+    def __init__(self, con, poller=None):
+        self._con = con
+        self._poller = poller
+
+    def set_poller(self, poller):
+        self._poller = poller
+
+    def _get_poller(self):
+        if self._poller is None:
+            return get_default_poller()
+        return self._poller
+
+    ###########################################################################
+    # Tasks
+    ###########################################################################
+    async def get_task_associated_resource(self, task):
+        if not task:
+            return {}
+        if task['type'] == 'TaskResource':
+            obj = await self._con.get(task['associatedResourceUri'])
+            tmp = {
+                'resourceName': obj['name'],
+                'associationType': None,
+                'resourceCategory': None,
+                'resourceUri': obj['uri']}
+        elif task['type'] == 'TaskResourceV2':
+            tmp = task['associatedResource']
+        else:
+            raise HPOneViewInvalidResource('Task resource is not a recognized'
+                                           ' version')
+        return tmp
+
+    async def make_task_entity_tuple(self, obj):
+        task = {}
+        entity = {}
+        if obj:
+            if obj['category'] == 'tasks' or obj['category'] == 'backups':
+                uri = ''
+                if obj['type'] == 'TaskResource':
+                    task = obj
+                    uri = obj['associatedResourceUri']
+                elif obj['type'] == 'TaskResourceV2':
+                    task = obj
+                    uri = obj['associatedResource']['resourceUri']
+                elif obj['type'] == 'BACKUP':
+                    task = await self._con.get(obj['taskUri'])
+                    uri = obj['uri']
+                else:
+                    raise HPOneViewInvalidResource('Task resource is not a'
+                                                   ' recognized version')
+                if uri:
+                    entity = await self._con.get(uri)
+                else:
+                    entity = obj
+            else:
+                raise HPOneViewUnknownType('Unknown object type')
+
+        return task, entity
+
+    async def is_task_running(self, task):
+        if 'uri' in task:
+            task = await self._con.get(task['uri'])
+            if 'taskState' in task and task['taskState'] in TaskPendingStates:
+                return True
+        return False
+
+    async def wait4task(self, task, tout=60, verbose=False, expected=None):
+        if task is None:
+            return None
+        task = await self._wait_done(task, tout, verbose, expected)
+        raise_task_error(task)
+        return task
+
+    async def _wait_done(self, task, tout, verbose, expected=None):
+        # The task once it is no longer pending, whatever its final state
+        poller = self._get_poller()
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        attempt = 0
+        while True:
+            task = await self._con.get(task['uri'])
+            if task.get('taskState') not in TaskPendingStates:
+                break
+            elapsed = loop.time() - start
+            if elapsed > tout:
+                raise HPOneViewTimeout('Waited ' + str(tout) + ' seconds for'
+                                       ' task to complete, aborting')
+            if verbose:
+                sys.stdout.write('Task still running after %d seconds   \r'
+                                 % elapsed)
+                sys.stdout.flush()
+            interval = poller.next_interval(attempt, elapsed, task, expected)
+            await asyncio.sleep(min(interval, tout - elapsed + 0.1))
+            attempt += 1
+        return task
+
+    async def wait4tasks(self, tasks, tout=60, verbose=False,
+                         raiseErrors=False):
+        # Every task is waited on concurrently from the same event loop.
+        # As with activity.wait4tasks() the final state of every task is
+        # returned in the order given; tasks that fail are returned as-is
+        # (or raised together when raiseErrors is set) and tasks that time
+        # out are raised together once all of the others have finished.
+        outcomes = await asyncio.gather(*[self._wait_task(task, tout, verbose)
+                                          for task in tasks],
+                                        return_exceptions=True)
+        results = []
+        errors = []
+        timeouts = []
+        for task, outcome in zip(tasks, outcomes):
+            if isinstance(outcome, Exception):
+                outcome = (task, outcome)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            task, error = outcome
+            results.append(task)
+            if isinstance(error, HPOneViewTimeout):
+                timeouts.append((task, error))
+            elif error is not None:
+                errors.append((task, error))
+        if timeouts:
+            e = HPOneViewTimeout('%d of %d tasks did not complete within their'
+                                 ' %s second timeout, aborting' %
+                                 (len(timeouts), len(tasks), tout))
+            e.errors = timeouts + errors
+            raise e
+        if errors and raiseErrors is True:
+            e = HPOneViewTaskError('%d of %d tasks failed' % (len(errors),
+                                                               len(tasks)))
+            e.errors = errors
+            raise e
+        return results
+
+    async def _wait_task(self, task, tout, verbose):
+        # (final task, error or None), with the error reported rather than
+        # raised so that one task cannot abort the others
+        if task is None:
+            return None, None
+        try:
+            task = await self._wait_done(task, tout, verbose)
+            raise_task_error(task)
+        except Exception as e:
+            return task, e
+        return task, None
+
+    async def get_tasks(self):
+        return await self._con.get_all_members(uri['task'])
+
+    ###########################################################################
+    # Alerts
+    ###########################################################################
+    async def get_alerts(self, AlertState='All'):
+        return [alert async for alert in self.iter_alerts(AlertState)]
+
+    def iter_alerts(self, AlertState='All', count=None):
+        if AlertState == 'All':
+            return self._con.iter_members(uri['alerts'], count)
+        else:
+            query = query_builder().where('alertState', AlertState)
+            return self._con.iter_members(query.build(uri['alerts']), count)
+
+    async def delete_alert(self, alert):
+        await self._con.delete(alert['uri'])
+
+    async def delete_alerts(self):
+        await self._con.delete(uri['alerts'])
+
+    async def update_alert(self, alert, alertMap):
+        task, moddedAlert = await self._con.put(alert['uri'], alertMap)
+        return moddedAlert
+
+    ###########################################################################
+    # Audit Logs
+    ###########################################################################
+    async def get_audit_logs(self, query=''):
+        body = await self._con.get(uri['audit-logs'] + '?' + query)
+        return get_members(body)
+
+    def iter_audit_logs(self, query='', count=None):
+        return self._con.iter_members(uri['audit-logs'] + '?' + query, count)
+
+    async def create_audit_log(self, auditLogRecord):
+        await self._con.post(uri['audit-logs'], auditLogRecord)
+        return
+
+    ###########################################################################
+    # Events
+    ###########################################################################
+    async def get_events(self, query=''):
+        body = await self._con.get(uri['events'] + '?' + query)
+        return get_members(body)
+
+    def iter_events(self, query='', count=None):
+        return self._con.iter_members(uri['events'] + '?' + query, count)
+
+    async def create_event(self, eventRecord):
+        await self._con.post(uri['events'], eventRecord)
+        return
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
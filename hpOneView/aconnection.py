@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+
+"""
+aconnection.py
+~~~~~~~~~~~~
+
+This module maintains asyncio communication with the appliance
+"""
+
+__title__ = 'aconnection'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import asyncio
+import json
+import socket
+import ssl
+import time
+
+from hpOneView.common import *
+from hpOneView.connection import choose_api_version, \
+    get_default_api_versions, get_version_info, put_version_info
+from hpOneView.exceptions import *
+from hpOneView.query import query_builder
+import hpOneView.retry as retry_module
+
+
+class aresponse(object):
+
+    def __init__(self, status, reason, headers):
+        self.status = status
+        self.reason = reason
+        self._headers = headers
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def getheaders(self):
+        return list(self._headers.items())
+
+
+class aconnection(object):
+
+    def __init__(self, applianceIp, apiVersions=None):
+        self._session = None
+        self._host = applianceIp
+        self._cred = None
+        self._apiVersions = apiVersions
+        self._apiVersion = None
+        self._headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'}
+        self._proxyHost = None
+        self._proxyPort = None
+        self._doProxy = False
+        self._sslTrustedBundle = None
+        self._sslTrustAll = True
+        self._pageSize = 500
+        self._prefetchWorkers = 4
+        self._poolSize = 8
+        self._maxConnections = 32
+        self._connSemaphore = None
+        self._pool = {}
+        self._sslContext = None
+        self._versionLock = None
+        self._retryPolicy = None
+        self._throttle = None
+
+    def set_proxy(self, proxyHost, proxyPort):
+        self._proxyHost = proxyHost
+        self._proxyPort = proxyPort
+        self._doProxy = True
+
+    def set_trusted_ssl_bundle(self, sslBundle):
+        self._sslTrustAll = False
+        self._sslTrustedBundle = sslBundle
+        self._sslContext = None
+        self.close()
+
+    def set_page_size(self, pageSize):
+        self._pageSize = pageSize
+
+    def set_prefetch_workers(self, workers):
+        self._prefetchWorkers = workers
+
+    def set_pool_size(self, poolSize):
+        self._poolSize = poolSize
+
+    def set_max_connections(self, maxConnections):
+        self._maxConnections = maxConnections
+        self._connSemaphore = None
+
+    def set_retry_policy(self, policy):
+        self._retryPolicy = policy
+
+    def _get_retry_policy(self):
+        if self._retryPolicy is None:
+            return retry_module.DefaultRetryPolicy
+        return self._retryPolicy
+
+    def set_throttle(self, throttle):
+        self._throttle = throttle
+
+    def get_throttle(self):
+        return self._throttle
+
+    def get_session(self):
+        return self._session
+
+    def get_session_id(self):
+        return self._headers['auth']
+
+    def get_host(self):
+        return self._host
+
+    def make_url(self, path):
+        return 'https://%s%s' % (self._host, path)
+
+    def set_api_versions(self, apiVersions):
+        self._apiVersions = tuple(apiVersions)
+        self._apiVersion = None
+
+    async def get_api_version(self):
+        await self._negotiate_version()
+        return self._apiVersion
+
+    async def _negotiate_version(self):
+        # See connection._negotiate_version(); the version info is shared
+        # with synchronous connections to the same host
+        if self._versionLock is None:
+            self._versionLock = asyncio.Lock()
+        async with self._versionLock:
+            if self._apiVersion is not None:
+                return
+            apiVersions = self._apiVersions
+            if apiVersions is None:
+                apiVersions = get_default_api_versions()
+            version = get_version_info(self._host)
+            if version is None:
+                version = await self.get(uri['version'])
+            put_version_info(self._host, version)
+            self._apiVersion = choose_api_version(apiVersions, version)
+            self._headers = dict(self._headers,
+                                 **{'X-API-Version': self._apiVersion})
+
+    async def do_http(self, method, path, body, headers=None):
+        if self._apiVersion is None and path != uri['version']:
+            await self._negotiate_version()
+        reqHeaders = self._headers
+        if headers:
+            reqHeaders = dict(reqHeaders)
+            reqHeaders.update(headers)
+        if body is None:
+            body = b''
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        if self._connSemaphore is None:
+            self._connSemaphore = asyncio.Semaphore(self._maxConnections)
+        policy = self._get_retry_policy()
+        throttle = self._throttle
+        start = time.time()
+        attempt = 0
+        while True:
+            if throttle is not None:
+                await throttle.acquire_async(method)
+            try:
+                try:
+                    async with self._connSemaphore:
+                        resp, tempbytes = await self._do_request(
+                            method, path, body, reqHeaders)
+                finally:
+                    if throttle is not None:
+                        throttle.release(method)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                    OSError) as e:
+                delay = policy.get_delay(method, attempt, time.time() - start,
+                                         error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = policy.get_delay(
+                    method, attempt, time.time() - start, status=resp.status,
+                    retryAfter=resp.getheader('Retry-After'))
+                if delay is None:
+                    break
+            attempt += 1
+            # Sleep outside the semaphore so other requests can proceed
+            await asyncio.sleep(delay)
+        try:
+            tempbody = tempbytes.decode('utf-8')
+        except UnicodeDecodeError:  # Might be binary data
+            return resp, tempbytes
+        body = tempbody
+        if tempbody:
+            try:
+                body = json.loads(tempbody)
+            except ValueError:
+                body = tempbody
+        return resp, body
+
+    ###########################################################################
+    # HTTP/1.1 over asyncio streams
+    ###########################################################################
+    async def _do_request(self, method, path, body, headers):
+        while True:
+            key = self._pool_key()
+            reader, writer, reused = await self._acquire_conn(key)
+            try:
+                writer.write(self._encode_request(method, path, body,
+                                                  headers))
+                await writer.drain()
+                resp, tempbytes, willClose = await self._read_response(
+                    reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The appliance closed the idle keep-alive socket
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if willClose:
+                writer.close()
+            else:
+                self._release_conn(key, reader, writer)
+            return resp, tempbytes
+
+    def _encode_request(self, method, path, body, headers):
+        lines = ['%s %s HTTP/1.1' % (method, path),
+                 'Host: %s' % self._host,
+                 'Content-Length: %d' % len(body)]
+        for name, value in headers.items():
+            lines.append('%s: %s' % (name, value))
+        head = '\r\n'.join(lines) + '\r\n\r\n'
+        return head.encode('latin-1') + body
+
+    async def _read_response(self, reader, method):
+        statusLine = await reader.readline()
+        if not statusLine:
+            raise ConnectionResetError('Remote end closed connection')
+        parts = statusLine.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ConnectionResetError('Bad status line: %r' % statusLine)
+        status = int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ''
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        willClose = headers.get('connection', '').lower() == 'close'
+        if (method == 'HEAD' or status in (204, 304) or
+                100 <= status < 200):
+            body = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Skip any trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n',
+                                                            b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            willClose = True
+        return aresponse(status, reason, headers), body, willClose
+
+    ###########################################################################
+    # Keep-alive connection pool
+    ###########################################################################
+    def close(self):
+        pool = self._pool
+        self._pool = {}
+        for idle in list(pool.values()):
+            for reader, writer in idle:
+                writer.close()
+
+    def _pool_key(self):
+        if self._doProxy is False:
+            return (self._host, None, None)
+        return (self._host, self._proxyHost, self._proxyPort)
+
+    def _get_ssl_context(self):
+        context = self._sslContext
+        if context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
+            if self._sslTrustAll is False:
+                context.verify_mode = ssl.CERT_REQUIRED
+                context.load_verify_locations(self._sslTrustedBundle)
+            else:
+                context.verify_mode = ssl.CERT_NONE
+            self._sslContext = context
+        return context
+
+    async def _new_conn(self, key):
+        host, proxyHost, proxyPort = key
+        hostname, _, port = host.partition(':')
+        port = int(port) if port else 443
+        context = self._get_ssl_context()
+        if proxyHost is None:
+            return await asyncio.open_connection(hostname, port, ssl=context,
+                                                 server_hostname=hostname)
+        sock = await self._open_tunnel(proxyHost, int(proxyPort), hostname,
+                                       port)
+        return await asyncio.open_connection(sock=sock, ssl=context,
+                                             server_hostname=hostname)
+
+    async def _open_tunnel(self, proxyHost, proxyPort, host, port):
+        loop = asyncio.get_event_loop()
+        infos = await loop.getaddrinfo(proxyHost, proxyPort,
+                                       type=socket.SOCK_STREAM)
+        family, socktype, proto, _, addr = infos[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, addr)
+            request = 'CONNECT %s:%d HTTP/1.1\r\nHost: %s:%d\r\n\r\n' % (
+                host, port, host, port)
+            await loop.sock_sendall(sock, request.encode('latin-1'))
+            reply = b''
+            while b'\r\n\r\n' not in reply:
+                data = await loop.sock_recv(sock, 4096)
+                if not data:
+                    break
+                reply += data
+            statusLine = reply.split(b'\r\n', 1)[0].decode('latin-1')
+            if len(statusLine.split()) < 2 or statusLine.split()[1] != '200':
+                raise OSError('Tunnel connection failed: %s' % statusLine)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    async def _acquire_conn(self, key):
+        idle = self._pool.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if reader.at_eof() or writer.transport.is_closing():
+                writer.close()
+                continue
+            return reader, writer, True
+        reader, writer = await self._new_conn(key)
+        return reader, writer, False
+
+    def _release_conn(self, key, reader, writer):
+        idle = self._pool.setdefault(key, [])
+        if len(idle) >= self._poolSize:
+            writer.close()
+            return
+        idle.append((reader, writer))
+
+    ###########################################################################
+    # Utility functions for making requests - the HTTP verbs
+    ###########################################################################
+    async def get(self, uri):
+        resp, body = await self.do_http('GET', uri, '')
+        if resp.status >= 400:
+            raise HPOneViewException(body)
+        if resp.status == 302:
+            body = await self.get(resp.getheader('Location'))
+        return body
+
+    async def get_page(self, uri):
+        return page(await self.get(uri))
+
+    async def iter_members(self, uri, count=None):
+        if count is None:
+            count = self._pageSize
+        pageUri = self._page_uri(uri, 0, count)
+        while pageUri:
+            current = await self.get_page(pageUri)
+            for member in current.members:
+                yield member
+            if not current.members or current.nextPageUri == pageUri:
+                break
+            pageUri = current.nextPageUri
+
+    async def get_all_members(self, uri, count=None, workers=None):
+        # Same as connection.get_all_members(): use total/count from the
+        # first page to request the rest concurrently, in order
+        if count is None:
+            count = self._pageSize
+        if workers is None:
+            workers = self._prefetchWorkers
+        first = await self.get_page(self._page_uri(uri, 0, count))
+        members = list(first.members)
+        if not first.nextPageUri or not first.members:
+            return members
+        if not first.total or not first.count:
+            async for member in self.iter_members(first.nextPageUri, count):
+                members.append(member)
+            return members
+        pageSize = first.count
+        semaphore = asyncio.Semaphore(workers)
+
+        async def fetch(start):
+            async with semaphore:
+                return await self.get_page(self._page_uri(uri, start,
+                                                          pageSize))
+        results = await asyncio.gather(*[fetch(start) for start in
+                                       range(pageSize, first.total, pageSize)])
+        for current in results:
+            members.extend(current.members)
+        return members
+
+    def _page_uri(self, uri, start, count):
+        path, _, query = uri.partition('?')
+        params = [p for p in query.split('&')
+                  if p and not p.startswith(('start=', 'count='))]
+        params.append('start=%d' % start)
+        params.append('count=%d' % count)
+        return path + '?' + '&'.join(params)
+
+    async def put(self, uri, body, headers=None):
+        resp, body = await self.do_http('PUT', uri, json.dumps(body), headers)
+        if resp.status >= 400:
+            raise HPOneViewException(body)
+        elif resp.status == 202:
+            task = await self.get(resp.getheader('Location'))
+            return task, body
+        return None, body
+
+    async def post(self, uri, body, headers=None):
+        resp, body = await self.do_http('POST', uri, json.dumps(body),
+                                        headers)
+        if resp.status >= 400:
+            errorCode = body.get('errorCode') if type(body) is dict else None
+            raise HPOneViewException('response: %s\n%s' % (resp.status, body),
+                                     errorCode)
+        elif resp.status == 202:
+            task = await self.get(resp.getheader('Location'))
+            return task, body
+        return None, body
+
+    async def delete(self, uri, headers=None):
+        resp, body = await self.do_http('DELETE', uri, '', headers)
+        if resp.status >= 400 and resp.status != 404:
+            raise HPOneViewException(body)
+        elif resp.status == 202:
+            task = await self.get(resp.getheader('Location'))
+            return task, body
+        return None, body
+
+    async def get_entities_byquery(self, uri, query):
+        body = await self.get(query.build(uri))
+        return get_members(body)
+
+    async def get_entities_byrange(self, uri, field, xmin, xmax, count=-1):
+        query = query_builder().between(field, xmin, xmax).start(0) \
+            .count(count)
+        return await self.get_entities_byquery(uri, query)
+
+    async def get_entities_byfield(self, uri, field, value, count=-1):
+        query = query_builder().where(field, value).start(0).count(count)
+        return await self.get_entities_byquery(uri, query)
+
+    async def get_entity_byfield(self, uri, field, value, count=1):
+        query = query_builder().where(field, value).start(0).count(count)
+        return get_member(await self.get(query.build(uri)))
+
+    async def conditional_post(self, uri, body):
+        try:
+            task, entity = await self.post(uri, body)
+        except HPOneViewException as e:
+            # See connection.conditional_post()
+            if e.errorCode and 'DUPLICATE' in e.errorCode and \
+                    'NAME' in e.errorCode:
+                try:
+                    entity = await self.get_entity_byfield(uri, 'name',
+                                                           body['name'])
+                except Exception:
+                    raise e
+                if not entity:
+                    raise e
+            else:
+                raise e
+        return entity
+
+    ###########################################################################
+    # EULA
+    ###########################################################################
+    async def get_eula_status(self):
+        return await self.get(uri['eulaStatus'])
+
+    async def set_eula(self, supportAccess='yes'):
+        eula = make_eula_dict(supportAccess)
+        await self.post(uri['eulaSave'], eula)
+        return
+
+    ###########################################################################
+    # Login/Logout to/from appliance
+    ###########################################################################
+    async def login(self, cred, verbose=False):
+        self._cred = cred
+        task, body = await self.post(uri['loginSessions'], self._cred)
+        auth = body['sessionID']
+        self._headers = dict(self._headers, auth=auth)
+        self._session = True
+        if verbose is True:
+            print(('Session Key: ' + auth))
+
+    async def logout(self, verbose=False):
+        await self.delete(uri['loginSessions'])
+        if verbose is True:
+            print('Logged Out')
+        headers = dict(self._headers)
+        del headers['auth']
+        self._headers = headers
+        self._session = False
+        return None
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -40,8 +40,12 @@ __status__ = 'Development'
 from hpOneView.common import *
 from hpOneView.connection import *
 from hpOneView.exceptions import *
+from hpOneView.query import query_builder
+import http.client
 import time  # For sleep
 import sys  # For verbose
+import random
+from concurrent.futures import ThreadPoolExecutor
 
 
 TaskErrorStates = ['Error', 'Warning', 'Terminated', 'Killed']
@@ -49,10 +53,98 @@ TaskCompletedStates = ['Error', 'Warning', 'Completed', 'Terminated', 'Killed']
 TaskPendingStates = ['New', 'Starting', 'Pending', 'Running', 'Suspended', 'Stopping']
 
 
+class fixed_poller(object):
+
+    def __init__(self, interval=1):
+        self._interval = interval
+
+    def next_interval(self, attempt, elapsed, task=None, expected=None):
+        return self._interval
+
+
+class backoff_poller(object):
+
+    # Exponential backoff with jitter between task polls. The interval is
+    # shortened again when the task's progress (or its expected duration)
+    # says it is about to finish, so short tasks return promptly and long
+    # tasks are not polled every second for an hour.
+    def __init__(self, initial=0.5, factor=1.5, maxInterval=30, jitter=0.1,
+                 progressFraction=0.25):
+        self._initial = initial
+        self._factor = factor
+        self._maxInterval = maxInterval
+        self._jitter = jitter
+        self._progressFraction = progressFraction
+
+    def next_interval(self, attempt, elapsed, task=None, expected=None):
+        interval = min(self._maxInterval,
+                       self._initial * self._factor ** attempt)
+        remaining = None
+        percent = None
+        if task:
+            percent = task.get('computedPercentComplete')
+            if not percent:
+                percent = task.get('percentComplete')
+        if percent and 0 < percent < 100 and elapsed > 0:
+            remaining = elapsed * (100 - percent) / percent
+        elif expected:
+            remaining = expected - elapsed
+        if remaining is not None and remaining > 0:
+            interval = min(interval, max(self._initial,
+                                         remaining * self._progressFraction))
+        if self._jitter:
+            interval *= 1 + random.uniform(-self._jitter, self._jitter)
+        return max(0, interval)
+
+
+DefaultPoller = backoff_poller()
+
+
+def set_default_poller(poller):
+    global DefaultPoller
+    DefaultPoller = poller
+
+
+def get_default_poller():
+    return DefaultPoller
+
+
+def raise_task_error(task):
+    if task['taskState'] in TaskErrorStates and task['taskState'] != 'Warning':
+        err = task['taskErrors'][0]
+        msg = err['message']
+        if msg is not None:
+            raise HPOneViewTaskError(msg)
+        elif task['taskStatus'] is not None:
+            raise HPOneViewTaskError(task['taskStatus'])
+        else:
+            raise HPOneViewTaskError('Unknown Exception')
+
+
 class activity(object):
 
-    def __init__(self, con):
+    def __init__(self, con, poller=None, tracker=None):
         self._con = con
+        self._poller = poller
+        self._tracker = tracker
+
+    def set_poller(self, poller):
+        self._poller = poller
+
+    def _get_poller(self):
+        if self._poller is None:
+            return DefaultPoller
+        return self._poller
+
+    def set_tracker(self, tracker):
+        self._tracker = tracker
+
+    def _get_tracker(self):
+        # Fall back to the tracker attached to the connection so that the
+        # activity objects created inside servers, networking, etc. use it
+        if self._tracker is None and hasattr(self._con, 'get_task_tracker'):
+            return self._con.get_task_tracker()
+        return self._tracker
 
     ###########################################################################
     # Tasks
@@ -114,63 +206,185 @@ class activity(object):
                 return True
         return False
 
-    def wait4task(self, task, tout=60, verbose=False):
-        count = 0
+    def wait4task(self, task, tout=60, verbose=False, expected=None):
         if task is None:
             return None
-        while self.is_task_running(task):
+        poller = self._get_poller()
+        start = time.time()
+        attempt = 0
+        while True:
+            task = self._con.get(task['uri'])
+            if task.get('taskState') not in TaskPendingStates:
+                break
+            elapsed = time.time() - start
+            if elapsed > tout:
+                raise HPOneViewTimeout('Waited ' + str(tout) + ' seconds for'
+                                       ' task to complete, aborting')
             if verbose:
-                    sys.stdout.write('Task still running after %d seconds   \r'
-                                     % count)
-                    sys.stdout.flush()
-            time.sleep(1)
-            count += 1
-            if count > tout:
-                raise HPOneViewTimeout('Waited ' + str(tout) +
-                                       ' seconds for task to complete, aborting')
-        task = self._con.get(task['uri'])
-        if task['taskState'] in TaskErrorStates and task['taskState'] != 'Warning':
-                err = task['taskErrors'][0]
-                msg = err['message']
-                if msg is not None:
-                    raise HPOneViewTaskError(msg)
-                elif task['taskStatus'] is not None:
-                    raise HPOneViewTaskError(task['taskStatus'])
-                else:
-                    raise HPOneViewTaskError('Unknown Exception')
+                sys.stdout.write('Task still running after %d seconds   \r'
+                                 % elapsed)
+                sys.stdout.flush()
+            tracker = self._get_tracker()
+            # Once the bus has reported the task finished REST may still
+            # show it running for a while; poll normally until it catches up
+            if tracker is not None and tracker.available() and \
+                    tracker.completed(task['uri']) is None:
+                # Re-read the task once the bus says it finished, or every
+                # resync interval in case the message was missed
+                tracker.wait(task['uri'], min(tracker.get_resync_interval(),
+                                              tout - elapsed + 0.1))
+                continue
+            interval = poller.next_interval(attempt, elapsed, task, expected)
+            # Always take one last look at the task when tout is reached
+            time.sleep(min(interval, tout - elapsed + 0.1))
+            attempt += 1
+        raise_task_error(task)
         return task
 
-    def wait4tasks(self, tasks, tout=60, verbose=False):
-        running = list(filter(self.is_task_running, tasks[:]))
-        count = 0
-        while running:
-            if verbose:
-                    print(('Tasks still running after %s seconds', count))
-                    print(running)
-            time.sleep(1)
-            count += 1
-            running = list(filter(self.is_task_running, running))
-            if count > tout:
-                raise HPOneViewTimeout('Waited 60 seconds for task to complete'
-                                       ', aborting')
+    def wait4tasks(self, tasks, tout=60, verbose=False, taskTout=None,
+                   workers=8, raiseErrors=False):
+        # Returns the final state of every task in the order given. Tasks
+        # that fail are returned as-is (or raised together when raiseErrors
+        # is set); tasks that time out are raised together once all of the
+        # others have finished.
+        results = [None] * len(tasks)
+        errors = []
+        timeouts = []
+        for index, task, error in self._iter_completed(tasks, tout, taskTout,
+                                                       workers, verbose):
+            results[index] = task
+            if isinstance(error, HPOneViewTimeout):
+                timeouts.append((task, error))
+            elif error is not None:
+                errors.append((task, error))
+        if timeouts:
+            e = HPOneViewTimeout('%d of %d tasks did not complete within their'
+                                 ' %s second timeout, aborting' %
+                                 (len(timeouts), len(tasks),
+                                  taskTout if taskTout else tout))
+            e.errors = timeouts + errors
+            raise e
+        if errors and raiseErrors is True:
+            e = HPOneViewTaskError('%d of %d tasks failed' % (len(errors),
+                                                               len(tasks)))
+            e.errors = errors
+            raise e
+        return results
+
+    def iter_completed_tasks(self, tasks, tout=60, taskTout=None, workers=8,
+                             verbose=False):
+        # Yields (task, error) for each task as soon as it finishes, polling
+        # all of the pending tasks concurrently. error is None on success,
+        # the HPOneViewTaskError for a failed task or an HPOneViewTimeout if
+        # the task passed taskTout or the whole batch passed tout.
+        for index, task, error in self._iter_completed(tasks, tout, taskTout,
+                                                       workers, verbose):
+            yield task, error
+
+    def _iter_completed(self, tasks, tout, taskTout, workers, verbose):
+        start = time.time()
+        deadline = start + tout
+        taskDeadline = start + taskTout if taskTout else deadline
+        pending = []
+        for index, task in enumerate(tasks):
+            if task and 'uri' in task:
+                pending.append((index, task))
+            else:
+                yield index, task, None
+        if not pending:
+            return
+        executor = ThreadPoolExecutor(max_workers=max(1, min(workers,
+                                                             len(pending))))
+        poller = self._get_poller()
+        attempt = 0
+        lastFullPoll = None
+        try:
+            while pending:
+                # With a task tracker only the tasks reported finished on the
+                # bus are read back, plus all of them every resyncInterval
+                tracker = self._get_tracker()
+                toPoll = pending
+                if tracker is not None and tracker.available() and \
+                        lastFullPoll is not None and \
+                        time.time() - lastFullPoll < \
+                        tracker.get_resync_interval():
+                    toPoll = [(index, task) for index, task in pending
+                              if tracker.completed(task['uri'])]
+                else:
+                    lastFullPoll = time.time()
+                polled = dict(zip([index for index, _ in toPoll],
+                                  executor.map(self._poll_task,
+                                               [task for _, task in toPoll])))
+                now = time.time()
+                running = []
+                for index, task in pending:
+                    current, error = polled.get(index, (task, None))
+                    if error is None and current.get('taskState') in \
+                            TaskPendingStates:
+                        if now > min(deadline, taskDeadline):
+                            yield index, current, HPOneViewTimeout(
+                                'Waited %d seconds for task to complete, '
+                                'aborting' % (now - start))
+                        else:
+                            running.append((index, current))
+                        continue
+                    yield index, current, error
+                pending = running
+                if not pending:
+                    break
+                if verbose:
+                    print(('Tasks still running after %d seconds'
+                           % (now - start)))
+                    print([task['uri'] for _, task in pending])
+                remaining = max(0, min(deadline, taskDeadline) - now) + 0.1
+                waiting = pending
+                if tracker is not None and tracker.available():
+                    waiting = [(index, task) for index, task in pending
+                               if tracker.completed(task['uri'])]
+                    if not waiting:
+                        tracker.wait_any(min(remaining,
+                                             tracker.get_resync_interval()))
+                        continue
+                    # REST still shows these running although the bus
+                    # reported them finished; poll them on the normal
+                    # schedule until it catches up
+                interval = min(poller.next_interval(attempt, now - start, task)
+                               for _, task in waiting)
+                time.sleep(min(interval, remaining))
+                attempt += 1
+        finally:
+            executor.shutdown(wait=False)
+
+    def _poll_task(self, task):
+        # A connection failure is reported against the task being read, like
+        # a task error, so that it does not lose the other tasks' results
+        try:
+            task = self._con.get(task['uri'])
+            if task.get('taskState') in TaskCompletedStates:
+                raise_task_error(task)
+        except (HPOneViewException, http.client.HTTPException,
+                OSError) as e:
+            return task, e
+        return task, None
 
     def get_tasks(self):
-        return get_members(self._con.get(uri['task']))
+        return self._con.get_all_members(uri['task'])
+
+    def iter_tasks(self, count=None):
+        return self._con.iter_members(uri['task'], count)
 
     ###########################################################################
     # Alerts
     ###########################################################################
     def get_alerts(self, AlertState='All'):
+        return list(self.iter_alerts(AlertState))
+
+    def iter_alerts(self, AlertState='All', count=None):
         if AlertState == 'All':
-        # TODO remove the evil use/hack of the large count default. The OneView
-        # API documents that count=-1 should return everything but it is not
-        # universally honored, where the extremely large count number is.
-            return get_members(self._con.get(uri['alerts'] +
-                                             '?start=0&count=9999999'))
+            return self._con.iter_members(uri['alerts'], count)
         else:
-            return(self._con.get_entities_byfield(uri['alerts'],
-                                                  'alertState',
-                                                  AlertState, count=9999999))
+            query = query_builder().where('alertState', AlertState)
+            return self._con.iter_members(query.build(uri['alerts']), count)
 
     def delete_alert(self, alert):
         self._con.delete(alert['uri'])
@@ -189,16 +403,18 @@ class activity(object):
         body = self._con.get(uri['audit-logs'] + '?' + query)
         return get_members(body)
 
+    def iter_audit_logs(self, query='', count=None):
+        return self._con.iter_members(uri['audit-logs'] + '?' + query, count)
+
     def create_audit_log(self, auditLogRecord):
         self._con.post(uri['audit-logs'], auditLogRecord)
         return
 
-    def download_audit_logs(self, filename):
-        body = self._con.get(uri['audit-logs-download'])
-        f = open(filename, 'wb')
-        f.write(body)
-        f.close()
-        return
+    def download_audit_logs(self, filename, progress=None, checksum=None,
+                            resume=False):
+        return self._con.download(uri['audit-logs-download'], filename,
+                                  progress=progress, checksum=checksum,
+                                  resume=resume)
 
     ###########################################################################
     # Events
@@ -207,6 +423,9 @@ class activity(object):
         body = self._con.get(uri['events'] + '?' + query)
         return get_members(body)
 
+    def iter_events(self, query='', count=None):
+        return self._con.iter_members(uri['events'] + '?' + query, count)
+
     def create_event(self, eventRecord):
         self._con.post(uri['events'], eventRecord)
         return
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+"""
+anetworking.py
+~~~~~~~~~~~~
+
+This module implements networking HP OneView REST API for asyncio
+"""
+
+__title__ = 'anetworking'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import asyncio
+
+from hpOneView.common import *
+from hpOneView.aactivity import *
+from hpOneView.exceptions import *
+
+
+class anetworking(object):
+
+    def __init__(self, con):
+        self._con = con
+        self._activity = aactivity(con)
+
+    ###########################################################################
+    # Logical Interconnect Group
+    ###########################################################################
+    async def update_settings_from_default(self, settings={}):
+        if not settings:
+            settings = make_enet_settings('__NoName__')
+        default = await self._con.get('%s/defaultSettings')
+        return default
+
+        for key in list(settings.keys()):
+            if key != 'name':
+                settings[key] = default[key]
+        return settings
+
+    async def create_lig(self, lig, blocking=True, verbose=False):
+        task, body = await self._con.post(uri['lig'], lig)
+        task, entity = await self._activity.make_task_entity_tuple(task)
+        if blocking is True:
+            task = await self._activity.wait4task(task, verbose=verbose)
+        return entity
+
+    async def update_lig(self, lig, blocking=True, verbose=False):
+        task, body = await self._con.put(lig['uri'], lig)
+        if blocking is True:
+            task = await self._activity.wait4task(task, verbose=verbose)
+        return task
+
+    async def delete_lig(self, lig, blocking=True, verbose=False):
+        task, body = await self._con.delete(lig['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, verbose=verbose)
+        return task
+
+    async def get_ligs(self):
+        return await self._con.get_all_members(uri['lig'])
+
+    def iter_ligs(self, count=None):
+        return self._con.iter_members(uri['lig'], count)
+
+    async def get_lig_by_name(self, ligname):
+        return await self._con.get_entity_byfield(uri['lig'], 'name', ligname)
+
+    async def get_interconnect_types(self):
+        # get all the supported interconnect types
+        return await self._con.get_all_members(uri['ictype'])
+
+    def iter_interconnect_types(self, count=None):
+        return self._con.iter_members(uri['ictype'], count)
+
+    async def get_lis(self):
+        return await self._con.get_all_members(uri['li'])
+
+    def iter_lis(self, count=None):
+        return self._con.iter_members(uri['li'], count)
+
+    ###########################################################################
+    # Connection Templates
+    ###########################################################################
+    async def get_connection_templates(self):
+        return await self._con.get_all_members(uri['ct'])
+
+    def iter_connection_templates(self, count=None):
+        return self._con.iter_members(uri['ct'], count)
+
+    async def update_net_ctvalues(self, xnet, bw={}):
+        if not bw:
+            return
+        if not xnet:
+            raise HPOneViewInvalidResource('Missing Network')
+        defaultCT = await self._con.get(xnet['connectionTemplateUri'])
+        defaultCT['bandwidth']['maximumBandwidth'] = bw['maximumBandwidth']
+        defaultCT['bandwidth']['typicalBandwidth'] = bw['typicalBandwidth']
+        task, body = await self._con.put(defaultCT['uri'], defaultCT)
+        return await self._activity.make_task_entity_tuple(task)
+
+    ###########################################################################
+    # NetworkSets
+    ###########################################################################
+    async def create_networkset(self, name, nets=[], bw={},
+                                blocking=True, verbose=False):
+        nset = make_netset_dict(name, nets)
+        body = await self._con.conditional_post(uri['nset'], nset)
+        task, entity = await self._activity.make_task_entity_tuple(body)
+        if not task and not entity:
+            # contitional_post returned an already existing resource
+            return body
+        else:
+            # assume we can update CT even if network create task is not cmpelt
+            await self.update_net_ctvalues(entity, bw)
+            if blocking is True:
+                task = await self._activity.wait4task(task, tout=60,
+                                                      verbose=verbose)
+            return entity
+
+    async def delete_networkset(self, networkset, blocking=True,
+                                verbose=False):
+        task, body = await self._con.delete(networkset['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, verbose=verbose)
+        return task
+
+    async def get_networksets(self):
+        return await self._con.get_all_members(uri['nset'])
+
+    def iter_networksets(self, count=None):
+        return self._con.iter_members(uri['nset'], count)
+
+    ###########################################################################
+    # Networks
+    ###########################################################################
+    async def create_enet_networks(self, prefix, vid_start, vid_count, bw={},
+                                   workers=8, tout=600, verbose=False):
+        # See networking.create_enet_networks()
+        xnets = [make_enet_dict('%s%s' % (prefix, vid), vid)
+                 for vid in range(vid_start, vid_start + vid_count)]
+        enet_list = []
+        created = []
+        tasks = []
+        errors = []
+        semaphore = asyncio.Semaphore(max(1, workers))
+        results = await self._map(semaphore, lambda xnet: self.create_network(
+            uri['enet'], xnet, verbose=verbose), xnets)
+        for xnet, (result, error) in zip(xnets, results):
+            if error is not None:
+                errors.append((xnet, error))
+                continue
+            task, entity = result
+            if task:
+                created.append(entity)
+                tasks.append(task)
+            enet_list.append(entity)
+        # Wait even after a failure, a network whose create is still running
+        # cannot be deleted
+        errors.extend(await self._wait_all(tasks, tout, verbose))
+        if bw and not errors:
+            results = await self._map(semaphore, lambda enet:
+                                      self.update_net_ctvalues(enet, bw),
+                                      created)
+            tasks = []
+            for enet, (result, error) in zip(created, results):
+                if error is not None:
+                    errors.append((enet, error))
+                elif result[0]:
+                    tasks.append(result[0])
+            errors.extend(await self._wait_all(tasks, tout, verbose))
+        if errors:
+            results = await self._map(semaphore, lambda enet:
+                                      self._con.delete(enet['uri']), created)
+            rollbackErrors = [(enet, error) for enet, (result, error)
+                              in zip(created, results) if error]
+            rollbackErrors.extend(await self._wait_all(
+                [result[0] for result, error in results
+                 if error is None and result[0]], tout, verbose))
+            e = HPOneViewException('Could not create %d of %d networks'
+                                   % (len(errors), len(xnets)))
+            e.errors = errors
+            e.rollbackErrors = rollbackErrors
+            raise e
+        return enet_list
+
+    async def _map(self, semaphore, func, items):
+        # (result, error) for each item, in order
+        async def call(item):
+            async with semaphore:
+                try:
+                    return await func(item), None
+                except (HPOneViewException, OSError) as e:
+                    return None, e
+        return await asyncio.gather(*[call(item) for item in items])
+
+    async def _wait_all(self, tasks, tout, verbose):
+        # (task, error) for each task that failed or timed out; waiting
+        # holds no connection, so every task is waited on at once
+        semaphore = asyncio.Semaphore(max(1, len(tasks)))
+        results = await self._map(semaphore, lambda task:
+                                  self._activity.wait4task(task, tout,
+                                                           verbose=verbose),
+                                  tasks)
+        return [(task, error) for task, (result, error) in zip(tasks, results)
+                if error is not None]
+
+    async def create_enet_network(self, name, vid,
+                                  purpose='General',
+                                  smartLink=True,
+                                  privateNetwork=False,
+                                  ethernetNetworkType='Tagged',
+                                  bw={},
+                                  blocking=True,
+                                  verbose=False):
+        xnet = make_enet_dict(name, vid, smartLink=smartLink,
+                              privateNetwork=privateNetwork, purpose=purpose,
+                              ethernetNetworkType=ethernetNetworkType)
+        task, entity = await self.create_network(uri['enet'], xnet, bw,
+                                                 verbose)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=60,
+                                                  verbose=verbose)
+        return entity
+
+    async def create_fc_network(self, name, attach='FabricAttach',
+                                autodist=True, linktime=30, bw={},
+                                managedSanUri=None, blocking=True,
+                                verbose=False):
+        xnet = make_fc_dict(name, attach, autodist, linktime, managedSanUri)
+        task, entity = await self.create_network(uri['fcnet'], xnet, bw,
+                                                 verbose)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=60,
+                                                  verbose=verbose)
+        return entity
+
+    async def create_network(self, uri, xnet, bw={}, verbose=False):
+        # throws an exception if there is an error
+        body = await self._con.conditional_post(uri, xnet)
+        if body and body.get('category') != 'tasks':
+            # contitional_post returned an already existing resource
+            return None, body
+        task, entity = await self._activity.make_task_entity_tuple(body)
+        if not task and not entity:
+            return None, body
+        else:
+            # assume we can update CT even if network create task is not cmpelt
+            await self.update_net_ctvalues(entity, bw)
+            return task, entity
+
+    async def update_network(self, xnet):
+        task, body = await self._con.put(xnet['uri'], xnet)
+        return await self._activity.make_task_entity_tuple(task)
+
+    async def delete_network(self, xnet, blocking=True, verbose=False):
+        task, body = await self._con.delete(xnet['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, verbose=verbose)
+        return task
+
+    async def get_enet_networks(self):
+        return await self._con.get_all_members(uri['enet'])
+
+    def iter_enet_networks(self, count=None):
+        return self._con.iter_members(uri['enet'], count)
+
+    async def get_fc_networks(self):
+        return await self._con.get_all_members(uri['fcnet'])
+
+    def iter_fc_networks(self, count=None):
+        return self._con.iter_members(uri['fcnet'], count)
+
+    ###########################################################################
+    # Uplink Sets
+    ###########################################################################
+    async def get_uplink_sets(self):
+        return await self._con.get_all_members(uri['uplink-sets'])
+
+    def iter_uplink_sets(self, count=None):
+        return self._con.iter_members(uri['uplink-sets'], count)
+
+    async def delete_uplink_set(self, uplink_set, blocking=True,
+                                verbose=False):
+        task, body = await self._con.delete(uplink_set['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, verbose=verbose)
+        return task
+
+    ###########################################################################
+    # Interconnects
+    ###########################################################################
+    async def get_interconnects(self):
+        return await self._con.get_all_members(uri['ic'])
+
+    def iter_interconnects(self, count=None):
+        return self._con.iter_members(uri['ic'], count)
+
+    async def get_enet_network_by_name(self, nwname):
+        return await self._con.get_entity_byfield(uri['enet'], 'name', nwname)
+
+    async def get_fc_network_by_name(self, nwname):
+        return await self._con.get_entity_byfield(uri['fcnet'], 'name', nwname)
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
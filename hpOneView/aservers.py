@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+"""
+aservers.py
+~~~~~~~~~~~~
+
+This module implements servers HP OneView REST API for asyncio
+"""
+
+__title__ = 'aservers'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+from hpOneView.common import *
+from hpOneView.aactivity import *
+from hpOneView.exceptions import *
+
+
+class aservers(object):
+
+    def __init__(self, con):
+        self._con = con
+        self._activity = aactivity(con)
+
+    ###########################################################################
+    # Server Hardware
+    ###########################################################################
+    async def get_server_by_bay(self, baynum):
+        return await self._con.get_entity_byfield(uri['servers'], 'position',
+                                                  baynum)
+
+    async def get_server_by_name(self, name):
+        # Matches shortModel, as servers.get_server_by_name() does
+        return await self._con.get_entity_byfield(uri['servers'],
+                                                  'shortModel', name)
+
+    async def get_servers(self):
+        return await self._con.get_all_members(uri['servers'])
+
+    def iter_servers(self, count=None):
+        return self._con.iter_members(uri['servers'], count)
+
+    async def get_server_hardware_types(self):
+        return await self._con.get_all_members(uri['server-hardware-types'])
+
+    def iter_server_hardware_types(self, count=None):
+        return self._con.iter_members(uri['server-hardware-types'], count)
+
+    async def set_server_powerstate(self, server, state, force=False,
+                                    blocking=True, verbose=False):
+        if state == 'Off' and force is True:
+            powerRequest = make_powerstate_dict('Off', 'PressAndHold')
+        elif state == 'Off' and force is False:
+            powerRequest = make_powerstate_dict('Off', 'MomentaryPress')
+        elif state == 'On':
+            powerRequest = make_powerstate_dict('On', 'MomentaryPress')
+        elif state == 'Reset':
+            powerRequest = make_powerstate_dict('On', 'Reset')
+        task, body = await self._con.put(server['uri'] + '/powerState',
+                                         powerRequest)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=60,
+                                                  verbose=verbose)
+        return task
+
+    async def delete_server(self, server, force=False, blocking=True,
+                            verbose=False):
+        if force:
+            task, body = await self._con.delete(server['uri'] + '?force=True')
+        else:
+            task, body = await self._con.delete(server['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        return task
+
+    async def update_server(self, server):
+        task, body = await self._con.put(server['uri'], server)
+        return body
+
+    async def add_server(self, server, blocking=True, verbose=False):
+        task, body = await self._con.post(uri['servers'], server)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+            if 'type' in task and task['type'].startswith('Task'):
+                entity = await self._activity.get_task_associated_resource(
+                    task)
+                server = await self._con.get(entity['resourceUri'])
+                return server
+        return task
+
+    ###########################################################################
+    # Server Profiles
+    ###########################################################################
+    async def create_server_profile(self, profile, blocking=True,
+                                    verbose=False):
+        # Creating a profile returns a task with no resource uri
+        task, body = await self._con.post(uri['profiles'], profile)
+        if profile['firmware'] is None:
+            tout = 600
+        else:
+            tout = 3600
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout, verbose=verbose)
+            if 'type' in task and task['type'].startswith('Task'):
+                entity = await self._activity.get_task_associated_resource(
+                    task)
+                profile = await self._con.get(entity['resourceUri'])
+                return profile
+        return task
+
+    async def remove_server_profile(self, profile, force=False, blocking=True,
+                                    verbose=False):
+        if force:
+            task, body = await self._con.delete(profile['uri'] + '?force=True')
+        else:
+            task, body = await self._con.delete(profile['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        return task
+
+    async def get_server_profiles(self):
+        return await self._con.get_all_members(uri['profiles'])
+
+    def iter_server_profiles(self, count=None):
+        return self._con.iter_members(uri['profiles'], count)
+
+    async def update_server_profile(self, profile, blocking=True,
+                                    verbose=False):
+        task, body = await self._con.put(profile['uri'], profile)
+        try:
+            if profile['firmware']['firmwareBaselineUri'] is None:
+                tout = 600
+            else:
+                tout = 3600
+        except Exception:
+            tout = 600
+        # Update the task to get the associated resource uri
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=tout,
+                                                  verbose=verbose)
+        profileResource = await self._activity.get_task_associated_resource(
+            task)
+        profile = await self._con.get(profileResource['resourceUri'])
+        return profile
+
+    ###########################################################################
+    # Enclosures
+    ###########################################################################
+    async def get_enclosures(self):
+        return await self._con.get_all_members(uri['enclosures'])
+
+    def iter_enclosures(self, count=None):
+        return self._con.iter_members(uri['enclosures'], count)
+
+    async def add_enclosure(self, enclosure, blocking=True, verbose=False):
+        task, body = await self._con.post(uri['enclosures'], enclosure)
+        if enclosure['state'] == 'Monitored':
+            tout = 600
+        elif enclosure['firmwareBaselineUri'] is None:
+            tout = 600
+        else:
+            tout = 3600
+
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout, verbose=verbose)
+            if 'type' in task and task['type'].startswith('Task'):
+                entity = await self._activity.get_task_associated_resource(
+                    task)
+                enclosure = await self._con.get(entity['resourceUri'])
+                return enclosure
+        return task
+
+    async def remove_enclosure(self, enclosure, force=False, blocking=True,
+                               verbose=False):
+        if force:
+            task, body = await self._con.delete(
+                enclosure['uri'] + '?force=True')
+        else:
+            task, body = await self._con.delete(enclosure['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        return task
+
+    ###########################################################################
+    # Enclosure Groups
+    ###########################################################################
+    async def create_enclosure_group(self, egroup):
+        # Creating an Enclosure Group returns the group, NOT a task
+        task, body = await self._con.post(uri['enclosureGroups'], egroup)
+        return body
+
+    async def delete_enclosure_group(self, egroup):
+        await self._con.delete(egroup['uri'])
+
+    async def get_enclosure_groups(self):
+        return await self._con.get_all_members(uri['enclosureGroups'])
+
+    def iter_enclosure_groups(self, count=None):
+        return self._con.iter_members(uri['enclosureGroups'], count)
+
+    async def update_enclosure_group(self, enclosuregroup):
+        task, body = await self._con.put(enclosuregroup['uri'], enclosuregroup)
+        return body
+
+    ###########################################################################
+    # ID Pools
+    ###########################################################################
+    async def get_pool(self, pooltype):
+        body = await self._con.get(uri['idpool'] + '/' + pooltype)
+        return body
+
+    async def get_vmac_pool(self):
+        body = await self._con.get(uri['vmac-pool'])
+        return body
+
+    async def get_vwwn_pool(self):
+        body = await self._con.get(uri['vwwn-pool'])
+        return body
+
+    async def get_vsn_pool(self):
+        body = await self._con.get(uri['vsn-pool'])
+        return body
+
+    async def get_profile_networks(self):
+        body = await self._con.get(uri['profile-networks'])
+        return body
+
+    async def get_profile_available_servers(self):
+        body = await self._con.get(uri['profile-available-servers'])
+        return body
+
+    async def get_profile_available_storage_systems(self):
+        body = await self._con.get(uri['profile-available-storage-systems'])
+        return body
+
+    async def get_profile_ports(self):
+        body = await self._con.get(uri['profile-ports'])
+        return body
+
+    # TODO put pool
+    async def allocate_pool_ids(self, url, count):
+        allocatorUrl = '%s/allocator' % url
+        allocatorBody = {'count': count}
+        task, body = await self._con.put(allocatorUrl, allocatorBody)
+        return body
+
+    async def release_pool_ids(self, url, idList):
+        collectorUrl = '%s/collector' % url
+        collectorBody = {'idList': idList}
+        task, body = await self._con.put(collectorUrl, collectorBody)
+        return body
+
+    async def allocate_range_ids(self, allocatorUrl, count):
+        task, body = await self._con.put(allocatorUrl, {'count': count})
+        return body
+
+    async def release_range_ids(self, collectorUrl, idList):
+        task, body = await self._con.put(collectorUrl, {'idList': idList})
+        return body
+
+    # TODO POST Range
+    async def enable_range(self, url):
+        prange = await self._con.get(url)
+        prange['enabled'] = True
+        task, body = await self._con.put(url, prange)
+        return body
+
+    async def disable_range(self, url):
+        prange = await self._con.get(url)
+        prange['enabled'] = False
+        task, body = await self._con.put(url, prange)
+        return body
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
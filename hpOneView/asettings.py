@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+asettings.py
+~~~~~~~~~~~~
+
+This module implements settings HP OneView REST API for asyncio
+"""
+
+__title__ = 'asettings'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+from hpOneView.common import *
+from hpOneView.aactivity import *
+from hpOneView.exceptions import *
+
+
+class asettings(object):
+
+    def __init__(self, con):
+        self._con = con
+        self._activity = aactivity(con)
+
+    ###########################################################################
+    # Appliance Firmware
+    ###########################################################################
+    async def get_pending_fw(self):
+        body = await self._con.get(uri['fw-pending'])
+        return body
+
+    async def upgrade_appliance_fw(self, filename):
+        task, body = await self._con.put(
+            uri['fw-pending'] + '?file=' + filename, '')
+        return body
+
+    async def delete_appliance_fw(self):
+        task, body = await self._con.delete(uri['fw-pending'])
+        return body
+
+    ###########################################################################
+    # SPP Upload
+    ###########################################################################
+    async def delete_spp(self, sppName):
+        task, body = await self._con.delete(uri['fwDrivers'] + '/' + sppName)
+        return body
+
+    async def get_spps(self):
+        return await self._con.get_all_members(uri['fwDrivers'])
+
+    def iter_spps(self, count=None):
+        return self._con.iter_members(uri['fwDrivers'], count)
+
+    async def get_health_status(self):
+        body = await self._con.get(uri['healthStatus'])
+        return get_members(body)
+
+    async def get_version(self):
+        body = await self._con.get(uri['version'])
+        return body
+
+    async def generate_support_dump(self, encrypt=True,
+                                    logicalInterconnect=None):
+        request = {}
+        if logicalInterconnect is None:
+            request['encrypt'] = encrypt
+            request['errorCode'] = 'CI'
+            task, body = await self._con.post(uri['supportDump'], request)
+        else:
+            request['errorCode'] = 'LI'
+            task, body = await self._con.post(
+                logicalInterconnect['uri'] + '/support-dumps',
+                request)
+        return body
+
+    async def generate_backup(self, blocking=True, verbose=False):
+        resp, body = await self._con.do_http('POST', uri['backups'], None)
+        if resp.status >= 400:
+            raise HPOneViewException(body)
+        taskuri = resp.getheader('Location')
+        task = await self._con.get(taskuri)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        backupResource = await self._activity.get_task_associated_resource(
+            task)
+        backup = await self._con.get(backupResource['resourceUri'])
+        return backup
+
+    async def restore_backup(self, backupUri):
+        request = {
+            'type': 'RESTORE',
+            'uriOfBackupToRestore': backupUri}
+        task, body = await self._con.post(uri['restores'], request)
+        return body
+
+    async def get_backups(self):
+        body = await self._con.get(uri['backups'])
+        return body
+
+    async def get_restores(self):
+        body = await self._con.get(uri['restores'])
+        return body
+
+    async def get_dev_read_comm_string(self):
+        body = await self._con.get(uri['dev-read-community-str'])
+        return body['communityString']
+
+    async def set_dev_read_comm_string(self, communityString):
+        request = {'communityString': communityString}
+        task, body = await self._con.put(uri['dev-read-community-str'],
+                                         request)
+        return body
+
+    async def get_licenses(self):
+        return await self._con.get_all_members(uri['licenses'])
+
+    def iter_licenses(self, count=None):
+        return self._con.iter_members(uri['licenses'], count)
+
+    async def add_license(self, licenseKey):
+        request = {
+            'key': licenseKey,
+            'type': 'License'}
+        task, body = await self._con.post(uri['licenses'], request)
+        return body
+
+    async def factory_reset(self, mode='PRESERVE_NETWORK'):
+        response = await self._con.delete('/rest/appliance?mode=' + mode)
+        return response
+
+    async def get_node_status(self):
+        body = await self._con.get(uri['nodestatus'])
+        return body
+
+    async def get_node_version(self):
+        body = await self._con.get(uri['nodeversion'])
+        return body
+
+    async def shutdown(self, mode='HALT'):
+        task, body = await self._con.post(
+            '/rest/appliance/shutdown?type=' + mode, None)
+        return body
+
+    async def get_trap_destinations(self):
+        body = await self._con.get(uri['trap'])
+        return body
+
+    async def get_serviceaccess(self):
+        body = await self._con.get(uri['service'])
+        return body
+
+    async def set_service_access(self, serviceAccess):
+        task, body = await self._con.put(uri['serviceAccess'], serviceAccess)
+        return body
+
+    async def get_domains(self):
+        body = await self._con.get(uri['domains'])
+        return body
+
+    async def get_schema(self):
+        body = await self._con.get(uri['schema'])
+        return body
+
+    async def get_global_settings(self):
+        body = await self._con.get(uri['globalSettings'])
+        return body
+
+    async def get_storage_vol_template_policy(self):
+        body = await self._con.get(uri['vol-tmplate-policy'])
+        return body
+
+    async def get_startup_progress(self):
+        body = await self._con.get(uri['progress'])
+        return body
+
+    ###########################################################################
+    # Appliance Network Interfaces
+    ###########################################################################
+    async def get_appliance_network_interfaces(self):
+        return await self._con.get(uri['applianceNetworkInterfaces'])
+
+    async def set_appliance_network_interface(self, interfaceConfig):
+        await self._con.post(uri['applianceNetworkInterfaces'],
+                             interfaceConfig)
+        return
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+astorage.py
+~~~~~~~~~~~~
+
+This module implements storage HP OneView REST API for asyncio
+"""
+
+__title__ = 'astorage'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+from hpOneView.common import *
+from hpOneView.aactivity import *
+from hpOneView.exceptions import *
+
+
+class astorage(object):
+
+    def __init__(self, con):
+        self._con = con
+        self._activity = aactivity(con)
+
+    async def add_storage_system(self, host, user, passwd, blocking=True,
+                                 verbose=False):
+        request = {'ip_hostname': host,
+                   'username': user,
+                   'password': passwd}
+        task, body = await self._con.post(uri['storage-systems'], request)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        return body
+
+    async def update_storage_system(self, StorageSystem, blocking=True,
+                                    verbose=False):
+        task, body = await self._con.put(StorageSystem['uri'], StorageSystem)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+            return body
+        return task
+
+    async def remove_storage_system(self, system, blocking=True,
+                                    verbose=False):
+        task, body = await self._con.delete(system['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        return task
+
+    async def get_storage_systems(self):
+        return await self._con.get_all_members(uri['storage-systems'])
+
+    def iter_storage_systems(self, count=None):
+        return self._con.iter_members(uri['storage-systems'], count)
+
+    async def get_storage_pools(self):
+        members = await self._con.get_all_members(uri['storage-pools'])
+        return make_collection_dict(members)
+
+    def iter_storage_pools(self, count=None):
+        return self._con.iter_members(uri['storage-pools'], count)
+
+    async def add_storage_pool(self, name, storageSystemUri, blocking=True,
+                               verbose=False):
+        request = {'storageSystemUri': storageSystemUri,
+                   'poolName': name}
+        task, body = await self._con.post(uri['storage-pools'], request)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+            if 'type' in task and task['type'].startswith('Task'):
+                entity = await self._activity.get_task_associated_resource(
+                    task)
+                server = await self._con.get(entity['resourceUri'])
+                return server
+        return task
+
+    # Pass extra headers for POST and DELTE on storage volume
+    # templates in order to work around a bug. Without these headers the call
+    # cause a NullPointerException on the appliance and a 400 gets returned.
+    async def add_storage_volume_template(self, volTemplate, verbose=False):
+        headers = {'Accept-Language': 'en', 'Accept-Encoding': 'deflate'}
+        task, body = await self._con.post(uri['vol-templates'], volTemplate,
+                                          headers)
+        return body
+
+    # Pass extra headers for POST and DELTE on storage volume
+    # templates in order to work around a bug. Without these headers the call
+    # cause a NullPointerException on the appliance and a 400 gets returned.
+    async def remove_storage_volume_template(self, volTemplate, blocking=True,
+                                             verbose=False):
+        headers = {'Accept-Language': 'en'}
+        task, body = await self._con.delete(volTemplate['uri'], headers)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+            return body
+        return task
+
+    async def get_attachable_volumes(self):
+        members = await self._con.get_all_members(uri['attachable-volumes'])
+        return make_collection_dict(members)
+
+    def iter_attachable_volumes(self, count=None):
+        return self._con.iter_members(uri['attachable-volumes'], count)
+
+    async def get_storage_volume_templates(self):
+        members = await self._con.get_all_members(uri['vol-templates'])
+        return make_collection_dict(members)
+
+    def iter_storage_volume_templates(self, count=None):
+        return self._con.iter_members(uri['vol-templates'], count)
+
+    async def get_connectable_storage_volume_templates(self):
+        members = await self._con.get_all_members(uri['connectable-vol'])
+        return make_collection_dict(members)
+
+    def iter_connectable_storage_volume_templates(self, count=None):
+        return self._con.iter_members(uri['connectable-vol'], count)
+
+    async def add_storage_volume(self, volume, blocking=True,
+                                 verbose=False):
+        task, body = await self._con.post(uri['storage-volumes'], volume)
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+            if 'type' in task and task['type'].startswith('Task'):
+                entity = await self._activity.get_task_associated_resource(
+                    task)
+                volume = await self._con.get(entity['resourceUri'])
+                return volume
+        return task
+
+    async def remove_storage_volume(self, volume, blocking=True,
+                                    verbose=False):
+        task, body = await self._con.delete(volume['uri'])
+        if blocking is True:
+            task = await self._activity.wait4task(task, tout=600,
+                                                  verbose=verbose)
+        return task
+
+    async def get_storage_volumes(self):
+        members = await self._con.get_all_members(uri['storage-volumes'])
+        return make_collection_dict(members)
+
+    def iter_storage_volumes(self, count=None):
+        return self._con.iter_members(uri['storage-volumes'], count)
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+cache.py
+~~~~~~~~~~~~
+
+Conditional GET (ETag) cache and request coalescing for connection
+"""
+
+__title__ = 'cache'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class etag_cache(object):
+
+    # Bodies of GET responses keyed by URI with their ETag. connection
+    # sends If-None-Match for a cached URI and, on 304 Not Modified, returns
+    # a copy of the cached body. The least recently used entries are
+    # evicted beyond maxEntries or maxBytes (of response bodies), and
+    # entries older than ttl seconds, if given, are dropped.
+    #
+    #   con.set_cache(etag_cache(maxEntries=5000))
+    def __init__(self, maxEntries=1000, maxBytes=64 * 1024 * 1024, ttl=None):
+        self._maxEntries = maxEntries
+        self._maxBytes = maxBytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.reset_stats()
+
+    def lookup(self, uri):
+        # The ETag to revalidate uri with, or None
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            etag, body, size, stored = entry
+            if self._ttl is not None and time.time() - stored > self._ttl:
+                self._remove(uri)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            return etag
+
+    def hit(self, uri, etag):
+        # The cached body for a 304 response, or None if it has gone
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(uri)
+            self._stats['hits'] += 1
+            self._stats['bytesSaved'] += entry[2]
+            text = entry[1]
+        # Kept as JSON text, so every caller gets its own copy to modify
+        # and a hit costs no more than parsing the response would have
+        return json.loads(text)
+
+    def store(self, uri, etag, body):
+        if not etag:
+            return
+        text = json.dumps(body)
+        size = len(text)
+        if size > self._maxBytes:
+            return
+        with self._lock:
+            if uri in self._entries:
+                self._remove(uri)
+            self._entries[uri] = (etag, text, size, time.time())
+            self._bytes += size
+            self._stats['stores'] += 1
+            while self._entries and (len(self._entries) > self._maxEntries or
+                                     self._bytes > self._maxBytes):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, uri):
+        with self._lock:
+            if uri in self._entries:
+                self._remove(uri)
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._bytes = 0
+
+    def _remove(self, uri):
+        self._bytes -= self._entries.pop(uri)[2]
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries),
+                        bytes=self._bytes)
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'hits': 0, 'misses': 0, 'stores': 0,
+                           'evictions': 0, 'expired': 0, 'bytesSaved': 0}
+
+
+class _flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.text = None
+        self.error = None
+
+
+class single_flight(object):
+
+    # Coalesces identical concurrent GETs: while a request for a URI is in
+    # flight, other threads asking for the same URI on the same appliance
+    # wait for it instead of sending their own. Results are also reused for
+    # memoize seconds after they arrive. Each waiter gets its own copy of
+    # the result unless copyResults is False, in which case they all share
+    # one object and must not modify it. Connections sharing one instance
+    # share results for the same appliance, so they should log in as the
+    # same user.
+    #
+    #   con.set_single_flight(single_flight(memoize=1))
+    def __init__(self, memoize=0, copyResults=True):
+        self._memoize = memoize
+        self._copyResults = copyResults
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._memo = {}
+        self.reset_stats()
+
+    def call(self, key, func, *args):
+        with self._lock:
+            self._stats['calls'] += 1
+            if self._memoize:
+                memo = self._memo.get(key)
+                if memo is not None and memo[0] > time.time():
+                    self._stats['memoHits'] += 1
+                    return self._result(memo[1])
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = _flight()
+                self._flights[key] = flight
+                leader = True
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._result(flight)
+        try:
+            flight.result = func(*args)
+            if self._copyResults and type(flight.result) in (dict, list):
+                # Snapshot before the caller gets a chance to modify it
+                flight.text = json.dumps(flight.result)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if self._memoize and flight.error is None:
+                    now = time.time()
+                    if len(self._memo) > 10000:
+                        self._memo = dict((k, v) for k, v in
+                                          list(self._memo.items())
+                                          if v[0] > now)
+                    self._memo[key] = (now + self._memoize, flight)
+            flight.done.set()
+        return flight.result
+
+    def _result(self, flight):
+        if flight.text is not None:
+            return json.loads(flight.text)
+        return flight.result
+
+    def forget(self, key):
+        with self._lock:
+            self._memo.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'calls': 0, 'coalesced': 0, 'memoHits': 0}
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -234,6 +234,15 @@ def get_member(mlist):
     return mlist['members'][0]
 
 
+def make_collection_dict(members):
+    # A collection body holding every member, for helpers that have always
+    # returned the body of a single GET
+    return {'members': members,
+            'count': len(members),
+            'total': len(members),
+            'start': 0}
+
+
 ############################################################################
 # Create default Resource Instances
 ############################################################################
@@ -949,18 +958,51 @@ def make_alertMap_dict(notes, etag, state='Active', user='None',
         }
 
 
+class page(object):
+    """
+    A single page of a collection along with the cursors needed to walk
+    the rest of it. Returned by connection.get_page() so that pagination
+    state lives with the caller rather than on the shared connection.
+    """
+
+    def __init__(self, body):
+        if type(body) is not dict:
+            body = {}
+        self.body = body
+        self.members = body.get('members') or []
+        self.nextPageUri = body.get('nextPageUri')
+        self.prevPageUri = body.get('prevPageUri')
+        self.total = body.get('total', 0)
+        self.count = body.get('count', 0)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+
 class pages(object):
 
     def __init__(self, page, connection):
         self._con = connection
-        self.currentPage = page
+        if hasattr(page, 'nextPageUri'):
+            self.currentPage = page.members
+            self._nextPage = page.nextPageUri
+        else:
+            # Legacy callers pass the members of the last page read on this
+            # thread with connection.get()
+            self.currentPage = page
+            self._nextPage = connection._nextPage
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self._con._nextPage is not None:
-            self.currentPage = self._con.getNextPage()
+        if self._nextPage is not None:
+            nextPage = self._con.get_page(self._nextPage)
+            self._nextPage = nextPage.nextPageUri
+            self.currentPage = nextPage.members
             return self.currentPage
         else:
             raise StopIteration
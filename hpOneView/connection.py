@@ -36,25 +36,92 @@ __status__ = 'Development'
 # THE SOFTWARE.
 ###
 
+import hashlib
 import http.client
 import json
 import shutil  # for shutil.copyfileobj()
 import mmap  # so we can upload the iso without having to load it in memory
 import os
+import select
+import ssl
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from hpOneView.common import *
 from hpOneView.exceptions import *
+from hpOneView.instrumentation import request_info, timed_https_connection
+from hpOneView.query import query_builder
+import hpOneView.retry as retry_module
+
+
+# X-API-Version values the library can send; connections pick the highest
+# one the appliance also supports
+DefaultApiVersions = (120,)
+
+# What /rest/version returned for each host, shared by every connection in
+# the process so that the version is only asked for once
+_versionInfo = {}
+_versionInfoLock = threading.Lock()
+
+
+def set_default_api_versions(apiVersions):
+    global DefaultApiVersions
+    DefaultApiVersions = tuple(apiVersions)
+
+
+def get_default_api_versions():
+    return DefaultApiVersions
+
+
+def get_version_info(host):
+    with _versionInfoLock:
+        return _versionInfo.get(host)
+
+
+def put_version_info(host, version):
+    with _versionInfoLock:
+        _versionInfo[host] = version
+
+
+def forget_version_info(host=None):
+    # Makes the next connection to host (or to any host) ask again, e.g.
+    # after an appliance upgrade
+    with _versionInfoLock:
+        if host is None:
+            _versionInfo.clear()
+        else:
+            _versionInfo.pop(host, None)
+
+
+def choose_api_version(apiVersions, version):
+    # The highest of apiVersions within the appliance's minimumVersion and
+    # currentVersion
+    usable = [v for v in apiVersions
+              if v >= version.get('minimumVersion', v) and
+              v <= version.get('currentVersion', v)]
+    if not usable:
+        raise HPOneViewException('Unsupported API Version: the appliance '
+                                 'supports %s to %s, the client %s' % (
+                                     version.get('minimumVersion'),
+                                     version.get('currentVersion'),
+                                     ', '.join(str(v) for v in apiVersions)))
+    return max(usable)
 
 
 class connection(object):
 
-    def __init__(self, applianceIp):
+    def __init__(self, applianceIp, sessionCache=None, apiVersions=None):
         self._session = None
         self._host = applianceIp
         self._cred = None
-        self._apiVersion = 120
+        # Negotiated before the first request, so that the proxy and trust
+        # settings made after construction apply to it
+        self._apiVersions = apiVersions
+        self._apiVersion = None
+        self._versionLock = threading.Lock()
         self._headers = {
-            'X-API-Version': self._apiVersion,
             'Accept': 'application/json',
             'Content-Type': 'application/json'}
         self._proxyHost = None
@@ -62,20 +129,75 @@ class connection(object):
         self._doProxy = False
         self._sslTrustedBundle = None
         self._sslTrustAll = True
-        self._nextPage = None
-        self._prevPage = None
-        self._numTotalRecords = 0
-        self._numDisplayedRecords = 0
-        self._validateVersion()
-
-    def _validateVersion(self):
-        version = self.get(uri['version'])
-        if 'minimumVersion' in version:
-            if self._apiVersion < version['minimumVersion']:
-                raise HPOneViewException('Unsupported API Version')
-        if 'currentVersion' in version:
-            if self._apiVersion > version['currentVersion']:
-                raise HPOneViewException('Unsupported API Version')
+        # Cursor of the last page read by getNextPage()/getPrevPage(); kept
+        # per thread so a shared connection does not mix up pagination
+        self._local = threading.local()
+        self._pageSize = 500
+        self._prefetchWorkers = 4
+        self._poolSize = 8
+        self._pool = {}
+        self._sslContext = None
+        self._taskTracker = None
+        self._preRequest = []
+        self._postRequest = []
+        self._retryPolicy = None
+        self._throttle = None
+        self._cache = None
+        self._singleFlight = None
+        self._resourceCache = None
+        # A session.session_cache shared with other processes, or None
+        self._sessionCache = sessionCache
+        self._loginLock = threading.Lock()
+
+    def set_api_versions(self, apiVersions):
+        # X-API-Version values to choose from; takes effect on the next
+        # request
+        with self._versionLock:
+            self._apiVersions = tuple(apiVersions)
+            self._apiVersion = None
+
+    def get_api_version(self):
+        self._negotiate_version()
+        return self._apiVersion
+
+    def _negotiate_version(self):
+        if self._apiVersion is not None:
+            return
+        with self._versionLock:
+            if self._apiVersion is not None:
+                return
+            apiVersions = self._apiVersions
+            if apiVersions is None:
+                apiVersions = get_default_api_versions()
+            version = get_version_info(self._host)
+            if version is None and self._sessionCache is not None:
+                version = self._sessionCache.get_version_info(self._host)
+            if version is None:
+                resp, version = self._do_http('GET', uri['version'], '')
+                if resp.status >= 400:
+                    raise HPOneViewException(version)
+                if self._sessionCache is not None:
+                    self._sessionCache.put_version_info(self._host, version)
+            put_version_info(self._host, version)
+            self._apiVersion = choose_api_version(apiVersions, version)
+            self._headers = dict(self._headers,
+                                 **{'X-API-Version': self._apiVersion})
+
+    @property
+    def _nextPage(self):
+        return getattr(self._local, 'nextPage', None)
+
+    @property
+    def _prevPage(self):
+        return getattr(self._local, 'prevPage', None)
+
+    @property
+    def _numTotalRecords(self):
+        return getattr(self._local, 'numTotalRecords', 0)
+
+    @property
+    def _numDisplayedRecords(self):
+        return getattr(self._local, 'numDisplayedRecords', 0)
 
     def set_proxy(self, proxyHost, proxyPort):
         self._proxyHost = proxyHost
@@ -85,6 +207,85 @@ class connection(object):
     def set_trusted_ssl_bundle(self, sslBundle):
         self._sslTrustAll = False
         self._sslTrustedBundle = sslBundle
+        # Pooled connections were negotiated with the old trust settings
+        self._sslContext = None
+        self.close()
+
+    def set_task_tracker(self, tracker):
+        self._taskTracker = tracker
+
+    def get_task_tracker(self):
+        return self._taskTracker
+
+    def set_retry_policy(self, policy):
+        # None uses retry.DefaultRetryPolicy, retry.no_retry() disables
+        # retries
+        self._retryPolicy = policy
+
+    def _get_retry_policy(self):
+        if self._retryPolicy is None:
+            return retry_module.DefaultRetryPolicy
+        return self._retryPolicy
+
+    def set_throttle(self, throttle):
+        # A throttle.throttle, which may be shared by all the connections to
+        # one appliance, or None for no limits
+        self._throttle = throttle
+
+    def get_throttle(self):
+        return self._throttle
+
+    def set_cache(self, cache):
+        # A cache.etag_cache for conditional GETs, or None
+        self._cache = cache
+
+    def get_cache(self):
+        return self._cache
+
+    def set_single_flight(self, flight):
+        # A cache.single_flight to coalesce identical concurrent GETs, or
+        # None
+        self._singleFlight = flight
+
+    def set_resource_cache(self, resourceCache):
+        # A scmb.resource_cache that answers get_entity_byfield() and
+        # get_entities_byfield() for the collections it holds, or None
+        self._resourceCache = resourceCache
+
+    def get_resource_cache(self):
+        return self._resourceCache
+
+    def _invalidate(self, uri):
+        if self._cache is not None:
+            self._cache.invalidate(uri)
+        if self._singleFlight is not None:
+            self._singleFlight.forget((self._host, uri))
+
+    def add_pre_request_callback(self, callback):
+        # callback(info) is called with a request_info before each request;
+        # the lists are replaced, not changed, so requests in flight on other
+        # threads are unaffected
+        self._preRequest = self._preRequest + [callback]
+
+    def add_post_request_callback(self, callback):
+        # callback(info) is called after each request, with info.error set
+        # if it raised
+        self._postRequest = self._postRequest + [callback]
+
+    def remove_request_callback(self, callback):
+        self._preRequest = [c for c in self._preRequest if c != callback]
+        self._postRequest = [c for c in self._postRequest if c != callback]
+
+    def _start_request(self, method, path, bytesOut=0):
+        info = request_info(self._host, method, path, bytesOut)
+        for callback in self._preRequest:
+            callback(info)
+        return info
+
+    def _finish_request(self, info, status=None, bytesIn=0, error=None):
+        info.finished(status, bytesIn, error)
+        for callback in self._postRequest:
+            callback(info)
 
     def get_session(self):
         return self._session
@@ -101,152 +302,541 @@ class connection(object):
     def make_url(self, path):
         return 'https://%s%s' % (self._host, path)
 
-    def do_http(self, method, path, body):
-        bConnected = False
-        while bConnected is False:
+    def do_http(self, method, path, body, headers=None):
+        if self._apiVersion is None and path != uri['version']:
+            self._negotiate_version()
+        auth = self._headers.get('auth')
+        resp, respBody = self._do_http(method, path, body, headers)
+        if resp.status == 401 and auth is not None and \
+                self._cred is not None and path != uri['loginSessions']:
+            # The session expired or the appliance dropped it (a cached one
+            # may simply be stale), so log in again and resend once
+            with self._loginLock:
+                if self._headers.get('auth') == auth:
+                    self._set_auth(self._new_session(auth))
+            resp, respBody = self._do_http(method, path, body, headers)
+        return resp, respBody
+
+    def _do_http(self, method, path, body, headers=None):
+        # self._headers is never modified in place, only replaced, so this
+        # snapshot stays consistent for the whole request
+        reqHeaders = self._headers
+        if headers:
+            reqHeaders = dict(reqHeaders)
+            reqHeaders.update(headers)
+        info = self._start_request(method, path, len(body) if body else 0)
+        policy = self._get_retry_policy()
+        throttle = self._throttle
+        start = time.time()
+        attempt = 0
+        while True:
+            key = self._pool_key()
+            conn, reused = self._acquire_conn(key)
+            if throttle is not None:
+                # Every attempt counts against the limits, retries included
+                info.throttled += throttle.acquire(method)
+            info.sending(reused)
             try:
-                if self._sslTrustAll is False:
-                    import ssl
-                    context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-                    context.verify_mode = ssl.CERT_REQUIRED
-                    context.load_verify_locations(self._sslTrustedBundle)
-                    if self._doProxy is False:
-                        conn = http.client.HTTPSConnection(self._host,
-                                                           context=context)
-                    else:
-                        conn = http.client.HTTPSConnection(self._proxyHost,
-                                                           self._proxyPort,
-                                                           context=context)
-                        conn.set_tunnel(self._host, 443)
-                    conn.request(method, path, body, self._headers)
-                else:
-                    import ssl
-                    context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-                    context.verify_mode = ssl.CERT_NONE
-                    if self._doProxy is False:
-                        conn = http.client.HTTPSConnection(self._host,
-                                                           context=context)
-                    else:
-                        conn = http.client.HTTPSConnection(self._proxyHost,
-                                                           self._proxyPort,
-                                                           context=context)
-                        conn.set_tunnel(self._host, 443)
-                    conn.request(method, path, body, self._headers)
-                resp = conn.getresponse()
                 try:
+                    conn.request(method, path, body, reqHeaders)
+                    resp = conn.getresponse()
+                    info.first_byte(conn)
                     tempbytes = resp.read()
-                    tempbody = tempbytes.decode('utf-8')
-                except UnicodeDecodeError:  # Might be binary data
-                    tempbody = tempbytes
-                    conn.close()
-                    bConnected = True
-                    return resp, tempbody
-                if tempbody:
-                    try:
-                        body = json.loads(tempbody)
-                    except ValueError:
-                        body = tempbody
+                finally:
+                    if throttle is not None:
+                        throttle.release(method)
+            except (http.client.HTTPException, OSError) as e:
                 conn.close()
-                bConnected = True
-            except http.client.BadStatusLine:
-                print('Bad Status Line. Trying again...')
-                conn.close()
-                time.sleep(1)
+                if reused and isinstance(e, (http.client.BadStatusLine,
+                                             ConnectionError)):
+                    # The appliance closed the idle keep-alive socket, so
+                    # reconnect and send the request again
+                    info.retries += 1
+                    continue
+                delay = policy.get_delay(method, attempt, time.time() - start,
+                                         error=e)
+                if delay is None:
+                    self._finish_request(info, error=e)
+                    raise
+                attempt += 1
+                info.retries += 1
+                time.sleep(delay)
                 continue
+            except Exception as e:
+                conn.close()
+                self._finish_request(info, error=e)
+                raise
+            self._release_conn(key, conn, resp)
+            delay = policy.get_delay(method, attempt, time.time() - start,
+                                     status=resp.status,
+                                     retryAfter=resp.getheader('Retry-After'))
+            if delay is None:
+                break
+            attempt += 1
+            info.retries += 1
+            time.sleep(delay)
+        self._finish_request(info, resp.status, len(tempbytes))
+        try:
+            tempbody = tempbytes.decode('utf-8')
+        except UnicodeDecodeError:  # Might be binary data
+            return resp, tempbytes
+        if tempbody:
+            try:
+                body = json.loads(tempbody)
+            except ValueError:
+                body = tempbody
         return resp, body
 
+    ###########################################################################
+    # Keep-alive connection pool
+    ###########################################################################
+    def set_pool_size(self, poolSize):
+        self._poolSize = poolSize
+
+    def close(self):
+        pool = self._pool
+        self._pool = {}
+        for idle in list(pool.values()):
+            while idle:
+                try:
+                    idle.pop().close()
+                except IndexError:
+                    break
+
+    def _pool_key(self):
+        if self._doProxy is False:
+            return (self._host, None, None)
+        return (self._host, self._proxyHost, self._proxyPort)
+
+    def _get_ssl_context(self):
+        context = self._sslContext
+        if context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
+            if self._sslTrustAll is False:
+                context.verify_mode = ssl.CERT_REQUIRED
+                context.load_verify_locations(self._sslTrustedBundle)
+            else:
+                context.verify_mode = ssl.CERT_NONE
+            self._sslContext = context
+        return context
+
+    def _new_conn(self, key):
+        host, proxyHost, proxyPort = key
+        context = self._get_ssl_context()
+        if proxyHost is None:
+            conn = timed_https_connection(host, context=context)
+        else:
+            conn = timed_https_connection(proxyHost, proxyPort,
+                                          context=context)
+            conn.set_tunnel(host, 443)
+        return conn
+
+    def _acquire_conn(self, key):
+        # deque.pop() and deque.append() are atomic, so the pool does not
+        # need a lock when the connection is shared between threads
+        idle = self._pool.get(key)
+        while idle:
+            try:
+                conn = idle.pop()
+            except IndexError:
+                break
+            if self._is_stale(conn):
+                conn.close()
+                continue
+            return conn, True
+        return self._new_conn(key), False
+
+    def _release_conn(self, key, conn, resp):
+        if resp.will_close or conn.sock is None:
+            conn.close()
+            return
+        idle = self._pool.setdefault(key, deque())
+        if len(idle) >= self._poolSize:
+            conn.close()
+            return
+        idle.append(conn)
+
+    def _is_stale(self, conn):
+        # An idle keep-alive socket should have nothing to read; if it is
+        # readable the appliance has closed it (or sent garbage)
+        if conn.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
     def encode_multipart_formdata(self, fields, files, baseName, verbose=False):
         """
         fields is a sequence of (name, value) elements for regular form fields.
-        files is a sequence of (name, filename, value) elements for data
-        to be uploaded as files
-        Return (content_type, body) ready for httplib.HTTP instance
+        files is the path of the file to be uploaded; the encoded body is
+        written to files + '.b64'
+        Return content_type for the body
         """
+        content_type, preamble, epilogue = self._multipart_parts(baseName,
+                                                                 verbose)
+        with open(files, 'rb') as fin:
+            with open(files + '.b64', 'wb') as fout:
+                fout.write(preamble)
+                shutil.copyfileobj(fin, fout)
+                fout.write(epilogue)
+        return content_type
+
+    def _multipart_parts(self, baseName, verbose=False):
+        # (content_type, preamble, epilogue); post_multipart() streams the
+        # file between the preamble and the epilogue instead of writing a
+        # copy like encode_multipart_formdata() does
         BOUNDARY = '----------ThIs_Is_tHe_bouNdaRY_$'
         CRLF = '\r\n'
         content_type = 'multipart/form-data; boundary=%s' % BOUNDARY
         if verbose is True:
             print(('Encoding ' + baseName + ' for upload...'))
-        fin = open(files, 'rb')
-        fout = open(files + '.b64', 'wb')
-        fout.write(bytearray('--' + BOUNDARY + CRLF, 'utf-8'))
-        fout.write(bytearray('Content-Disposition: form-data'
-                             '; name="file"; filename="' +
-                             baseName + '"' + CRLF, "utf-8"))
-        fout.write(bytearray('Content-Type: application/octet-stream' + CRLF,
-                             'utf-8'))
-        fout.write(bytearray(CRLF, 'utf-8'))
-        shutil.copyfileobj(fin, fout)
-        fout.write(bytearray(CRLF, 'utf-8'))
-        fout.write(bytearray('--' + BOUNDARY + '--' + CRLF, 'utf-8'))
-        fout.write(bytearray(CRLF, 'utf-8'))
-        fout.close()
-        fin.close()
-        return content_type
+        preamble = bytearray('--' + BOUNDARY + CRLF, 'utf-8')
+        preamble += bytearray('Content-Disposition: form-data'
+                              '; name="file"; filename="' +
+                              baseName + '"' + CRLF, 'utf-8')
+        preamble += bytearray('Content-Type: application/octet-stream' + CRLF,
+                              'utf-8')
+        preamble += bytearray(CRLF, 'utf-8')
+        epilogue = bytearray(CRLF, 'utf-8')
+        epilogue += bytearray('--' + BOUNDARY + '--' + CRLF, 'utf-8')
+        epilogue += bytearray(CRLF, 'utf-8')
+        return content_type, bytes(preamble), bytes(epilogue)
 
     def post_multipart(self, uri, fields, files, baseName, verbose=False):
-        content_type = self.encode_multipart_formdata(fields, files, baseName,
-                                                      verbose)
-        inputfile = open(files + '.b64', 'rb')
-        mappedfile = mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ)
+        content_type, preamble, epilogue = self._multipart_parts(baseName,
+                                                                 verbose)
+        fileSize = os.path.getsize(files)
+        totalSize = len(preamble) + fileSize + len(epilogue)
         if verbose is True:
             print(('Uploading ' + files + '...'))
-        if self._doProxy is False:
-            conn = http.client.HTTPSConnection(self._host)
-        else:
-            conn = http.client.HTTPSConnection(self._proxyHost,
-                                               self._proxyPort)
-            conn.set_tunnel(self._host, 443)
-        #conn.set_debuglevel(1)
-        conn.connect()
-        conn.putrequest('POST', uri)
-        conn.putheader('uploadfilename', baseName)
-        conn.putheader('auth', self._headers['auth'])
-        conn.putheader('Content-Type', content_type)
-        totalSize = os.path.getsize(files + '.b64')
-        conn.putheader('Content-Length', totalSize)
-        conn.endheaders()
-        while mappedfile.tell() < mappedfile.size():
-            # Send 1MB at a time
-            # NOTE: Be careful raising this value as the read chunk
-            # is stored in RAM
-            readSize = 1048576
-            conn.send(mappedfile.read(readSize))
-            if verbose is True:
-                print('%d bytes sent... \r' % mappedfile.tell())
-        mappedfile.close()
-        inputfile.close()
-        os.remove(files + '.b64')
-        response = conn.getresponse()
-        body = response.read().decode('utf-8')
+        key = self._pool_key()
+        conn = self._new_conn(key)
+        info = self._start_request('POST', uri, totalSize)
+        throttle = self._throttle
+        if throttle is not None:
+            info.throttled += throttle.acquire('POST')
+        try:
+            conn.connect()
+            conn.putrequest('POST', uri)
+            conn.putheader('uploadfilename', baseName)
+            conn.putheader('auth', self._headers['auth'])
+            conn.putheader('Content-Type', content_type)
+            conn.putheader('Content-Length', totalSize)
+            conn.endheaders()
+            conn.send(preamble)
+            with open(files, 'rb') as inputfile:
+                self._send_file(conn, inputfile, fileSize, verbose)
+            conn.send(epilogue)
+            response = conn.getresponse()
+            info.first_byte(conn)
+            body = response.read()
+        except Exception as e:
+            conn.close()
+            self._finish_request(info, error=e)
+            raise
+        finally:
+            if throttle is not None:
+                throttle.release('POST')
+        self._release_conn(key, conn, response)
+        self._finish_request(info, response.status, len(body))
+        body = body.decode('utf-8')
         if body:
             try:
                 body = json.loads(body)
             except ValueError:
-                body = response.read().decode('utf-8')
-        conn.close()
+                pass
         return response, body
 
+    def _send_file(self, conn, inputfile, fileSize, verbose=False):
+        # Send straight from the page cache; slicing the mapping with a
+        # memoryview does not copy the chunk
+        if fileSize == 0:
+            return
+        mappedfile = mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(mappedfile)
+            try:
+                # NOTE: Be careful raising this value as the chunk is
+                # encrypted into a buffer of the same size
+                readSize = 1048576
+                sent = 0
+                while sent < fileSize:
+                    conn.sock.sendall(view[sent:sent + readSize])
+                    sent = min(sent + readSize, fileSize)
+                    if verbose is True:
+                        print('%d bytes sent... \r' % sent)
+            finally:
+                view.release()
+        finally:
+            mappedfile.close()
+
+    ###########################################################################
+    # Streaming downloads
+    ###########################################################################
+    def download(self, uri, filename, chunkSize=1048576, progress=None,
+                 checksum=None, resume=False):
+        # Pipe the response body to a file (a path or a writable file
+        # object) chunkSize bytes at a time. progress is called with
+        # (bytesDone, bytesTotal), checksum names a hashlib algorithm whose
+        # hex digest is returned, and resume continues a partial file with
+        # a Range request when the appliance supports it.
+        digest = hashlib.new(checksum) if checksum else None
+        # The version probe takes a throttle slot of its own, so it must
+        # not run while this transfer holds one
+        self._negotiate_version()
+        throttle = self._throttle
+        if throttle is not None:
+            # Held for the whole transfer, redirects included
+            throttle.acquire('GET')
+        try:
+            if hasattr(filename, 'write'):
+                return self._download(uri, filename, 0, chunkSize, progress,
+                                      digest)
+            offset = 0
+            if resume is True and os.path.exists(filename):
+                offset = os.path.getsize(filename)
+            with open(filename, 'ab' if offset else 'wb') as fout:
+                return self._download(uri, fout, offset, chunkSize, progress,
+                                      digest)
+        finally:
+            if throttle is not None:
+                throttle.release('GET')
+
+    def _download(self, uri, fout, offset, chunkSize, progress, digest):
+        headers = None
+        if offset:
+            headers = {'Range': 'bytes=%d-' % offset}
+        key = self._pool_key()
+        conn, reused = self._acquire_conn(key)
+        info = self._start_request('GET', uri)
+        info.sending(reused)
+        done = offset
+        try:
+            resp = self._request_stream(conn, reused, key, 'GET', uri,
+                                        headers)
+            conn = resp.conn
+            info.first_byte(conn)
+            if resp.status == 302:
+                resp.read()
+                self._release_conn(key, conn, resp)
+                self._finish_request(info, resp.status)
+                return self._download(resp.getheader('Location'), fout,
+                                      offset, chunkSize, progress, digest)
+            if resp.status == 416 and offset:
+                # The partial file is already complete
+                resp.read()
+                self._release_conn(key, conn, resp)
+                self._finish_request(info, resp.status)
+                if digest is not None:
+                    self._hash_existing(fout, digest)
+                    return digest.hexdigest()
+                return None
+            if resp.status >= 400:
+                body = resp.read().decode('utf-8', 'replace')
+                self._release_conn(key, conn, resp)
+                self._finish_request(info, resp.status, len(body))
+                try:
+                    body = json.loads(body)
+                except ValueError:
+                    pass
+                raise HPOneViewException(body)
+            if resp.status == 206:
+                if digest is not None:
+                    self._hash_existing(fout, digest)
+            elif offset:
+                # The appliance ignored the Range header, start over
+                fout.seek(0)
+                fout.truncate()
+                offset = 0
+            length = resp.getheader('Content-Length')
+            total = offset + int(length) if length is not None else None
+            start = done = offset
+            while True:
+                chunk = resp.read(chunkSize)
+                if not chunk:
+                    break
+                fout.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
+        except Exception as e:
+            conn.close()
+            if info.status is None:
+                # Not reported already by the redirect or error paths
+                self._finish_request(info, error=e)
+            raise
+        self._release_conn(key, conn, resp)
+        self._finish_request(info, resp.status, done - start)
+        if digest is not None:
+            return digest.hexdigest()
+        return None
+
+    def _request_stream(self, conn, reused, key, method, path, headers):
+        # Send a request and return the unread response; resp.conn is the
+        # connection it arrived on (a fresh one if a pooled socket was stale)
+        self._negotiate_version()
+        reqHeaders = self._headers
+        if headers:
+            reqHeaders = dict(reqHeaders)
+            reqHeaders.update(headers)
+        while True:
+            try:
+                conn.request(method, path, '', reqHeaders)
+                resp = conn.getresponse()
+            except (http.client.BadStatusLine, ConnectionError):
+                conn.close()
+                if not reused:
+                    raise
+                conn, reused = self._new_conn(key), False
+                continue
+            resp.conn = conn
+            return resp
+
+    def _hash_existing(self, fout, digest):
+        with open(fout.name, 'rb') as fin:
+            while True:
+                chunk = fin.read(1048576)
+                if not chunk:
+                    break
+                digest.update(chunk)
+
     ###########################################################################
     # Utility functions for making requests - the HTTP verbs
     ###########################################################################
     def get(self, uri):
-        resp, body = self.do_http('GET', uri, '')
-        if resp.status >= 400:
-            raise HPOneViewException(body)
-        if resp.status == 302:
-            body = self.get(resp.getheader('Location'))
+        body = self._get(uri)
         if type(body) is dict:
+            local = self._local
             if 'nextPageUri' in body:
-                self._nextPage = body['nextPageUri']
+                local.nextPage = body['nextPageUri']
             if 'prevPageUri' in body:
-                self._prevPage = body['prevPageUri']
+                local.prevPage = body['prevPageUri']
             if 'total' in body:
-                self._numTotalRecords = body['total']
+                local.numTotalRecords = body['total']
             if 'count' in body:
-                self._numDisplayedRecords = body['count']
+                local.numDisplayedRecords = body['count']
+        return body
+
+    def _get(self, uri):
+        flight = self._singleFlight
+        if flight is not None:
+            # Keyed on the appliance too, since one single_flight may be
+            # shared by connections to several
+            return flight.call((self._host, uri), self._get_uncoalesced,
+                               uri)
+        return self._get_uncoalesced(uri)
+
+    def _get_uncoalesced(self, uri, conditional=True):
+        cache = self._cache
+        headers = None
+        etag = None
+        if cache is not None and conditional:
+            etag = cache.lookup(uri)
+            if etag is not None:
+                headers = {'If-None-Match': etag}
+        resp, body = self.do_http('GET', uri, '', headers)
+        if resp.status == 304 and etag is not None:
+            body = cache.hit(uri, etag)
+            if body is not None:
+                return body
+            # Evicted since the lookup, so fetch it again in full. Not
+            # through _get(): this thread may lead the single flight for uri
+            # and would wait on itself.
+            return self._get_uncoalesced(uri, conditional=False)
+        if resp.status >= 400:
+            raise HPOneViewException(body)
+        if resp.status == 302:
+            body = self._get(resp.getheader('Location'))
+        elif cache is not None and resp.status == 200 and \
+                type(body) is dict:
+            etag = resp.getheader('ETag')
+            if etag is None:
+                etag = body.get('eTag')
+            cache.store(uri, etag, body)
         return body
 
+    def get_page(self, uri):
+        return page(self._get(uri))
+
+    def set_page_size(self, pageSize):
+        self._pageSize = pageSize
+
+    def set_prefetch_workers(self, workers):
+        self._prefetchWorkers = workers
+
+    def iter_members(self, uri, count=None):
+        # Walk the collection one page at a time so that only a single page
+        # is ever held in memory, no matter how large the collection is
+        if count is None:
+            count = self._pageSize
+        return self._iter_pages(self._page_uri(uri, 0, count))
+
+    def iter_members_parallel(self, uri, count=None, workers=None):
+        # Use total/count from the first page to request the remaining pages
+        # concurrently, yielding members in collection order. Falls back to
+        # following nextPageUri when the appliance does not report totals.
+        if count is None:
+            count = self._pageSize
+        if workers is None:
+            workers = self._prefetchWorkers
+        first = self.get_page(self._page_uri(uri, 0, count))
+        for member in first.members:
+            yield member
+        if not first.nextPageUri or not first.members:
+            return
+        if not first.total or not first.count or workers < 2:
+            for member in self._iter_pages(first.nextPageUri):
+                yield member
+            return
+        # The appliance may cap the page size below what was asked for
+        pageSize = first.count
+        starts = iter(range(pageSize, first.total, pageSize))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        try:
+            # Keep a bounded window of pages in flight so memory stays flat
+            for start in starts:
+                pending.append(executor.submit(
+                    self.get_page, self._page_uri(uri, start, pageSize)))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                current = pending.popleft().result()
+                start = next(starts, None)
+                if start is not None:
+                    pending.append(executor.submit(
+                        self.get_page, self._page_uri(uri, start, pageSize)))
+                for member in current.members:
+                    yield member
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def get_all_members(self, uri, count=None, workers=None):
+        return list(self.iter_members_parallel(uri, count, workers))
+
+    def _iter_pages(self, pageUri):
+        while pageUri:
+            current = self.get_page(pageUri)
+            for member in current.members:
+                yield member
+            if not current.members or current.nextPageUri == pageUri:
+                break
+            pageUri = current.nextPageUri
+
+    def _page_uri(self, uri, start, count):
+        path, _, query = uri.partition('?')
+        params = [p for p in query.split('&')
+                  if p and not p.startswith(('start=', 'count='))]
+        params.append('start=%d' % start)
+        params.append('count=%d' % count)
+        return path + '?' + '&'.join(params)
+
     def getNextPage(self):
         body = self.get(self._nextPage)
         return get_members(body)
@@ -265,8 +855,9 @@ class connection(object):
             members = self.getPrevPage()
         return members
 
-    def put(self, uri, body):
-        resp, body = self.do_http('PUT', uri, json.dumps(body))
+    def put(self, uri, body, headers=None):
+        self._invalidate(uri)
+        resp, body = self.do_http('PUT', uri, json.dumps(body), headers)
         if resp.status >= 400:
             raise HPOneViewException(body)
         elif resp.status == 202:
@@ -274,45 +865,42 @@ class connection(object):
             return task, body
         return None, body
 
-    def post(self, uri, body):
-        resp, body = self.do_http('POST', uri, json.dumps(body))
+    def post(self, uri, body, headers=None):
+        self._invalidate(uri)
+        resp, body = self.do_http('POST', uri, json.dumps(body), headers)
         if resp.status >= 400:
-            raise HPOneViewException('response: %s\n%s' % (resp.status, body))
+            errorCode = body.get('errorCode') if type(body) is dict else None
+            raise HPOneViewException('response: %s\n%s' % (resp.status, body),
+                                     errorCode)
         elif resp.status == 202:
             task = self.get(resp.getheader('Location'))
             return task, body
         return None, body
 
 
-    def get_entities_byrange(self, uri, field, xmin, xmax, count=-1):
-        new_uri = uri + '?filter="\'' + field + '\'%20>%20\'' + xmin \
-            + '\'"&filter="\'' + field + '\'%20<%20\'' + xmax \
-            + '\'"&start=0&count=' + str(count)
-        body = self.get(new_uri)
+    def get_entities_byquery(self, uri, query):
+        body = self.get(query.build(uri))
         return get_members(body)
 
+    def get_entities_byrange(self, uri, field, xmin, xmax, count=-1):
+        query = query_builder().between(field, xmin, xmax).start(0) \
+            .count(count)
+        return self.get_entities_byquery(uri, query)
 
     def get_entities_byfield(self, uri, field, value, count=-1):
-        new_uri = uri + '?start=0&count=' + str(count) \
-            + '&filter=' + field + '=\'' + value + '\''
-        try:
-            body = self.get(new_uri)
-        except:
-            print(new_uri)
-            raise
-        return get_members(body)
-
-
-    def get_entity_byfield(self, uri, field, value, count=-1):
-        new_uri = uri + '?filter="\'' + field + '\'%20=%20\'' + value \
-            + '\'"&start=0&count=' + str(count)
-
-        try:
-            body = self.get(new_uri)
-        except:
-            print(new_uri)
-            raise
-        return get_member(body)
+        resourceCache = self._resourceCache
+        if resourceCache is not None and resourceCache.holds(uri):
+            return resourceCache.find(uri, field, value, count)
+        query = query_builder().where(field, value).start(0).count(count)
+        return self.get_entities_byquery(uri, query)
+
+    def get_entity_byfield(self, uri, field, value, count=1):
+        # Only the first match is returned, so by default only one is fetched
+        resourceCache = self._resourceCache
+        if resourceCache is not None and resourceCache.holds(uri):
+            return resourceCache.find_one(uri, field, value)
+        query = query_builder().where(field, value).start(0).count(count)
+        return get_member(self.get(query.build(uri)))
 
     def conditional_post(self, uri, body):
         try:
@@ -323,7 +911,8 @@ class connection(object):
             # so we just try to find an existing entity with the same name
             # and return it assuming all names are unique (which is a
             # reasonable assumption)
-            if 'DUPLICATE' in e.errorCode and 'NAME' in e.errorCode:
+            if e.errorCode and 'DUPLICATE' in e.errorCode and \
+                    'NAME' in e.errorCode:
                 try:
                     entity = self.get_entity_byfield(uri, 'name', body['name'])
                 except Exception:
@@ -335,8 +924,9 @@ class connection(object):
                 raise e
         return entity
 
-    def delete(self, uri):
-        resp, body = self.do_http('DELETE', uri, '')
+    def delete(self, uri, headers=None):
+        self._invalidate(uri)
+        resp, body = self.do_http('DELETE', uri, '', headers)
         if resp.status >= 400 and resp.status != 404:
             raise HPOneViewException(body)
         elif resp.status == 202:
@@ -369,17 +959,31 @@ class connection(object):
     ###########################################################################
     def login(self, cred, verbose=False):
         self._cred = cred
-        try:
-            task, body = self.post(uri['loginSessions'], self._cred)
-        except HPOneViewException:
-            raise
-        auth = body['sessionID']
-        # Add the auth ID to the headers dictionary
-        self._headers['auth'] = auth
-        self._session = True
+        auth = None
+        if self._sessionCache is not None:
+            auth = self._sessionCache.get_session(self._host, cred)
+        if auth is None:
+            auth = self._new_session()
+        self._set_auth(auth)
         if verbose is True:
             print(('Session Key: ' + auth))
 
+    def _new_session(self, staleAuth=None):
+        if self._sessionCache is not None and staleAuth is not None:
+            self._sessionCache.remove_session(self._host, self._cred,
+                                              staleAuth)
+        task, body = self.post(uri['loginSessions'], self._cred)
+        auth = body['sessionID']
+        if self._sessionCache is not None:
+            self._sessionCache.put_session(self._host, self._cred, auth)
+        return auth
+
+    def _set_auth(self, auth):
+        # Add the auth ID to a new headers dictionary; requests in flight on
+        # other threads keep using the one they started with
+        self._headers = dict(self._headers, auth=auth)
+        self._session = True
+
     def logout(self, verbose=False):
         #resp, body = self.do_http(method, uri['loginSessions'] \
         #                        , body, self._headers)
@@ -389,6 +993,11 @@ class connection(object):
             raise
         if verbose is True:
             print('Logged Out')
-        del self._headers['auth']
+        if self._sessionCache is not None and self._cred is not None:
+            self._sessionCache.remove_session(self._host, self._cred,
+                                              self._headers.get('auth'))
+        headers = dict(self._headers)
+        del headers['auth']
+        self._headers = headers
         self._session = False
         return None
@@ -39,8 +39,12 @@ __status__ = 'Development'
 
 class HPOneViewException(Exception):
 
-    def __init__(self, msg):
+    def __init__(self, msg, errorCode=None):
         self.msg = msg
+        # The appliance's errorCode, e.g. 'DUPLICATE_NAME', if known
+        if errorCode is None and type(msg) is dict:
+            errorCode = msg.get('errorCode')
+        self.errorCode = errorCode
         Exception.__init__(self, msg)
 
 
@@ -49,16 +49,24 @@ class facilities(object):
         self._activity = activity(con)
 
     def get_datacenters(self):
-        body = self._con.get(uri['datacenters'])
-        return body
+        members = self._con.get_all_members(uri['datacenters'])
+        return make_collection_dict(members)
+
+    def iter_datacenters(self, count=None):
+        return self._con.iter_members(uri['datacenters'], count)
 
     def get_powerdevices(self):
-        body = self._con.get(uri['powerDevices'])
-        return body
+        members = self._con.get_all_members(uri['powerDevices'])
+        return make_collection_dict(members)
+
+    def iter_powerdevices(self, count=None):
+        return self._con.iter_members(uri['powerDevices'], count)
 
     def get_racks(self):
-        body = self._con.get(uri['racks'])
-        return body
+        return make_collection_dict(self._con.get_all_members(uri['racks']))
+
+    def iter_racks(self, count=None):
+        return self._con.iter_members(uri['racks'], count)
 
     def delete_datacenter(self, datacenter, force=False, blocking=True,
                           verbose=False):
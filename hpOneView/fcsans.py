@@ -49,16 +49,24 @@ class fcsans(object):
         self._activity = activity(con)
 
     def get_device_managers(self):
-        body = self._con.get(uri['device-managers'])
-        return body
+        members = self._con.get_all_members(uri['device-managers'])
+        return make_collection_dict(members)
+
+    def iter_device_managers(self, count=None):
+        return self._con.iter_members(uri['device-managers'], count)
 
     def get_managed_sans(self):
-        body = self._con.get(uri['managed-sans'])
-        return body
+        members = self._con.get_all_members(uri['managed-sans'])
+        return make_collection_dict(members)
+
+    def iter_managed_sans(self, count=None):
+        return self._con.iter_members(uri['managed-sans'], count)
 
     def get_providers(self):
-        body = get_members(self._con.get(uri['providers']))
-        return body
+        return self._con.get_all_members(uri['providers'])
+
+    def iter_providers(self, count=None):
+        return self._con.iter_members(uri['providers'], count)
 
     def remove_device_manager(self, manager, blocking=True, verbose=False):
         task, body = self._con.delete(manager['uri'])
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+"""
+fleet.py
+~~~~~~~~~~~~
+
+This module fans calls out across many appliances at once.
+"""
+
+__title__ = 'fleet'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import threading
+import time
+from collections import OrderedDict
+
+from hpOneView.common import *
+from hpOneView.connection import connection
+from hpOneView.exceptions import *
+from hpOneView.throttle import throttle
+
+
+class fleet_result(object):
+
+    # What one fan-out returned: the value per appliance, the exception per
+    # appliance that failed or timed out, and how long each took
+    def __init__(self, hosts):
+        self._hosts = list(hosts)
+        self._results = OrderedDict()
+        self._errors = OrderedDict()
+        self._elapsed = {}
+        self._lock = threading.Lock()
+
+    def _set(self, host, result=None, error=None, elapsed=None):
+        # Returns False if host already has an outcome
+        with self._lock:
+            # A call that finishes after it timed out is ignored
+            if host in self._elapsed:
+                return False
+            if error is None:
+                self._results[host] = result
+            else:
+                self._errors[host] = error
+            self._elapsed[host] = elapsed
+            return True
+
+    def _has(self, host):
+        with self._lock:
+            return host in self._elapsed
+
+    def get_results(self):
+        # {host: value} for the appliances that succeeded, in fleet order
+        return OrderedDict((host, self._results[host])
+                           for host in self._hosts if host in self._results)
+
+    def get_errors(self):
+        return OrderedDict((host, self._errors[host])
+                           for host in self._hosts if host in self._errors)
+
+    def get_elapsed(self):
+        return dict(self._elapsed)
+
+    def succeeded(self):
+        return [host for host in self._hosts if host in self._results]
+
+    def failed(self):
+        return [host for host in self._hosts if host in self._errors]
+
+    def get_members(self):
+        # [(host, member)] across every appliance that returned a list
+        members = []
+        for host, result in self.get_results().items():
+            for member in result or []:
+                members.append((host, member))
+        return members
+
+    def raise_errors(self):
+        # Raises HPOneViewException with the (host, error) failures in
+        # errors if any appliance failed
+        errors = list(self.get_errors().items())
+        if errors:
+            e = HPOneViewException('%d of %d appliances failed: %s' % (
+                len(errors), len(self._hosts),
+                ', '.join(host for host, _ in errors)))
+            e.errors = errors
+            raise e
+
+
+class fleet(object):
+
+    # Logged in connections to many appliances, with calls run on all of
+    # them at once. Each call gets timeout seconds per appliance; failures
+    # and timeouts are reported per appliance in the fleet_result rather
+    # than raised, so one unreachable appliance does not hide the others.
+    # Connections added without a throttle get one limiting them to
+    # applianceInFlight requests at a time.
+    #
+    #   f = fleet()
+    #   f.add_appliances(hosts, {'userName': user, 'password': password})
+    #   result = f.call_helper(servers, 'get_servers')
+    #   for host, server in result.get_members():
+    #       print(host, server['name'])
+    def __init__(self, workers=16, timeout=60, applianceInFlight=8,
+                 sessionCache=None):
+        self._workers = workers
+        self._timeout = timeout
+        self._applianceInFlight = applianceInFlight
+        self._sessionCache = sessionCache
+        self._lock = threading.Lock()
+        self._connections = OrderedDict()
+
+    def add_connection(self, con):
+        if con.get_throttle() is None and self._applianceInFlight:
+            con.set_throttle(throttle(maxInFlight=self._applianceInFlight))
+        with self._lock:
+            self._connections[con.get_host()] = con
+        return con
+
+    def add_appliance(self, host, cred, proxy=None, sslBundle=None):
+        return self.add_connection(self._login(host, cred, proxy, sslBundle))
+
+    def add_appliances(self, hosts, cred, proxy=None, sslBundle=None,
+                       timeout=None):
+        # Logs in to all of the hosts at once; the result holds the new
+        # connections and the hosts that could not be reached, which are
+        # left out of the fleet
+        result = self._fan_out(hosts, lambda host: self._login(
+            host, cred, proxy, sslBundle), timeout, self._logout_late)
+        for con in result.get_results().values():
+            self.add_connection(con)
+        return result
+
+    def _logout_late(self, con):
+        # A login that completed after its timeout; its session would
+        # otherwise stay open on the appliance
+        try:
+            con.logout()
+        except Exception:
+            pass
+
+    def _login(self, host, cred, proxy, sslBundle):
+        con = connection(host, sessionCache=self._sessionCache)
+        if proxy is not None:
+            con.set_proxy(*proxy)
+        if sslBundle is not None:
+            con.set_trusted_ssl_bundle(sslBundle)
+        con.login(cred)
+        return con
+
+    def remove_appliance(self, host, logout=True):
+        with self._lock:
+            con = self._connections.pop(host, None)
+        if con is not None and logout:
+            try:
+                con.logout()
+            except (HPOneViewException, OSError):
+                pass
+
+    def get_connection(self, host):
+        with self._lock:
+            return self._connections.get(host)
+
+    def get_connections(self):
+        with self._lock:
+            return list(self._connections.values())
+
+    def get_hosts(self):
+        with self._lock:
+            return list(self._connections.keys())
+
+    def logout(self, timeout=None):
+        result = self._fan_out(self.get_hosts(), lambda host:
+                               self.get_connection(host).logout(), timeout)
+        with self._lock:
+            self._connections.clear()
+        return result
+
+    ###########################################################################
+    # Fan-out
+    ###########################################################################
+    def call(self, func, *args, **kwargs):
+        # func(con, *args, **kwargs) on every appliance. A timeout keyword
+        # overrides the fleet's for this call.
+        timeout = kwargs.pop('timeout', None)
+        return self._fan_out(self.get_hosts(), lambda host: func(
+            self.get_connection(host), *args, **kwargs), timeout)
+
+    def call_helper(self, helper, method, *args, **kwargs):
+        # helper(con).method(*args, **kwargs) on every appliance, e.g.
+        # call_helper(servers, 'get_servers') or
+        # call_helper(activity, 'get_alerts', 'Active')
+        return self.call(lambda con, *args, **kwargs: getattr(
+            helper(con), method)(*args, **kwargs), *args, **kwargs)
+
+    def get_all_members(self, uri, timeout=None):
+        return self.call(lambda con: con.get_all_members(uri),
+                         timeout=timeout)
+
+    def _fan_out(self, hosts, func, timeout, late=None):
+        # Runs func(host) for every host, at most workers at a time. Each
+        # host's timeout starts when its call does, so hosts waiting for a
+        # worker are not charged for the wait. A call that times out is
+        # abandoned and frees its worker; if it later succeeds anyway, its
+        # value is passed to late.
+        if timeout is None:
+            timeout = self._timeout
+        result = fleet_result(hosts)
+        done = threading.Condition()
+
+        def run(host):
+            begin = time.time()
+            try:
+                value = func(host)
+            except Exception as e:
+                result._set(host, error=e, elapsed=time.time() - begin)
+            else:
+                if not result._set(host, value, elapsed=time.time() - begin) \
+                        and late is not None:
+                    late(value)
+            with done:
+                done.notify_all()
+        queued = list(hosts)
+        running = {}
+        with done:
+            while queued or running:
+                while queued and len(running) < max(1, self._workers):
+                    host = queued.pop(0)
+                    thread = threading.Thread(target=run, args=(host,),
+                                              name='fleet-%s' % host)
+                    thread.daemon = True
+                    running[host] = time.time()
+                    thread.start()
+                now = time.time()
+                for host, begin in list(running.items()):
+                    if result._has(host):
+                        del running[host]
+                    elif now - begin >= timeout:
+                        # The call keeps running in the background but its
+                        # result is no longer wanted
+                        result._set(host, error=HPOneViewTimeout(
+                            'No response from %s within %s seconds' %
+                            (host, timeout)), elapsed=now - begin)
+                        del running[host]
+                if running and not (queued and
+                                    len(running) < max(1, self._workers)):
+                    done.wait(min(begin + timeout for begin in
+                                  running.values()) - now)
+        return result
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""
+instrumentation.py
+~~~~~~~~~~~~
+
+Request timing hooks and per-endpoint latency statistics
+"""
+
+__title__ = 'instrumentation'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import bisect
+import http.client
+import re
+import socket
+import threading
+import time
+
+
+# Upper bounds, in seconds, of the latency histogram buckets: 100us to
+# about 10 minutes in 25% steps
+DefaultBuckets = [0.0001 * 1.25 ** n for n in range(80)]
+
+# Path segments that identify a single resource
+IdRe = re.compile(r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+                  r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+|[0-9a-fA-F]{16,})$')
+_templates = {}
+
+
+def uri_template(path):
+    # /rest/server-hardware/30303437-...?fields=name becomes
+    # /rest/server-hardware/{id}. The first two segments always name the
+    # collection; after that uuids, numbers, long hex strings and
+    # identifiers of 8 or more characters containing a digit are ids.
+    template = _templates.get(path)
+    if template is not None:
+        return template
+    segments = path.partition('?')[0].split('/')
+    for index in range(3, len(segments)):
+        segment = segments[index]
+        if IdRe.match(segment) or (len(segment) >= 8 and
+                                   any(c.isdigit() for c in segment)):
+            segments[index] = '{id}'
+    template = '/'.join(segments)
+    if len(_templates) > 10000:
+        _templates.clear()
+    _templates[path] = template
+    return template
+
+
+class request_info(object):
+
+    # Everything known about one request. Passed to the connection's pre
+    # request callbacks before it is sent and to the post request
+    # callbacks once it has finished or failed. Times are in seconds; dns,
+    # connect and tls are 0 when a pooled connection was reused, and ttfb
+    # does not include them. throttled is the time held back by the
+    # connection's throttle.
+    __slots__ = ['host', 'method', 'path', 'started', 'status', 'error',
+                 'bytesOut', 'bytesIn', 'retries', 'reused', 'dns',
+                 'connect', 'tls', 'ttfb', 'read', 'total', 'throttled',
+                 '_start',
+                 '_sent', '_firstByte']
+
+    def __init__(self, host, method, path, bytesOut=0):
+        self.host = host
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.status = None
+        self.error = None
+        self.bytesOut = bytesOut
+        self.bytesIn = 0
+        self.retries = 0
+        self.reused = False
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.read = 0.0
+        self.total = 0.0
+        self.throttled = 0.0
+        self._start = time.perf_counter()
+        self._sent = self._start
+        self._firstByte = None
+
+    def sending(self, reused):
+        # Called before each attempt to send the request
+        self.reused = reused
+        self._sent = time.perf_counter()
+
+    def first_byte(self, conn):
+        # Called once the response headers have been read from conn
+        now = time.perf_counter()
+        timings = getattr(conn, 'timings', None)
+        if timings is not None:
+            conn.timings = None
+            self.dns, self.connect, self.tls = timings
+        self.ttfb = max(0.0, now - self._sent - self.dns - self.connect -
+                        self.tls)
+        self._firstByte = now
+
+    def finished(self, status=None, bytesIn=0, error=None):
+        now = time.perf_counter()
+        self.status = status
+        self.bytesIn = bytesIn
+        self.error = error
+        if self._firstByte is not None:
+            self.read = now - self._firstByte
+        self.total = now - self._start
+
+    def get_template(self):
+        return uri_template(self.path)
+
+
+class timed_https_connection(http.client.HTTPSConnection):
+
+    # Records (dns, connect, tls) seconds in self.timings each time a
+    # socket is opened; connect includes the proxy CONNECT, if any
+    def __init__(self, *args, **kwargs):
+        http.client.HTTPSConnection.__init__(self, *args, **kwargs)
+        self._create_connection = self._timed_create_connection
+        self.timings = None
+        self._dns = 0.0
+
+    def _timed_create_connection(self, address, timeout=None,
+                                 source_address=None):
+        start = time.perf_counter()
+        host, port = address
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        self._dns = time.perf_counter() - start
+        error = OSError('getaddrinfo returned an empty list')
+        for family, socktype, proto, canonname, sockaddr in addresses:
+            try:
+                # Already resolved, so this does not go back to DNS
+                return socket.create_connection(sockaddr[:2], timeout,
+                                                source_address)
+            except OSError as e:
+                error = e
+        raise error
+
+    def connect(self):
+        start = time.perf_counter()
+        self._dns = 0.0
+        http.client.HTTPConnection.connect(self)
+        connected = time.perf_counter()
+        if self._tunnel_host:
+            serverHostname = self._tunnel_host
+        else:
+            serverHostname = self.host
+        self.sock = self._context.wrap_socket(self.sock,
+                                              server_hostname=serverHostname)
+        self.timings = (self._dns, connected - start - self._dns,
+                        time.perf_counter() - connected)
+
+
+class _histogram(object):
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self._buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        # Upper bound of the bucket holding the pct'th percentile, so the
+        # error is at most one bucket width
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self._buckets):
+                    return min(self._buckets[index], self.max)
+                return self.max
+        return self.max
+
+
+class endpoint_stats(object):
+
+    # Aggregates the post request callbacks of one or more connections into
+    # a latency histogram per appliance, method and URI template:
+    #
+    #   stats = endpoint_stats()
+    #   stats.attach(con)
+    #   ...
+    #   for entry in stats.get_stats():
+    #       print(entry['method'], entry['template'], entry['p99_ms'])
+    def __init__(self, buckets=DefaultBuckets):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def attach(self, con):
+        con.add_post_request_callback(self.record)
+
+    def detach(self, con):
+        con.remove_request_callback(self.record)
+
+    def record(self, info):
+        key = (info.host, info.method, info.get_template())
+        with self._lock:
+            entry = self._endpoints.get(key)
+            if entry is None:
+                entry = {'histogram': _histogram(self._buckets),
+                         'statuses': {}, 'errors': 0, 'retries': 0,
+                         'bytesIn': 0, 'bytesOut': 0, 'dns': 0.0,
+                         'connect': 0.0, 'tls': 0.0, 'ttfb': 0.0,
+                         'read': 0.0, 'throttled': 0.0}
+                self._endpoints[key] = entry
+            entry['histogram'].add(info.total)
+            if info.error is not None:
+                entry['errors'] += 1
+            else:
+                entry['statuses'][info.status] = \
+                    entry['statuses'].get(info.status, 0) + 1
+            entry['retries'] += info.retries
+            entry['bytesIn'] += info.bytesIn
+            entry['bytesOut'] += info.bytesOut
+            for phase in ('dns', 'connect', 'tls', 'ttfb', 'read',
+                          'throttled'):
+                entry[phase] += getattr(info, phase)
+
+    def get_stats(self):
+        # One dict per endpoint, slowest (by total time) first
+        stats = []
+        with self._lock:
+            for (host, method, template), entry in \
+                    list(self._endpoints.items()):
+                histogram = entry['histogram']
+                count = histogram.count
+                stat = {
+                    'host': host,
+                    'method': method,
+                    'template': template,
+                    'count': count,
+                    'errors': entry['errors'],
+                    'statuses': dict(entry['statuses']),
+                    'retries': entry['retries'],
+                    'bytesIn': entry['bytesIn'],
+                    'bytesOut': entry['bytesOut'],
+                    'total_ms': 1000 * histogram.sum,
+                    'mean_ms': 1000 * histogram.sum / count,
+                    'p50_ms': 1000 * histogram.percentile(50),
+                    'p90_ms': 1000 * histogram.percentile(90),
+                    'p99_ms': 1000 * histogram.percentile(99),
+                    'max_ms': 1000 * histogram.max}
+                for phase in ('dns', 'connect', 'tls', 'ttfb', 'read',
+                              'throttled'):
+                    stat[phase + '_mean_ms'] = 1000 * entry[phase] / count
+                stats.append(stat)
+        stats.sort(key=lambda stat: stat['total_ms'], reverse=True)
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""
+inventory.py
+~~~~~~~~~~~~
+
+This module mirrors appliance collections into a local SQLite database.
+"""
+
+__title__ = 'inventory'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import json
+import sqlite3
+import threading
+import time
+
+from hpOneView.common import *
+from hpOneView.exceptions import *
+from hpOneView.query import query_builder
+
+
+# Collections mirrored when sync() is not given a list
+DefaultCollections = [uri['servers'], uri['profiles'], uri['enclosures'],
+                      uri['ic'], uri['lig'], uri['enet'], uri['fcnet'],
+                      uri['nset'], uri['storage-systems'],
+                      uri['storage-pools']]
+
+Schema = '''
+CREATE TABLE IF NOT EXISTS resources (
+    appliance TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    name TEXT,
+    modified TEXT,
+    etag TEXT,
+    body TEXT NOT NULL,
+    PRIMARY KEY (appliance, uri));
+CREATE INDEX IF NOT EXISTS resources_name
+    ON resources (appliance, collection, name);
+CREATE INDEX IF NOT EXISTS resources_modified
+    ON resources (appliance, collection, modified);
+CREATE TABLE IF NOT EXISTS collections (
+    appliance TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    modified TEXT,
+    total INTEGER,
+    synced REAL,
+    PRIMARY KEY (appliance, collection));
+'''
+
+
+class inventory_mirror(object):
+
+    # Keeps a copy of whole collections from one or more appliances in a
+    # SQLite database (':memory:' or a file path), one row per resource with
+    # the JSON document and its uri, name, modified and eTag. The first sync
+    # of a collection reads all of it; later ones only read the members
+    # modified since the newest timestamp seen, and reload the collection
+    # when the appliance's total no longer matches the local count, which is
+    # how deletions are noticed. Collections whose members carry no modified
+    # timestamp (or that are empty) are simply reloaded.
+    #
+    #   mirror = inventory_mirror('inventory.db')
+    #   for con in connections:
+    #       mirror.sync(con)
+    #   mirror.find(uri['servers'], 'powerState', 'On')
+    def __init__(self, path=':memory:'):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(Schema)
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    ###########################################################################
+    # Synchronization
+    ###########################################################################
+    def sync(self, con, collections=None, full=False):
+        # Brings the given collections up to date and returns
+        # {collection: members read}
+        if collections is None:
+            collections = DefaultCollections
+        results = {}
+        for collection in collections:
+            results[collection] = self.sync_collection(con, collection, full)
+        return results
+
+    def sync_collection(self, con, collection, full=False):
+        appliance = con.get_host()
+        state = self._get_state(appliance, collection)
+        if full or state is None or state[0] is None:
+            return self._reload(con, appliance, collection)
+        modified, total = state
+        query = query_builder().filter('modified', '>=', modified)
+        members = list(con.iter_members(query.build(collection)))
+        with self._lock:
+            with self._db:
+                self._store(appliance, collection, members)
+                modified = self._newest(members, modified)
+                count = self._count(appliance, collection)
+        remote = self._get_total(con, collection)
+        if remote is not None and remote != count:
+            # Something was deleted (or missed), start over
+            return len(members) + self._reload(con, appliance, collection)
+        with self._lock:
+            with self._db:
+                self._set_state(appliance, collection, modified, count)
+        return len(members)
+
+    def _reload(self, con, appliance, collection):
+        members = con.get_all_members(collection)
+        self.replace_collection(appliance, collection, members)
+        return len(members)
+
+    def replace_collection(self, appliance, collection, members):
+        # The collection as a whole, e.g. from a listener that loaded it
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM resources WHERE appliance = ? '
+                                 'AND collection = ?', (appliance, collection))
+                self._store(appliance, collection, members)
+                self._set_state(appliance, collection,
+                                self._newest(members, None), len(members))
+
+    def put_resource(self, appliance, collection, resource):
+        with self._lock:
+            with self._db:
+                self._store(appliance, collection, [resource])
+
+    def delete_resource(self, appliance, resourceUri):
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM resources WHERE appliance = ? '
+                                 'AND uri = ?', (appliance, resourceUri))
+
+    def _get_total(self, con, collection):
+        body = con.get(query_builder().start(0).count(1).build(collection))
+        if not body:
+            return None
+        return body.get('total')
+
+    def _store(self, appliance, collection, members):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO resources (appliance, collection, uri, '
+            'name, modified, etag, body) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(appliance, collection, member['uri'], member.get('name'),
+              member.get('modified'), member.get('eTag'), json.dumps(member))
+             for member in members])
+
+    def _newest(self, members, modified):
+        for member in members:
+            if member.get('modified') and (modified is None or
+                                           member['modified'] > modified):
+                modified = member['modified']
+        return modified
+
+    def _count(self, appliance, collection):
+        return self._db.execute('SELECT COUNT(*) FROM resources WHERE '
+                                'appliance = ? AND collection = ?',
+                                (appliance, collection)).fetchone()[0]
+
+    def _get_state(self, appliance, collection):
+        with self._lock:
+            return self._db.execute('SELECT modified, total FROM collections '
+                                    'WHERE appliance = ? AND collection = ?',
+                                    (appliance, collection)).fetchone()
+
+    def _set_state(self, appliance, collection, modified, total):
+        self._db.execute('INSERT OR REPLACE INTO collections (appliance, '
+                         'collection, modified, total, synced) VALUES '
+                         '(?, ?, ?, ?, ?)', (appliance, collection, modified,
+                                             total, time.time()))
+
+    def forget(self, appliance=None, collection=None):
+        # Drops mirrored data so the next sync reloads it
+        clause, params = self._where(appliance, collection)
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM resources' + clause, params)
+                self._db.execute('DELETE FROM collections' + clause, params)
+
+    ###########################################################################
+    # Queries
+    ###########################################################################
+    def get_resource(self, resourceUri, appliance=None):
+        clause, params = self._where(appliance, None)
+        clause += ' AND uri = ?' if clause else ' WHERE uri = ?'
+        rows = self._select(clause, params + [resourceUri], 1)
+        return rows[0] if rows else None
+
+    def get_resources(self, collection, appliance=None):
+        clause, params = self._where(appliance, collection)
+        return self._select(clause + ' ORDER BY appliance, name', params)
+
+    def get_resource_by_name(self, collection, name, appliance=None):
+        clause, params = self._where(appliance, collection)
+        rows = self._select(clause + ' AND name = ?', params + [name], 1)
+        return rows[0] if rows else None
+
+    def find(self, collection, field, value, appliance=None):
+        # Members whose field (a dotted path such as 'status' or
+        # 'bandwidth.maximumBandwidth') equals value
+        clause, params = self._where(appliance, collection)
+        if field in ('uri', 'name', 'modified'):
+            clause += ' AND %s = ?' % field
+            params.append(value)
+        else:
+            clause += ' AND json_extract(body, ?) = ?'
+            params.extend(['$.' + field, value])
+        return self._select(clause + ' ORDER BY appliance, name', params)
+
+    def count(self, collection, appliance=None):
+        clause, params = self._where(appliance, collection)
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM resources' + clause,
+                                    params).fetchone()[0]
+
+    def get_sync_state(self):
+        # [{appliance, collection, modified, total, synced}] for everything
+        # mirrored so far
+        with self._lock:
+            rows = self._db.execute('SELECT appliance, collection, modified, '
+                                    'total, synced FROM collections ORDER BY '
+                                    'appliance, collection').fetchall()
+        return [dict(zip(('appliance', 'collection', 'modified', 'total',
+                          'synced'), row)) for row in rows]
+
+    def _where(self, appliance, collection):
+        clauses = []
+        params = []
+        if appliance is not None:
+            clauses.append('appliance = ?')
+            params.append(appliance)
+        if collection is not None:
+            clauses.append('collection = ?')
+            params.append(collection)
+        if not clauses:
+            return '', params
+        return ' WHERE ' + ' AND '.join(clauses), params
+
+    def _select(self, clause, params, limit=None):
+        sql = 'SELECT body FROM resources' + clause
+        if limit is not None:
+            sql += ' LIMIT %d' % limit
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,852 @@
+# -*- coding: utf-8 -*-
+
+"""
+mockappliance.py
+~~~~~~~~~~~~
+
+Local stand-in for an HP OneView appliance
+"""
+
+__title__ = 'mockappliance'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import argparse
+import hashlib
+import http.server
+import json
+import math
+import os
+import random
+import re
+import socketserver
+import ssl
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import parse_qsl
+
+from hpOneView.common import uri
+
+
+# Self-signed certificate and key for localhost, valid for 100 years
+DefaultCertFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'mockappliance.pem')
+
+# Requests that do not need an auth header
+NoAuth = [('GET', uri['version']), ('POST', uri['loginSessions']),
+          ('GET', uri['eulaStatus']), ('POST', uri['eulaSave']),
+          ('POST', uri['changePassword'])]
+
+# Requests that are never failed by error injection, so that a connection
+# can always be made
+NoErrors = [uri['version'], uri['loginSessions']]
+
+# Collections that get a connection template for each new resource
+NetworkCollections = [uri['enet'], uri['fcnet'], uri['nset']]
+
+ServerModels = ['BL460c Gen8', 'BL460c Gen9', 'BL660c Gen8', 'BL660c Gen9',
+                'WS460c Gen9']
+AlertStates = ['Active', 'Active', 'Cleared', 'Locked']
+AlertSeverities = ['Critical', 'Warning', 'Warning', 'OK']
+HealthCategories = ['Power', 'Processor', 'Memory', 'Network', 'Storage',
+                    'Thermal']
+BaysPerEnclosure = 16
+MaxTasks = 10000
+
+FilterRe = re.compile(r"^'?([\w.]+)'?\s*(<=|>=|!=|=|<|>|\s+matches\s+)"
+                      r"\s*'?(.*?)'?$", re.IGNORECASE)
+
+
+def _timestamp(t=None):
+    if t is None:
+        t = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + \
+        '.%03dZ' % (int(t * 1000) % 1000)
+
+
+class _server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class _handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY the client's
+    # delayed ACK adds 40ms to every response
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        http.server.BaseHTTPRequestHandler.setup(self)
+        self.server.appliance._count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.appliance._handle(self, 'GET')
+
+    def do_POST(self):
+        self.server.appliance._handle(self, 'POST')
+
+    def do_PUT(self):
+        self.server.appliance._handle(self, 'PUT')
+
+    def do_PATCH(self):
+        self.server.appliance._handle(self, 'PATCH')
+
+    def do_DELETE(self):
+        self.server.appliance._handle(self, 'DELETE')
+
+
+class mock_appliance(object):
+
+    # An HTTPS server on localhost that answers the REST calls made by this
+    # library: version, login-sessions, paginated and filtered collections,
+    # 202 + Location task flows, multipart uploads and ranged downloads.
+    #
+    #   appliance = mock_appliance(servers=5000, networks=1000, alerts=20000)
+    #   appliance.start()
+    #   con = connection(appliance.get_host())
+    #   con.login({'userName': 'Administrator', 'password': 'any'})
+    #
+    # latency is a number of seconds, or a (min, max) tuple, added to every
+    # request. pageSize is the page returned when no count is given (None
+    # returns everything) and maxPageSize caps the count a client may ask
+    # for. A fraction errorRate of requests fail with errorStatus, or have
+    # the connection dropped if errorStatus is None. Tasks run for
+    # taskDuration seconds and a fraction taskErrorRate end in 'Error'.
+    # seed makes the inventory and the injected errors reproducible.
+    def __init__(self, host='127.0.0.1', port=0, servers=0, networks=0,
+                 alerts=0, latency=0, pageSize=None, maxPageSize=None,
+                 errorRate=0, errorStatus=503, taskDuration=0,
+                 taskErrorRate=0, downloadSize=1048576, seed=None,
+                 certFile=DefaultCertFile, apiVersions=(1, 120)):
+        self._address = (host, port)
+        self._certFile = certFile
+        self._minVersion, self._maxVersion = apiVersions
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._seed = seed
+        self._httpd = None
+        self._thread = None
+        self._sessions = set()
+        self._tasks = OrderedDict()
+        self._downloads = {}
+        self._uploads = []
+        self._stats = {}
+        self._eTag = 0
+        self._block = None
+        self._downloadSize = downloadSize
+        self._collections = {}
+        for path in list(uri.values()):
+            if path.startswith('/rest/'):
+                self._collections[path] = OrderedDict()
+        self._downloads[uri['audit-logs-download']] = downloadSize
+        self.set_latency(latency)
+        self.set_page_size(pageSize, maxPageSize)
+        self.set_error_rate(errorRate, errorStatus)
+        self.set_task_duration(taskDuration, taskErrorRate)
+        self.seed_inventory(servers, networks, alerts)
+
+    ###########################################################################
+    # Control
+    ###########################################################################
+    def start(self):
+        if self._httpd is not None:
+            return self
+        httpd = _server(self._address, _handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self._certFile)
+        # Handshake in the request thread, not in the accept loop
+        httpd.socket = context.wrap_socket(httpd.socket, server_side=True,
+                                           do_handshake_on_connect=False)
+        httpd.appliance = self
+        self._httpd = httpd
+        self._thread = threading.Thread(target=httpd.serve_forever,
+                                        name='mock-appliance')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        httpd = self._httpd
+        if httpd is None:
+            return
+        httpd.shutdown()
+        httpd.server_close()
+        self._thread.join()
+        self._httpd = None
+        self._thread = None
+
+    def get_host(self):
+        # host:port, as passed to connection()
+        host, port = self._httpd.server_address[:2]
+        return '%s:%d' % (host, port)
+
+    def get_cert_file(self):
+        return self._certFile
+
+    def set_latency(self, latency):
+        self._latency = latency
+
+    def set_page_size(self, pageSize=None, maxPageSize=None):
+        self._pageSize = pageSize
+        self._maxPageSize = maxPageSize
+
+    def set_error_rate(self, errorRate, errorStatus=503):
+        self._errorRate = errorRate
+        self._errorStatus = errorStatus
+
+    def set_task_duration(self, taskDuration, taskErrorRate=0):
+        self._taskDuration = taskDuration
+        self._taskErrorRate = taskErrorRate
+
+    def get_stats(self):
+        # Request counts by method, plus 'connections', 'errors' (injected),
+        # 'notModified' (304s) and 'uploadBytes'/'downloadBytes'
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+    def get_uploads(self):
+        # (name, size, md5) of each file received by a multipart POST
+        with self._lock:
+            return list(self._uploads)
+
+    def expire_sessions(self):
+        # Every session ID handed out so far is rejected with a 401 from now
+        # on, like after an appliance restart or idle timeout
+        with self._lock:
+            self._sessions.clear()
+
+    ###########################################################################
+    # Inventory
+    ###########################################################################
+    def seed_inventory(self, servers=0, networks=0, alerts=0):
+        rng = self._random
+        with self._lock:
+            serverUris = []
+            if servers:
+                types = []
+                for shortModel in ServerModels:
+                    types.append(self.add_resource(
+                        uri['server-hardware-types'],
+                        {'name': shortModel, 'model': 'ProLiant ' + shortModel,
+                         'type': 'server-hardware-type-3'}))
+                first = len(self._collections[uri['enclosures']])
+                for index in range(int(math.ceil(servers /
+                                                 float(BaysPerEnclosure)))):
+                    self.add_resource(uri['enclosures'], {
+                        'name': 'Encl%d' % (first + index + 1),
+                        'type': 'EnclosureV200',
+                        'enclosureType': 'C7000',
+                        'serialNumber': self._serial(rng),
+                        'deviceBayCount': BaysPerEnclosure})
+                enclosures = list(self._collections[uri['enclosures']]
+                                  .values())[first:]
+                for index in range(servers):
+                    enclosure = enclosures[index // BaysPerEnclosure]
+                    bay = index % BaysPerEnclosure + 1
+                    shwt = rng.choice(types)
+                    server = self.add_resource(uri['servers'], {
+                        'name': '%s, bay %d' % (enclosure['name'], bay),
+                        'type': 'server-hardware-3',
+                        'position': bay,
+                        'locationUri': enclosure['uri'],
+                        'serialNumber': self._serial(rng),
+                        'shortModel': shwt['name'],
+                        'model': shwt['model'],
+                        'serverHardwareTypeUri': shwt['uri'],
+                        'serverProfileUri': None,
+                        'powerState': rng.choice(['On', 'Off']),
+                        'state': 'NoProfileApplied',
+                        'status': rng.choice(['OK', 'OK', 'OK', 'Warning']),
+                        'processorCount': rng.choice([1, 2, 4]),
+                        'memoryMb': rng.choice([32768, 65536, 131072])})
+                    serverUris.append(server['uri'])
+            first = len(self._collections[uri['enet']])
+            for index in range(first, first + networks):
+                self.add_resource(uri['enet'], {
+                    'name': 'net-%d' % (index + 1),
+                    'type': 'ethernet-networkV2',
+                    'vlanId': index % 4094 + 1,
+                    'purpose': 'General',
+                    'smartLink': True,
+                    'privateNetwork': False,
+                    'ethernetNetworkType': 'Tagged'})
+            if not serverUris:
+                serverUris = list(self._collections[uri['servers']]) or [None]
+            for index in range(alerts):
+                self.add_resource(uri['alerts'], {
+                    'type': 'AlertResourceV3',
+                    'alertState': rng.choice(AlertStates),
+                    'severity': rng.choice(AlertSeverities),
+                    'healthCategory': rng.choice(HealthCategories),
+                    'description': 'Synthetic alert %d' % (index + 1),
+                    'resourceUri': rng.choice(serverUris)})
+
+    def add_resource(self, collection, resource):
+        # Stores a copy of resource in the collection (any path in
+        # common.uri) and returns it with uri, category, eTag etc. filled in
+        with self._lock:
+            members = self._collections.setdefault(collection, OrderedDict())
+            now = _timestamp()
+            resource = dict(resource)
+            resource['uri'] = '%s/%s' % (collection, uuid.UUID(
+                int=self._random.getrandbits(128)))
+            resource['category'] = collection.split('/')[-1]
+            resource['eTag'] = self._next_etag()
+            resource['created'] = now
+            resource['modified'] = now
+            if collection in NetworkCollections:
+                template = self.add_resource(uri['ct'], {
+                    'name': resource.get('name'),
+                    'type': 'connection-template',
+                    'bandwidth': {'maximumBandwidth': 10000,
+                                  'typicalBandwidth': 2500}})
+                resource['connectionTemplateUri'] = template['uri']
+            members[resource['uri']] = resource
+            return resource
+
+    def get_resources(self, collection):
+        with self._lock:
+            return list(self._collections.get(collection, {}).values())
+
+    def _serial(self, rng):
+        return 'MXQ' + ''.join(rng.choice('0123456789ABCDEFGHJKLMNPRSTUVWXYZ')
+                               for _ in range(7))
+
+    def _next_etag(self):
+        self._eTag += 1
+        return str(self._eTag)
+
+    ###########################################################################
+    # Request handling
+    ###########################################################################
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + value
+
+    def _handle(self, req, method):
+        path, _, query = req.path.partition('?')
+        length = int(req.headers.get('Content-Length') or 0)
+        contentType = req.headers.get('Content-Type') or ''
+        upload = None
+        body = None
+        if contentType.startswith('multipart/form-data'):
+            upload = self._read_upload(req, length, contentType)
+        elif length:
+            try:
+                body = json.loads(req.rfile.read(length).decode('utf-8'))
+            except ValueError:
+                body = None
+        self._count(method)
+        latency = self._latency
+        if type(latency) in (tuple, list):
+            latency = self._random.uniform(latency[0], latency[1])
+        if latency:
+            time.sleep(latency)
+        if path not in NoErrors and self._errorRate and \
+                self._random.random() < self._errorRate:
+            self._count('errors')
+            if self._errorStatus is None:
+                # Close without a response, like an appliance restarting
+                req.close_connection = True
+                return
+            self._send(req, self._errorStatus, self._error(
+                'MOCK_INJECTED_ERROR', 'Injected error'))
+            return
+        if (method, path) not in NoAuth and \
+                req.headers.get('auth') not in self._sessions:
+            self._send(req, 401, self._error('AUTHORIZATION',
+                                             'Authentication required'))
+            return
+        if method == 'DELETE' and path == uri['loginSessions']:
+            with self._lock:
+                self._sessions.discard(req.headers.get('auth'))
+        if method == 'GET' and path in self._downloads:
+            self._send_download(req, self._downloads[path])
+            return
+        if upload is not None:
+            status, headers, payload = self._uploaded(path, upload)
+        else:
+            status, headers, payload = self._dispatch(method, path, query,
+                                                      body)
+        if method == 'GET' and status == 200:
+            # Conditional GET on a hash of the body
+            data = json.dumps(payload).encode('utf-8')
+            etag = '"%s"' % hashlib.md5(data).hexdigest()
+            if req.headers.get('If-None-Match') == etag:
+                self._count('notModified')
+                self._send(req, 304, None, {'ETag': etag})
+                return
+            self._send(req, status, payload, {'ETag': etag}, data)
+            return
+        self._send(req, status, payload, headers)
+
+    def _send(self, req, status, payload, headers=None, data=None):
+        if data is None:
+            data = b''
+            if payload is not None:
+                data = json.dumps(payload).encode('utf-8')
+        req.send_response(status)
+        req.send_header('Content-Type', 'application/json')
+        req.send_header('Content-Length', str(len(data)))
+        for name, value in list((headers or {}).items()):
+            req.send_header(name, value)
+        req.end_headers()
+        req.wfile.write(data)
+
+    def _error(self, errorCode, message):
+        return {'errorCode': errorCode, 'message': message, 'details': '',
+                'recommendedActions': []}
+
+    def _dispatch(self, method, path, query, body):
+        if path == uri['version'] and method == 'GET':
+            return 200, None, {'currentVersion': self._maxVersion,
+                               'minimumVersion': self._minVersion}
+        if path == uri['loginSessions']:
+            if method == 'POST':
+                sessionID = uuid.uuid4().hex
+                with self._lock:
+                    self._sessions.add(sessionID)
+                return 200, None, {'sessionID': sessionID}
+            if method == 'DELETE':
+                return 204, None, None
+        if path == uri['eulaStatus']:
+            return 200, None, False
+        if path in (uri['eulaSave'], uri['changePassword']):
+            return 200, None, {}
+        if path == uri['supportDump'] and method == 'POST':
+            dumpUri = '%s/mock-%s.sdmp' % (path, uuid.uuid4().hex[:8])
+            with self._lock:
+                self._downloads[dumpUri] = self._downloadSize
+            return 200, None, {'uri': dumpUri}
+        if path == uri['backups'] and method == 'POST':
+            return self._task_response('Backup', self._new_backup())
+        with self._lock:
+            if path == uri['task']:
+                if method != 'GET':
+                    return 405, None, self._error('METHOD_NOT_ALLOWED', path)
+                members = [self._render_task(record)
+                           for record in list(self._tasks.values())]
+                return 200, None, self._page(path, query, members)
+            if path in self._tasks:
+                return 200, None, self._render_task(self._tasks[path])
+            if path in self._collections:
+                return self._collection_request(method, path, query, body)
+            parent = path.rsplit('/', 1)[0]
+            if parent in self._collections:
+                return self._resource_request(method, parent, path, body)
+        if method == 'GET':
+            return 404, None, self._error('RESOURCE_NOT_FOUND', path)
+        # Any other action just runs a task
+        return self._task_response(method, None)
+
+    def _collection_request(self, method, path, query, body):
+        members = self._collections[path]
+        if method == 'GET':
+            return 200, None, self._page(path, query,
+                                         list(members.values()))
+        if method == 'POST':
+            if type(body) is not dict:
+                return 400, None, self._error('INVALID_REQUEST', path)
+            name = body.get('name')
+            if name is not None:
+                for member in list(members.values()):
+                    if member.get('name') == name:
+                        return 400, None, self._error(
+                            'DUPLICATE_NAME', 'The name %s is already in use'
+                            % name)
+            resource = self.add_resource(path, body)
+            return self._task_response('Create', resource)
+        if method == 'DELETE':
+            members.clear()
+            return 204, None, None
+        return self._task_response(method, None)
+
+    def _resource_request(self, method, parent, path, body):
+        members = self._collections[parent]
+        resource = members.get(path)
+        if resource is None:
+            return 404, None, self._error('RESOURCE_NOT_FOUND', path)
+        if method == 'GET':
+            return 200, None, resource
+        if method in ('PUT', 'PATCH'):
+            if type(body) is dict and method == 'PUT':
+                # Resources are replaced, never changed in place, so a
+                # response being written on another thread is unaffected
+                resource = dict(resource, **body)
+                resource['uri'] = path
+                resource['eTag'] = self._next_etag()
+                resource['modified'] = _timestamp()
+                members[path] = resource
+            return self._task_response('Update', resource)
+        if method == 'DELETE':
+            del members[path]
+            return self._task_response('Delete', resource)
+        return 405, None, self._error('METHOD_NOT_ALLOWED', path)
+
+    ###########################################################################
+    # Collections
+    ###########################################################################
+    def _page(self, path, query, members):
+        params = parse_qsl(query, keep_blank_values=True)
+        filters = [value for key, value in params if key == 'filter']
+        if filters:
+            members = [member for member in members
+                       if all(self._matches(member, f) for f in filters)]
+        for key, value in params:
+            if key == 'sort':
+                field, _, order = value.partition(':')
+                members.sort(key=lambda member: self._sort_key(member, field),
+                             reverse=order.lower() == 'desc')
+        start = 0
+        count = self._pageSize
+        for key, value in params:
+            if key == 'start':
+                start = max(0, int(value))
+            elif key == 'count':
+                count = int(value)
+        if count is None or count < 0:
+            count = len(members)
+        if self._maxPageSize is not None:
+            count = min(count, self._maxPageSize)
+        total = len(members)
+        current = members[start:start + count]
+        nextPageUri = None
+        prevPageUri = None
+        if current and start + count < total:
+            nextPageUri = self._page_uri(path, query, start + count, count)
+        if start > 0 and count > 0:
+            prevPageUri = self._page_uri(path, query, max(0, start - count),
+                                         count)
+        return {'type': 'ResourceCollection',
+                'category': path.split('/')[-1],
+                'uri': self._page_uri(path, query, start, count),
+                'start': start,
+                'count': len(current),
+                'total': total,
+                'members': current,
+                'nextPageUri': nextPageUri,
+                'prevPageUri': prevPageUri}
+
+    def _page_uri(self, path, query, start, count):
+        params = [p for p in query.split('&')
+                  if p and not p.startswith(('start=', 'count='))]
+        params.append('start=%d' % start)
+        params.append('count=%d' % count)
+        return path + '?' + '&'.join(params)
+
+    def _matches(self, member, expression):
+        # "'a' = 'x' AND 'b' > 'y'", a='x', "a matches 'x%'" and so on
+        expression = expression.strip().strip('"')
+        for alternative in self._split(expression, 'OR'):
+            clauses = self._split(alternative, 'AND')
+            if all(self._match_clause(member, clause) for clause in clauses):
+                return True
+        return False
+
+    def _split(self, expression, keyword):
+        # Split on a keyword outside of quoted literals
+        parts = re.split(r"('(?:[^']|'')*')", expression)
+        pieces = ['']
+        for i, part in enumerate(parts):
+            if i % 2:
+                pieces[-1] += part
+                continue
+            split = re.split(r'\s+%s\s+' % keyword, part, flags=re.IGNORECASE)
+            pieces[-1] += split[0]
+            pieces.extend(split[1:])
+        return pieces
+
+    def _match_clause(self, member, clause):
+        match = FilterRe.match(clause.strip().strip('()"').strip())
+        if match is None:
+            return False
+        field, op, value = match.groups()
+        op = op.strip().lower()
+        value = value.replace("''", "'")
+        actual = self._field(member, field)
+        if actual is None:
+            return op == '!='
+        if op == 'matches':
+            pattern = '^' + '.*'.join(re.escape(part)
+                                      for part in value.split('%')) + '$'
+            return re.match(pattern, str(actual), re.IGNORECASE) is not None
+        if type(actual) is bool:
+            actual = str(actual).lower()
+            value = value.lower()
+        elif type(actual) in (int, float):
+            try:
+                value = type(actual)(value)
+            except ValueError:
+                actual = str(actual)
+        else:
+            actual = str(actual)
+        if op == '=':
+            return actual == value
+        if op == '!=':
+            return actual != value
+        if op == '<':
+            return actual < value
+        if op == '>':
+            return actual > value
+        if op == '<=':
+            return actual <= value
+        return actual >= value
+
+    def _field(self, member, field):
+        value = member
+        for name in field.split('.'):
+            if type(value) is not dict:
+                return None
+            value = value.get(name)
+        return value
+
+    def _sort_key(self, member, field):
+        value = self._field(member, field)
+        return (value is None, str(value) if type(value) is not int
+                else '%020d' % value)
+
+    ###########################################################################
+    # Tasks
+    ###########################################################################
+    def _task_response(self, name, resource):
+        with self._lock:
+            record = {
+                'uri': '%s/%s' % (uri['task'], uuid.uuid4()),
+                'name': name,
+                'started': time.time(),
+                'duration': self._taskDuration,
+                'failed': bool(self._taskErrorRate) and
+                self._random.random() < self._taskErrorRate,
+                'resource': resource}
+            self._tasks[record['uri']] = record
+            while len(self._tasks) > MaxTasks:
+                self._tasks.popitem(last=False)
+            task = self._render_task(record)
+        return 202, {'Location': record['uri']}, task
+
+    def _render_task(self, record):
+        resource = record['resource'] or {}
+        elapsed = time.time() - record['started']
+        task = {
+            'type': 'TaskResourceV2',
+            'category': 'tasks',
+            'uri': record['uri'],
+            'name': record['name'],
+            'owner': 'Administrator',
+            'created': _timestamp(record['started']),
+            'modified': _timestamp(),
+            'taskErrors': [],
+            'associatedResource': {
+                'resourceUri': resource.get('uri'),
+                'resourceName': resource.get('name'),
+                'resourceCategory': resource.get('category'),
+                'associationType': 'MANAGED_BY'}}
+        if elapsed < record['duration']:
+            task['taskState'] = 'Running'
+            task['taskStatus'] = record['name'] + ' in progress'
+            task['percentComplete'] = int(100 * elapsed / record['duration'])
+        elif record['failed']:
+            task['taskState'] = 'Error'
+            task['taskStatus'] = record['name'] + ' failed'
+            task['percentComplete'] = 100
+            task['taskErrors'] = [self._error('MOCK_TASK_ERROR',
+                                              'Injected task failure')]
+        else:
+            task['taskState'] = 'Completed'
+            task['taskStatus'] = record['name'] + ' completed'
+            task['percentComplete'] = 100
+        return task
+
+    ###########################################################################
+    # Uploads and downloads
+    ###########################################################################
+    def _read_upload(self, req, length, contentType):
+        # Stream the file part through md5 without holding it in memory;
+        # only enough of the tail is kept back to strip the closing boundary
+        boundary = contentType.partition('boundary=')[2].strip('"')
+        marker = b'\r\n--' + boundary.encode('utf-8')
+        keep = len(marker) + 8
+        md5 = hashlib.md5()
+        size = 0
+        name = req.headers.get('uploadfilename')
+        buf = b''
+        started = False
+        remaining = length
+        while remaining > 0:
+            chunk = req.rfile.read(min(remaining, 1048576))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            buf += chunk
+            if not started:
+                end = buf.find(b'\r\n\r\n')
+                if end < 0:
+                    continue
+                match = re.search(br'filename="([^"]*)"', buf[:end])
+                if match and not name:
+                    name = match.group(1).decode('utf-8')
+                buf = buf[end + 4:]
+                started = True
+            if len(buf) > keep:
+                md5.update(buf[:-keep])
+                size += len(buf) - keep
+                buf = buf[-keep:]
+        end = buf.rfind(marker)
+        if end >= 0:
+            buf = buf[:end]
+        md5.update(buf)
+        size += len(buf)
+        self._count('uploadBytes', length)
+        upload = (name, size, md5.hexdigest())
+        with self._lock:
+            self._uploads.append(upload)
+        return upload
+
+    def _uploaded(self, path, upload):
+        name, size, md5 = upload
+        if path == uri['fwUpload']:
+            spp = self.add_resource(uri['fwDrivers'], {
+                'name': name, 'type': 'firmware-baseline',
+                'resourceId': name.replace('.', '_'), 'fileName': name,
+                'fileSize': size, 'md5': md5})
+            return self._task_response('Upload', spp)
+        if path == uri['archive']:
+            return self._task_response('Upload', self._new_backup(name))
+        return 200, None, {'fileName': name, 'fileSize': size, 'md5': md5}
+
+    def _new_backup(self, name=None):
+        with self._lock:
+            backup = self.add_resource(uri['backups'], {
+                'type': 'BACKUP', 'name': name or 'mock-backup',
+                'status': 'SUCCEEDED'})
+            downloadUri = '%s/%s' % (uri['archive'],
+                                     backup['uri'].split('/')[-1])
+            backup = dict(backup, downloadUri=downloadUri)
+            self._collections[uri['backups']][backup['uri']] = backup
+            self._downloads[downloadUri] = self._downloadSize
+        return backup
+
+    def _send_download(self, req, size):
+        # Deterministic content, served from a repeated 64KB block, with
+        # support for "Range: bytes=N-" and "bytes=N-M"
+        if self._block is None:
+            self._block = random.Random(self._seed).getrandbits(
+                8 * 65536).to_bytes(65536, 'little')
+        block = self._block
+        start = 0
+        end = size - 1
+        status = 200
+        match = re.match(r'bytes=(\d+)-(\d*)$', req.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(end, int(match.group(2)))
+            if start >= size or start > end:
+                req.send_response(416)
+                req.send_header('Content-Range', 'bytes */%d' % size)
+                req.send_header('Content-Length', '0')
+                req.end_headers()
+                return
+            status = 206
+        req.send_response(status)
+        req.send_header('Content-Type', 'application/octet-stream')
+        req.send_header('Content-Length', str(end - start + 1))
+        req.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            req.send_header('Content-Range', 'bytes %d-%d/%d'
+                            % (start, end, size))
+        req.end_headers()
+        offset = start
+        while offset <= end:
+            index = offset % len(block)
+            chunk = block[index:index + min(len(block) - index,
+                                            end - offset + 1)]
+            req.wfile.write(chunk)
+            offset += len(chunk)
+        self._count('downloadBytes', end - start + 1)
+
+
+def _main():
+    parser = argparse.ArgumentParser(add_help=True, description='''
+    Run a local mock HP OneView appliance
+
+    Usage: ''')
+    parser.add_argument('-a', dest='host', required=False, default='127.0.0.1',
+                        help='Address to listen on')
+    parser.add_argument('-p', dest='port', type=int, required=False,
+                        default=8443, help='Port to listen on')
+    parser.add_argument('-s', dest='servers', type=int, required=False,
+                        default=0, help='Number of server hardware to create')
+    parser.add_argument('-n', dest='networks', type=int, required=False,
+                        default=0,
+                        help='Number of ethernet networks to create')
+    parser.add_argument('-l', dest='alerts', type=int, required=False,
+                        default=0, help='Number of alerts to create')
+    parser.add_argument('-t', dest='latency', type=float, required=False,
+                        default=0, help='Seconds of latency per request')
+    parser.add_argument('-c', dest='pageSize', type=int, required=False,
+                        default=None, help='Maximum page size')
+    parser.add_argument('-e', dest='errorRate', type=float, required=False,
+                        default=0, help='Fraction of requests to fail')
+    parser.add_argument('-d', dest='taskDuration', type=float,
+                        required=False, default=0,
+                        help='Seconds each task runs for')
+    parser.add_argument('-r', dest='seed', type=int, required=False,
+                        default=None, help='Random seed')
+    args = parser.parse_args()
+    appliance = mock_appliance(args.host, args.port, servers=args.servers,
+                               networks=args.networks, alerts=args.alerts,
+                               latency=args.latency,
+                               maxPageSize=args.pageSize,
+                               errorRate=args.errorRate,
+                               taskDuration=args.taskDuration,
+                               seed=args.seed)
+    appliance.start()
+    print('Mock appliance listening on ' + appliance.get_host())
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        appliance.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(_main())
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
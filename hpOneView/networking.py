@@ -36,6 +36,8 @@ __status__ = 'Development'
 # THE SOFTWARE.
 ###
 
+from concurrent.futures import ThreadPoolExecutor
+
 from hpOneView.common import *
 from hpOneView.connection import *
 from hpOneView.activity import *
@@ -82,24 +84,35 @@ class networking(object):
         return task
 
     def get_ligs(self):
-        return get_members(self._con.get(uri['lig']))
+        return self._con.get_all_members(uri['lig'])
+
+    def iter_ligs(self, count=None):
+        return self._con.iter_members(uri['lig'], count)
 
     def get_lig_by_name(self, ligname):
         return self._con.get_entity_byfield(uri['lig'], 'name', ligname)
 
     def get_interconnect_types(self):
         # get all the supported interconnect types
-        resp = get_members(self._con.get(uri['ictype']))
-        return resp
+        return self._con.get_all_members(uri['ictype'])
+
+    def iter_interconnect_types(self, count=None):
+        return self._con.iter_members(uri['ictype'], count)
 
     def get_lis(self):
-        return get_members(self._con.get(uri['li']))
+        return self._con.get_all_members(uri['li'])
+
+    def iter_lis(self, count=None):
+        return self._con.iter_members(uri['li'], count)
 
     ###########################################################################
     # Connection Templates
     ###########################################################################
     def get_connection_templates(self):
-        return get_members(self._con.get(uri['ct']))
+        return self._con.get_all_members(uri['ct'])
+
+    def iter_connection_templates(self, count=None):
+        return self._con.iter_members(uri['ct'], count)
 
     def update_net_ctvalues(self, xnet, bw={}):
         if not bw:
@@ -137,30 +150,111 @@ class networking(object):
         return task
 
     def get_networksets(self):
-        return get_members(self._con.get(uri['nset']))
+        return self._con.get_all_members(uri['nset'])
+
+    def iter_networksets(self, count=None):
+        return self._con.iter_members(uri['nset'], count)
 
     ###########################################################################
     # Networks
     ###########################################################################
-    def create_enet_networks(self, prefix, vid_start, vid_count, bw={}):
+    def create_enet_networks(self, prefix, vid_start, vid_count, bw={},
+                             workers=8, tout=600, verbose=False):
+        # All or nothing. Up to workers creates are in flight at once, their
+        # tasks are waited on together and the bandwidth of the new networks
+        # is then set in parallel. If anything fails, every network created
+        # here is deleted again and HPOneViewException is raised with the
+        # (resource, error) failures in errors and any networks that could
+        # not be deleted in rollbackErrors. Networks that already existed
+        # are returned as they are and never deleted.
+        xnets = [make_enet_dict('%s%s' % (prefix, vid), vid)
+                 for vid in range(vid_start, vid_start + vid_count)]
+        if not xnets:
+            return []
         enet_list = []
+        created = []
+        tasks = []
+        errors = []
+        executor = ThreadPoolExecutor(max_workers=max(1, min(workers,
+                                                             len(xnets))))
         try:
-            for vid in range(vid_start, vid_start + vid_count):
-                enet_name = '%s%s' % (prefix, vid)
-                enet_list.append(self.create_enet_network(enet_name,
-                                                          vid,
-                                                          bw=bw
-                                                          ))
-        except http.client.HTTPException:
-            # All or nothing
-            for enet in enet_list:
+            try:
+                results = self._map(executor, lambda xnet:
+                                    self.create_network(uri['enet'], xnet,
+                                                        verbose=verbose),
+                                    xnets)
+                for xnet, (result, error) in zip(xnets, results):
+                    if error is not None:
+                        errors.append((xnet, error))
+                        continue
+                    task, entity = result
+                    if task:
+                        created.append(entity)
+                        tasks.append(task)
+                    enet_list.append(entity)
+                # Wait even after a failure, a network whose create is still
+                # running cannot be deleted
+                errors.extend(self._wait_all(tasks, tout, workers, verbose))
+                if bw and not errors:
+                    results = self._map(executor, lambda enet:
+                                        self.update_net_ctvalues(enet, bw),
+                                        created)
+                    tasks = []
+                    for enet, (result, error) in zip(created, results):
+                        if error is not None:
+                            errors.append((enet, error))
+                        elif result[0]:
+                            tasks.append(result[0])
+                    errors.extend(self._wait_all(tasks, tout, workers,
+                                                 verbose))
+            except Exception:
+                # Still all or nothing when something unexpected goes wrong
                 try:
-                    self._con.delete(enet['uri'])
-                except http.client.HTTPException:
+                    self._rollback(executor, created, tout, workers, verbose)
+                except Exception:
                     pass
-            raise HPOneViewException('Could not create one or more networks')
+                raise
+            if errors:
+                rollbackErrors = self._rollback(executor, created, tout,
+                                                workers, verbose)
+                e = HPOneViewException('Could not create %d of %d networks'
+                                       % (len(errors), len(xnets)))
+                e.errors = errors
+                e.rollbackErrors = rollbackErrors
+                raise e
+        finally:
+            executor.shutdown(wait=False)
         return enet_list
 
+    def _map(self, executor, func, items):
+        # (result, error) for each item, in order
+        def call(item):
+            try:
+                return func(item), None
+            except Exception as e:
+                return None, e
+        return list(executor.map(call, items))
+
+    def _rollback(self, executor, created, tout, workers, verbose):
+        # Deletes the networks in created; returns (network, error) for each
+        # that could not be deleted
+        results = self._map(executor, lambda enet:
+                            self._con.delete(enet['uri']), created)
+        rollbackErrors = [(enet, error) for enet, (result, error)
+                          in zip(created, results) if error]
+        rollbackErrors.extend(self._wait_all(
+            [result[0] for result, error in results
+             if error is None and result[0]], tout, workers, verbose))
+        return rollbackErrors
+
+    def _wait_all(self, tasks, tout, workers, verbose):
+        # (task, error) for each task that failed or timed out
+        return [(task, error) for task, error in
+                self._activity.iter_completed_tasks(tasks, tout,
+                                                    workers=workers,
+                                                    verbose=verbose)
+                if error is not None]
+
     def create_enet_network(self, name, vid,
                             purpose='General',
                             smartLink=True,
@@ -189,9 +283,11 @@ class networking(object):
     def create_network(self, uri, xnet, bw={}, verbose=False):
         # throws an exception if there is an error
         body = self._con.conditional_post(uri, xnet)
+        if body and body.get('category') != 'tasks':
+            # contitional_post returned an already existing resource
+            return None, body
         task, entity = self._activity.make_task_entity_tuple(body)
         if not task and not entity:
-            # contitional_post returned an already existing resource
             return None, body
         else:
             # assume we can update CT even if network create task is not cmpelt
@@ -209,16 +305,25 @@ class networking(object):
         return task
 
     def get_enet_networks(self):
-        return get_members(self._con.get(uri['enet']))
+        return self._con.get_all_members(uri['enet'])
+
+    def iter_enet_networks(self, count=None):
+        return self._con.iter_members(uri['enet'], count)
 
     def get_fc_networks(self):
-        return get_members(self._con.get(uri['fcnet']))
+        return self._con.get_all_members(uri['fcnet'])
+
+    def iter_fc_networks(self, count=None):
+        return self._con.iter_members(uri['fcnet'], count)
 
     ###########################################################################
     # Uplink Sets
     ###########################################################################
     def get_uplink_sets(self):
-        return get_members(self._con.get(uri['uplink-sets']))
+        return self._con.get_all_members(uri['uplink-sets'])
+
+    def iter_uplink_sets(self, count=None):
+        return self._con.iter_members(uri['uplink-sets'], count)
 
     def delete_uplink_set(self, uplink_set, blocking=True, verbose=False):
         task, body = self._con.delete(uplink_set['uri'])
@@ -230,7 +335,10 @@ class networking(object):
     # Interconnects
     ###########################################################################
     def get_interconnects(self):
-        return get_members(self._con.get(uri['ic']))
+        return self._con.get_all_members(uri['ic'])
+
+    def iter_interconnects(self, count=None):
+        return self._con.iter_members(uri['ic'], count)
 
     def get_enet_network_by_name(self, nwname):
         return self._con.get_entity_byfield(uri['enet'], 'name', nwname)
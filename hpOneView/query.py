@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+query.py
+~~~~~~~~~~~~
+
+This module builds collection query URIs: filters, sort, paging and fields.
+"""
+
+__title__ = 'query'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+from urllib.parse import quote
+
+
+# Comparison operators understood by the appliance's filter syntax
+FilterOperators = ['=', '!=', '<', '>', '<=', '>=', 'matches']
+
+
+def quote_filter_value(value):
+    # Strings become single quoted literals with embedded quotes doubled;
+    # numbers, booleans and None are written bare
+    if value is None:
+        return 'null'
+    if value is True or value is False:
+        return str(value).lower()
+    if type(value) in (int, float):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def make_filter(field, op, value):
+    # A single "field op value" comparison, e.g. make_filter('name', '=',
+    # "Bob's net") gives "name = 'Bob''s net'"
+    if op not in FilterOperators:
+        raise ValueError('unsupported filter operator: %s' % op)
+    return '%s %s %s' % (field, op, quote_filter_value(value))
+
+
+def any_of(*expressions):
+    # Expressions joined with OR; pass the result to query_builder.filter()
+    return '(' + ' OR '.join(expressions) + ')'
+
+
+def all_of(*expressions):
+    return '(' + ' AND '.join(expressions) + ')'
+
+
+class query_builder(object):
+
+    # Each filter() call adds a separate filter parameter, which the appliance
+    # ANDs together. Everything is URL encoded by build(), so values may
+    # contain spaces, quotes, ampersands and so on.
+    #
+    #   query_builder().filter('name', '=', name).count(1).build(uri['enet'])
+    def __init__(self):
+        self._filters = []
+        self._sort = []
+        self._start = None
+        self._count = None
+        self._fields = []
+
+    def filter(self, field, op=None, value=None):
+        # filter(field, op, value), or filter(expression) for an expression
+        # made with make_filter(), any_of() or all_of()
+        if op is None:
+            self._filters.append(field)
+        else:
+            self._filters.append(make_filter(field, op, value))
+        return self
+
+    def where(self, field, value):
+        return self.filter(field, '=', value)
+
+    def between(self, field, xmin, xmax, inclusive=False):
+        if inclusive:
+            self.filter(field, '>=', xmin)
+            return self.filter(field, '<=', xmax)
+        self.filter(field, '>', xmin)
+        return self.filter(field, '<', xmax)
+
+    def sort(self, field, order='asc'):
+        if order.lower() not in ('asc', 'desc'):
+            raise ValueError('sort order must be asc or desc: %s' % order)
+        self._sort.append('%s:%s' % (field, order.lower()))
+        return self
+
+    def start(self, start):
+        self._start = start
+        return self
+
+    def count(self, count):
+        self._count = count
+        return self
+
+    def fields(self, *fields):
+        # Only the named attributes are returned, on the collections that
+        # support projection; others ignore the parameter
+        self._fields.extend(fields)
+        return self
+
+    def get_params(self):
+        params = []
+        for expression in self._filters:
+            params.append('filter=' + quote('"' + expression + '"', safe="'"))
+        for order in self._sort:
+            params.append('sort=' + quote(order, safe=':'))
+        if self._fields:
+            params.append('fields=' + quote(','.join(self._fields), safe=','))
+        if self._start is not None:
+            params.append('start=%d' % self._start)
+        if self._count is not None:
+            params.append('count=%d' % self._count)
+        return params
+
+    def build(self, uri):
+        params = self.get_params()
+        if not params:
+            return uri
+        separator = '&' if '?' in uri else '?'
+        return uri + separator + '&'.join(params)
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+retry.py
+~~~~~~~~~~~~
+
+Retry policy for transient request failures
+"""
+
+__title__ = 'retry'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import asyncio
+import email.utils
+import http.client
+import random
+import socket
+import time
+
+
+# Methods that can be sent twice without changing the outcome
+IdempotentMethods = ['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS']
+
+# Too many requests, bad gateway, appliance busy/unavailable, gateway timeout
+RetryStatuses = [429, 502, 503, 504]
+
+# Connection resets, timeouts and truncated or missing responses
+RetryErrors = (http.client.BadStatusLine, http.client.IncompleteRead,
+               ConnectionError, socket.timeout, asyncio.IncompleteReadError)
+
+
+def parse_retry_after(value):
+    # Seconds to wait from a Retry-After header (delta-seconds or HTTP
+    # date), or None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class no_retry(object):
+
+    def get_delay(self, method, attempt, elapsed, status=None, error=None,
+                  retryAfter=None):
+        return None
+
+
+class retry_policy(object):
+
+    # Retries idempotent requests that failed with one of statuses or
+    # errors, waiting initial * factor ** attempt seconds (with jitter, at
+    # most maxInterval) in between, or as long as the appliance asks for in
+    # Retry-After (at most maxRetryAfter). A request is sent at most
+    # maxAttempts times and not retried once deadline seconds have passed
+    # since it was first sent. Add 'POST' to methods to retry creates too.
+    def __init__(self, maxAttempts=5, initial=0.5, factor=2, maxInterval=30,
+                 jitter=0.1, deadline=120, methods=IdempotentMethods,
+                 statuses=RetryStatuses, errors=RetryErrors,
+                 maxRetryAfter=120):
+        self._maxAttempts = maxAttempts
+        self._initial = initial
+        self._factor = factor
+        self._maxInterval = maxInterval
+        self._jitter = jitter
+        self._deadline = deadline
+        self._methods = [method.upper() for method in methods]
+        self._statuses = statuses
+        self._errors = errors
+        self._maxRetryAfter = maxRetryAfter
+
+    def is_retryable(self, method, status=None, error=None):
+        if method.upper() not in self._methods:
+            return False
+        if error is not None:
+            return isinstance(error, self._errors)
+        return status in self._statuses
+
+    def get_delay(self, method, attempt, elapsed, status=None, error=None,
+                  retryAfter=None):
+        # Seconds to wait before retrying a request that has been retried
+        # attempt times so far and was first sent elapsed seconds ago, or
+        # None if it should not be retried
+        if attempt + 1 >= self._maxAttempts:
+            return None
+        if not self.is_retryable(method, status, error):
+            return None
+        delay = min(self._maxInterval,
+                    self._initial * self._factor ** attempt)
+        if self._jitter:
+            delay *= 1 + random.uniform(-self._jitter, self._jitter)
+        wait = parse_retry_after(retryAfter)
+        if wait is not None:
+            delay = min(wait, self._maxRetryAfter)
+        if self._deadline is not None and elapsed + delay > self._deadline:
+            return None
+        return max(0, delay)
+
+
+DefaultRetryPolicy = retry_policy()
+
+
+def set_default_retry_policy(policy):
+    global DefaultRetryPolicy
+    DefaultRetryPolicy = policy
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
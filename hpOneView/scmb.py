@@ -0,0 +1,548 @@
+# -*- coding: utf-8 -*-
+
+"""
+scmb.py
+~~~~~~~~~~~~
+
+This module implements a State Change Message Bus (SCMB) listener and a
+task tracker built on it
+"""
+
+__title__ = 'scmb'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import copy
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+from collections import OrderedDict
+
+from hpOneView.common import *
+from hpOneView.activity import TaskCompletedStates
+from hpOneView.exceptions import *
+from hpOneView.inventory import DefaultCollections
+from hpOneView.query import query_builder
+
+
+def download_scmb_certs(con, dirname='.', alias='default'):
+    # Same files the examples/scmb scripts use: the appliance CA and the
+    # RabbitMQ client key pair (which must have been generated already)
+    ca = con.get(uri['ca'])
+    kp = con.get(uri['rabbitmq-kp'] + '/' + alias)
+    files = {'caroot.pem': ca,
+             'client.pem': kp['base64SSLCertData'],
+             'key.pem': kp['base64SSLKeyData']}
+    for name, data in files.items():
+        f = open(os.path.join(dirname, name), 'w+')
+        f.write(data)
+        f.close()
+    os.chmod(os.path.join(dirname, 'key.pem'), 0o600)
+
+
+class scmb(object):
+
+    # One AMQP connection per appliance, consumed on a background thread.
+    # connFactory, if given, is called with no arguments and must return an
+    # object with the py-amqp Connection API (channel(), drain_events(),
+    # close()); it is how a local AMQP stand-in is plugged in.
+    def __init__(self, host, caCert='caroot.pem', clientCert='client.pem',
+                 clientKey='key.pem', connFactory=None, reconnectDelay=5):
+        self._host = host
+        self._caCert = caCert
+        self._clientCert = clientCert
+        self._clientKey = clientKey
+        self._connFactory = connFactory
+        self._reconnectDelay = reconnectDelay
+        self._routes = []
+        self._onConnect = []
+        self._thread = None
+        self._running = False
+        self._connected = threading.Event()
+        self._conn = None
+
+    def subscribe(self, route, callback):
+        # callback is called with the decoded message body
+        self._routes.append((route, callback))
+
+    def add_connect_callback(self, callback):
+        # Called after every (re)connect; messages sent while the bus was
+        # down are lost, so listeners use this to resynchronize
+        self._onConnect.append(callback)
+
+    def is_connected(self):
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='scmb-%s' % self._host)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        self._thread = None
+
+    def _connect(self):
+        if self._connFactory is not None:
+            conn = self._connFactory()
+        else:
+            try:
+                import amqp
+            except ImportError:
+                raise HPOneViewException('The amqp package is required to '
+                                         'use the SCMB')
+            context = ssl.create_default_context(cafile=self._caCert)
+            context.check_hostname = False
+            context.load_cert_chain(self._clientCert, self._clientKey)
+            conn = amqp.Connection(self._host + ':5671',
+                                   login_method='EXTERNAL', ssl=context)
+            if hasattr(conn, 'connect'):
+                conn.connect()
+        channel = conn.channel()
+        qname, _, _ = channel.queue_declare(exclusive=True)
+        for route, callback in self._routes:
+            channel.queue_bind(qname, 'scmb', route)
+        channel.basic_consume(qname, callback=self._dispatch, no_ack=True)
+        return conn
+
+    def _run(self):
+        try:
+            self._serve()
+        finally:
+            # Never report a connection this thread is no longer serving
+            self._connected.clear()
+
+    def _serve(self):
+        while self._running:
+            try:
+                self._conn = self._connect()
+            except Exception:
+                time.sleep(self._reconnectDelay)
+                continue
+            self._connected.set()
+            try:
+                for callback in self._onConnect:
+                    try:
+                        callback()
+                    except Exception:
+                        # A listener that failed to resynchronize must not
+                        # stop the others or the consumer loop; it finds out
+                        # again on the next reconnect
+                        pass
+                while self._running:
+                    try:
+                        self._conn.drain_events(timeout=1)
+                    except socket.timeout:
+                        pass
+            except Exception:
+                pass
+            finally:
+                self._connected.clear()
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+            if self._running:
+                time.sleep(self._reconnectDelay)
+
+    def _dispatch(self, msg):
+        try:
+            body = json.loads(msg.body)
+        except (TypeError, ValueError):
+            return
+        routingKey = ''
+        if hasattr(msg, 'delivery_info') and msg.delivery_info:
+            routingKey = msg.delivery_info.get('routing_key', '')
+        for route, callback in self._routes:
+            if route_matches(route, routingKey):
+                callback(body)
+
+
+def route_matches(route, routingKey):
+    # AMQP topic matching: '*' is one word, '#' is zero or more words. An
+    # unknown routing key matches everything.
+    if not routingKey:
+        return True
+    return _match_words(route.split('.'), routingKey.split('.'))
+
+
+def _match_words(pattern, words):
+    if not pattern:
+        return not words
+    if pattern[0] == '#':
+        return any(_match_words(pattern[1:], words[i:])
+                   for i in range(len(words) + 1))
+    if not words:
+        return False
+    if pattern[0] != '*' and pattern[0] != words[0]:
+        return False
+    return _match_words(pattern[1:], words[1:])
+
+
+class task_tracker(object):
+
+    # Resolves task waiters from scmb.tasks.# messages so that activity does
+    # not need to poll. Any missed message is covered by the caller
+    # re-reading the task every resyncInterval seconds.
+    def __init__(self, listener, route='scmb.tasks.#', resyncInterval=30,
+                 maxTasks=10000):
+        self._listener = listener
+        self._resyncInterval = resyncInterval
+        self._maxTasks = maxTasks
+        self._done = OrderedDict()
+        self._cond = threading.Condition()
+        self._generation = 0
+        listener.subscribe(route, self._on_message)
+        listener.add_connect_callback(self._on_connect)
+
+    def start(self):
+        self._listener.start()
+
+    def stop(self):
+        self._listener.stop()
+
+    def available(self):
+        return self._listener.is_connected()
+
+    def get_resync_interval(self):
+        return self._resyncInterval
+
+    def completed(self, taskUri):
+        # The finished task as reported on the bus, or None
+        with self._cond:
+            return self._done.get(taskUri)
+
+    def wait(self, taskUri, timeout):
+        # Block until the task is reported finished, the bus reconnects (so
+        # the caller should re-read the task) or timeout passes
+        deadline = time.time() + timeout
+        with self._cond:
+            generation = self._generation
+            while taskUri not in self._done:
+                remaining = deadline - time.time()
+                if remaining <= 0 or generation != self._generation:
+                    return None
+                self._cond.wait(remaining)
+            return self._done[taskUri]
+
+    def wait_any(self, timeout):
+        # Block until any task finishes or timeout passes
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def _on_connect(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def _on_message(self, body):
+        resource = body.get('resource')
+        if type(resource) is not dict:
+            return
+        if resource.get('taskState') not in TaskCompletedStates:
+            return
+        taskUri = resource.get('uri') or body.get('resourceUri')
+        if not taskUri:
+            return
+        with self._cond:
+            self._done[taskUri] = resource
+            while len(self._done) > self._maxTasks:
+                self._done.popitem(last=False)
+            self._cond.notify_all()
+
+
+class resource_cache(object):
+
+    # Whole collections held in memory, loaded over REST when the listener
+    # connects and then kept current from scmb change messages (changeType
+    # Created, Updated or Deleted with resourceUri and resource). Messages
+    # that arrive while a collection loads are replayed on top of it, and
+    # older copies never replace newer ones. Gaps are handled by reloading
+    # everything after a reconnect, reading back resources that arrive
+    # without a usable payload and, every verifyInterval seconds on a
+    # background thread, comparing each collection's total with the
+    # appliance's and reloading on a mismatch. While a reload or check has
+    # failed the cache is empty, so lookups go to the appliance, and the
+    # next check loads it again. Create it before the listener is started
+    # so its routes are bound; if mirror (an inventory_mirror) is given
+    # every change is also written there.
+    #
+    #   listener = scmb(host)
+    #   cache = resource_cache(con, listener)
+    #   con.set_resource_cache(cache)
+    #   cache.start()
+    def __init__(self, con, listener, collections=None, verifyInterval=300,
+                 mirror=None):
+        if collections is None:
+            collections = DefaultCollections
+        self._con = con
+        self._listener = listener
+        self._collections = list(collections)
+        self._verifyInterval = verifyInterval
+        self._mirror = mirror
+        self._lock = threading.Lock()
+        # Held for every resync and verify, which run on both the listener
+        # thread and the verify thread
+        self._reloadLock = threading.Lock()
+        self._resources = {}
+        self._loading = {}
+        self._verifier = None
+        self._stopping = threading.Event()
+        self._stats = {'created': 0, 'updated': 0, 'deleted': 0, 'stale': 0,
+                       'gaps': 0, 'fetched': 0, 'reloads': 0}
+        routes = set('scmb.%s.#' % collection.split('/')[-1]
+                     for collection in self._collections)
+        for route in sorted(routes):
+            listener.subscribe(route, self._on_message)
+        listener.add_connect_callback(self._on_connect)
+
+    def start(self):
+        if self._verifier is None:
+            self._stopping.clear()
+            self._verifier = threading.Thread(
+                target=self._verify_loop,
+                name='resource-cache-%s' % self._con.get_host())
+            self._verifier.daemon = True
+            self._verifier.start()
+        self._listener.start()
+
+    def stop(self):
+        self._stopping.set()
+        verifier = self._verifier
+        if verifier is not None:
+            verifier.join()
+        self._verifier = None
+        self._listener.stop()
+
+    def available(self):
+        with self._lock:
+            loaded = len(self._resources) == len(self._collections)
+        return loaded and self._listener.is_connected()
+
+    def holds(self, collection):
+        # True if lookups in collection can be answered from the cache
+        return collection in self._collections and self.available()
+
+    ###########################################################################
+    # Lookups, which all return copies
+    ###########################################################################
+    def get(self, resourceUri):
+        with self._lock:
+            for resources in self._resources.values():
+                if resourceUri in resources:
+                    return copy.deepcopy(resources[resourceUri])
+        return None
+
+    def get_members(self, collection):
+        with self._lock:
+            members = list(self._resources.get(collection, {}).values())
+        return copy.deepcopy(members)
+
+    def find(self, collection, field, value, count=-1):
+        # Members whose field (a dotted path) equals value
+        matches = []
+        with self._lock:
+            for resource in self._resources.get(collection, {}).values():
+                if _field(resource, field) == value:
+                    matches.append(resource)
+                    if len(matches) == count:
+                        break
+        return copy.deepcopy(matches)
+
+    def find_one(self, collection, field, value):
+        matches = self.find(collection, field, value, 1)
+        return matches[0] if matches else None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['resources'] = sum(len(resources) for resources in
+                                     self._resources.values())
+        return stats
+
+    ###########################################################################
+    # Loading and change messages
+    ###########################################################################
+    def resync(self, collection=None):
+        collections = self._collections if collection is None else \
+            [collection]
+        with self._reloadLock:
+            for collection in collections:
+                self._reload(collection)
+
+    def verify(self):
+        # Reloads any collection whose total differs from the local count
+        with self._reloadLock:
+            for collection in self._collections:
+                body = self._con.get(query_builder().start(0).count(1)
+                                     .build(collection))
+                with self._lock:
+                    count = len(self._resources.get(collection, {}))
+                if body and body.get('total') is not None and \
+                        body['total'] != count:
+                    with self._lock:
+                        self._stats['gaps'] += 1
+                    self._reload(collection)
+
+    def _verify_loop(self):
+        while not self._stopping.wait(self._verifyInterval):
+            if not self._listener.is_connected():
+                continue
+            try:
+                if self.available():
+                    self.verify()
+                else:
+                    # An earlier reload failed, try again
+                    self.resync()
+            except Exception:
+                with self._lock:
+                    self._resources.clear()
+
+    def _reload(self, collection):
+        with self._lock:
+            self._loading[collection] = []
+        try:
+            members = self._con.get_all_members(collection)
+        except Exception:
+            with self._lock:
+                del self._loading[collection]
+            raise
+        with self._lock:
+            journal = self._loading.pop(collection)
+            self._resources[collection] = OrderedDict(
+                (member['uri'], member) for member in members)
+            self._stats['reloads'] += 1
+            for body in journal:
+                self._apply(collection, body)
+            members = list(self._resources[collection].values())
+        if self._mirror is not None:
+            self._mirror.replace_collection(self._con.get_host(), collection,
+                                            members)
+
+    def _on_connect(self):
+        # Changes made while the bus was down were missed. If the reload
+        # fails for any reason, drop everything so that available() is
+        # False and lookups go to the appliance until the next reconnect.
+        try:
+            self.resync()
+        except Exception:
+            with self._lock:
+                self._resources.clear()
+
+    def _on_message(self, body):
+        resourceUri = body.get('resourceUri')
+        if not resourceUri:
+            return
+        collection = self._collection_of(resourceUri)
+        if collection is None:
+            return
+        resource = body.get('resource')
+        if body.get('changeType') in ('Created', 'Updated') and \
+                (type(resource) is not dict or
+                 resource.get('uri') != resourceUri):
+            # No usable payload, read the resource back instead
+            try:
+                resource = self._con.get(resourceUri)
+                body = dict(body, resource=resource)
+            except HPOneViewException:
+                body = dict(body, changeType='Deleted')
+            except OSError:
+                return
+            with self._lock:
+                self._stats['fetched'] += 1
+        with self._lock:
+            if collection in self._loading:
+                self._loading[collection].append(body)
+            change = self._apply(collection, body)
+        if change is not None and self._mirror is not None:
+            if change == 'deleted':
+                self._mirror.delete_resource(self._con.get_host(),
+                                             resourceUri)
+            else:
+                self._mirror.put_resource(self._con.get_host(), collection,
+                                          body['resource'])
+
+    def _apply(self, collection, body):
+        # Called with the lock held; returns the change made, if any
+        resources = self._resources.get(collection)
+        if resources is None:
+            return None
+        resourceUri = body['resourceUri']
+        changeType = body.get('changeType')
+        if changeType == 'Deleted':
+            if resources.pop(resourceUri, None) is None:
+                return None
+            self._stats['deleted'] += 1
+            return 'deleted'
+        if changeType not in ('Created', 'Updated'):
+            return None
+        resource = body['resource']
+        current = resources.get(resourceUri)
+        if current is not None and current.get('modified') and \
+                resource.get('modified') and \
+                resource['modified'] < current['modified']:
+            self._stats['stale'] += 1
+            return None
+        if current is None and changeType == 'Updated':
+            # The Created message was missed
+            self._stats['gaps'] += 1
+        resources[resourceUri] = resource
+        change = 'created' if current is None else 'updated'
+        self._stats[change] += 1
+        return change
+
+    def _collection_of(self, resourceUri):
+        for collection in self._collections:
+            if resourceUri.startswith(collection + '/'):
+                return collection
+        return None
+
+
+def _field(resource, field):
+    value = resource
+    for name in field.split('.'):
+        if type(value) is not dict:
+            return None
+        value = value.get(name)
+    return value
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -51,8 +51,10 @@ class security(object):
     # User management and Roles
     ###########################################################################
     def get_users(self):
-        body = self._con.get(uri['users'])
-        return get_members(body)
+        return self._con.get_all_members(uri['users'])
+
+    def iter_users(self, count=None):
+        return self._con.iter_members(uri['users'], count)
 
     def get_user(self, user):
         body = self._con.get(uri['users'] + '/' + user)
@@ -95,8 +97,10 @@ class security(object):
         return body
 
     def get_roles(self):
-        body = self._con.get(uri['roles'])
-        return get_members(body)
+        return self._con.get_all_members(uri['roles'])
+
+    def iter_roles(self, count=None):
+        return self._con.iter_members(uri['roles'], count)
 
     ###########################################################################
     # Certificates
@@ -137,8 +141,11 @@ class security(object):
         return body
 
     def get_active_user_sessions(self):
-        body = self._con.get(uri['activeSessions'])
-        return body
+        members = self._con.get_all_members(uri['activeSessions'])
+        return make_collection_dict(members)
+
+    def iter_active_user_sessions(self, count=None):
+        return self._con.iter_members(uri['activeSessions'], count)
 
     def get_category_actions(self):
         body = self._con.get(uri['category-actions'])
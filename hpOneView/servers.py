@@ -36,38 +36,157 @@ __status__ = 'Development'
 # THE SOFTWARE.
 ###
 
+import copy
+import threading
+import time
+
 from hpOneView.common import *
 from hpOneView.connection import *
 from hpOneView.activity import *
 from hpOneView.exceptions import *
+from hpOneView.query import query_builder
+
+
+class server_index(object):
+
+    # Server hardware indexed by bay, shortModel, name, serial number, uri,
+    # iLO address and enclosure + bay, built from one paged walk of the
+    # collection. It is rebuilt on the next lookup once ttl seconds have
+    # passed (never, if ttl is None) or after invalidate(). Lookups return
+    # copies, so callers may modify what they get back.
+    def __init__(self, con, ttl=None):
+        self._con = con
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._indexes = None
+        self._built = 0
+
+    def set_ttl(self, ttl):
+        self._ttl = ttl
+
+    def refresh(self):
+        indexes = {'position': {}, 'shortModel': {}, 'name': {},
+                   'serialNumber': {}, 'uri': {}, 'mpIpAddress': {},
+                   'enclosureBay': {}}
+        members = []
+        for server in self._con.iter_members(uri['servers']):
+            members.append(server)
+            for field in ('position', 'shortModel', 'name', 'serialNumber',
+                          'uri', 'mpIpAddress'):
+                value = server.get(field)
+                if value is not None:
+                    # The first server wins, as with the old linear scans
+                    indexes[field].setdefault(value, server)
+            key = (server.get('locationUri'), server.get('position'))
+            indexes['enclosureBay'].setdefault(key, server)
+        indexes['members'] = members
+        self._indexes = indexes
+        self._built = time.time()
+
+    def invalidate(self):
+        self._indexes = None
+
+    def is_current(self):
+        return self._indexes is not None and (
+            self._ttl is None or time.time() - self._built < self._ttl)
+
+    def _get_indexes(self):
+        if self.is_current():
+            return self._indexes
+        with self._lock:
+            # Another thread may have refreshed it while this one waited
+            if not self.is_current():
+                self.refresh()
+            return self._indexes
+
+    def _lookup(self, field, value):
+        server = self._get_indexes()[field].get(value)
+        if server is None:
+            return None
+        return copy.deepcopy(server)
+
+    def get_by_bay(self, position):
+        return self._lookup('position', position)
+
+    def get_by_short_model(self, shortModel):
+        return self._lookup('shortModel', shortModel)
+
+    def get_by_name(self, name):
+        return self._lookup('name', name)
+
+    def get_by_serial_number(self, serialNumber):
+        return self._lookup('serialNumber', serialNumber)
+
+    def get_by_uri(self, serverUri):
+        return self._lookup('uri', serverUri)
+
+    def get_by_mp_ip_address(self, mpIpAddress):
+        return self._lookup('mpIpAddress', mpIpAddress)
+
+    def get_by_enclosure_bay(self, enclosureUri, position):
+        return self._lookup('enclosureBay', (enclosureUri, position))
+
+    def get_servers(self):
+        return copy.deepcopy(self._get_indexes()['members'])
+
 
 class servers(object):
 
     def __init__(self, con):
         self._con = con
         self._activity = activity(con)
+        # While this index holds a fresh snapshot (one is taken on first use
+        # through get_server_index()) the lookup helpers answer from it.
+        # It expires after 30s and after any change made through this
+        # object; otherwise the appliance does the filtering.
+        self._index = server_index(con, ttl=30)
 
     ###########################################################################
     # Server Hardware
     ###########################################################################
+    def get_server_index(self):
+        return self._index
+
+    def set_server_index_ttl(self, ttl):
+        self._index.set_ttl(ttl)
+
     def get_server_by_bay(self, baynum):
-        servers = get_members(self._con.get(uri['servers']))
-        for server in servers:
-            if server['position'] == baynum:
-                return server
+        if self._index.is_current():
+            return self._index.get_by_bay(baynum)
+        return self._con.get_entity_byfield(uri['servers'], 'position',
+                                            baynum)
 
     def get_server_by_name(self, name):
-        servers = get_members(self._con.get(uri['servers']))
-        for server in servers:
-            if server['shortModel'] == name:
-                return server
+        # Matches shortModel, as it always has
+        if self._index.is_current():
+            return self._index.get_by_short_model(name)
+        return self._con.get_entity_byfield(uri['servers'], 'shortModel',
+                                            name)
+
+    def get_server_by_serial_number(self, serialNumber):
+        if self._index.is_current():
+            return self._index.get_by_serial_number(serialNumber)
+        return self._con.get_entity_byfield(uri['servers'], 'serialNumber',
+                                            serialNumber)
+
+    def get_server_by_enclosure_bay(self, enclosure, baynum):
+        if self._index.is_current():
+            return self._index.get_by_enclosure_bay(enclosure['uri'], baynum)
+        query = query_builder().where('locationUri', enclosure['uri']) \
+            .where('position', baynum).count(1)
+        return get_member(self._con.get(query.build(uri['servers'])))
 
     def get_servers(self):
-        return get_members(self._con.get(uri['servers']))
+        return self._con.get_all_members(uri['servers'])
+
+    def iter_servers(self, count=None):
+        return self._con.iter_members(uri['servers'], count)
 
     def get_server_hardware_types(self):
-        body = self._con.get(uri['server-hardware-types'])
-        return get_members(body)
+        return self._con.get_all_members(uri['server-hardware-types'])
+
+    def iter_server_hardware_types(self, count=None):
+        return self._con.iter_members(uri['server-hardware-types'], count)
 
     def set_server_powerstate(self, server, state, force=False, blocking=True,
                               verbose=False):
@@ -79,12 +198,14 @@ class servers(object):
             powerRequest = make_powerstate_dict('On', 'MomentaryPress')
         elif state == 'Reset':
             powerRequest = make_powerstate_dict('On', 'Reset')
+        self._index.invalidate()
         task, body = self._con.put(server['uri'] + '/powerState', powerRequest)
         if blocking is True:
             task = self._activity.wait4task(task, tout=60, verbose=verbose)
         return task
 
     def delete_server(self, server, force=False, blocking=True, verbose=False):
+        self._index.invalidate()
         if force:
             task, body = self._con.delete(server['uri'] + '?force=True')
         else:
@@ -94,10 +215,12 @@ class servers(object):
         return task
 
     def update_server(self, server):
+        self._index.invalidate()
         task, body = self._con.put(server['uri'], server)
         return body
 
     def add_server(self, server, blocking=True, verbose=False):
+        self._index.invalidate()
         task, body = self._con.post(uri['servers'], server)
         if blocking is True:
             task = self._activity.wait4task(task, tout=600, verbose=verbose)
@@ -111,6 +234,7 @@ class servers(object):
     # Server Profiles
     ###########################################################################
     def create_server_profile(self, profile, blocking=True, verbose=False):
+        self._index.invalidate()
         # Creating a profile returns a task with no resource uri
         task, body = self._con.post(uri['profiles'], profile)
         if profile['firmware'] is None:
@@ -126,6 +250,7 @@ class servers(object):
         return task
 
     def remove_server_profile(self, profile, force=False, blocking=True, verbose=False):
+        self._index.invalidate()
         if force:
             task, body = self._con.delete(profile['uri'] + '?force=True')
         else:
@@ -135,10 +260,13 @@ class servers(object):
         return task
 
     def get_server_profiles(self):
-        body = self._con.get(uri['profiles'])
-        return get_members(body)
+        return self._con.get_all_members(uri['profiles'])
+
+    def iter_server_profiles(self, count=None):
+        return self._con.iter_members(uri['profiles'], count)
 
     def update_server_profile(self, profile, blocking=True, verbose=False):
+        self._index.invalidate()
         task, body = self._con.put(profile['uri'], profile)
         try:
             if profile['firmware']['firmwareBaselineUri'] is None:
@@ -158,10 +286,13 @@ class servers(object):
     # Enclosures
     ###########################################################################
     def get_enclosures(self):
-        body = self._con.get(uri['enclosures'])
-        return get_members(body)
+        return self._con.get_all_members(uri['enclosures'])
+
+    def iter_enclosures(self, count=None):
+        return self._con.iter_members(uri['enclosures'], count)
 
     def add_enclosure(self, enclosure, blocking=True, verbose=False):
+        self._index.invalidate()
         task, body = self._con.post(uri['enclosures'], enclosure)
         if enclosure['state'] is 'Monitored':
             tout = 600
@@ -180,6 +311,7 @@ class servers(object):
 
     def remove_enclosure(self, enclosure, force=False, blocking=True,
                          verbose=False):
+        self._index.invalidate()
         if force:
             task, body = self._con.delete(enclosure['uri'] + '?force=True')
         else:
@@ -200,7 +332,10 @@ class servers(object):
         self._con.delete(egroup['uri'])
 
     def get_enclosure_groups(self):
-        return get_members(self._con.get(uri['enclosureGroups']))
+        return self._con.get_all_members(uri['enclosureGroups'])
+
+    def iter_enclosure_groups(self, count=None):
+        return self._con.iter_members(uri['enclosureGroups'], count)
 
     def update_enclosure_group(self, enclosuregroup):
         task, body = self._con.put(enclosuregroup['uri'], enclosuregroup)
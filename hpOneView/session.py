@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""
+session.py
+~~~~~~~~~~~~
+
+This module keeps appliance login sessions in a file shared between processes.
+"""
+
+__title__ = 'session'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import binascii
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to locking within the process only
+    fcntl = None
+
+
+# Default location of the session file
+DefaultSessionFile = os.path.join('~', '.hpOneView', 'sessions.json')
+
+
+class session_cache(object):
+
+    # Session IDs per appliance and user, and the API versions each appliance
+    # supports, stored in a JSON file readable only by its owner
+    # so that short-lived processes can skip logging in and the version
+    # probe. A session is reused until it has been idle for idleTimeout
+    # seconds (keep this below the appliance's own idle timeout); one the
+    # appliance has dropped earlier is replaced by connection on the first
+    # 401. Every read-modify-write of the file holds an exclusive lock on
+    # path + '.lock'. Passwords are never stored; sessions are keyed on a
+    # salted hash of the password so that a wrong or changed one logs in
+    # afresh instead of picking up the earlier session.
+    #
+    #   cache = session_cache()
+    #   con = connection(host, sessionCache=cache)
+    #   con.login(cred)
+    def __init__(self, path=DefaultSessionFile, idleTimeout=3600,
+                 versionTimeout=86400):
+        self._path = os.path.expanduser(path)
+        self._idleTimeout = idleTimeout
+        self._versionTimeout = versionTimeout
+        self._lock = threading.Lock()
+        self._digests = {}
+
+    def get_path(self):
+        return self._path
+
+    def get_session(self, host, cred):
+        # The cached session ID, or None
+        def lookup(data):
+            key = self._key(data, host, cred)
+            entry = data['sessions'].get(key)
+            if entry is None:
+                return None, False
+            if time.time() - entry['used'] >= self._idleTimeout:
+                del data['sessions'][key]
+                return None, True
+            entry['used'] = time.time()
+            return entry['sessionID'], True
+        return self._update(lookup)
+
+    def put_session(self, host, cred, sessionID):
+        def store(data):
+            key = self._key(data, host, cred)
+            data['sessions'][key] = {'sessionID': sessionID,
+                                     'created': time.time(),
+                                     'used': time.time()}
+            return None, True
+        self._update(store)
+
+    def remove_session(self, host, cred, sessionID=None):
+        # Forgets the session, only if it is still sessionID when given
+        def remove(data):
+            key = self._key(data, host, cred)
+            entry = data['sessions'].get(key)
+            if entry is None or (sessionID is not None and
+                                 entry['sessionID'] != sessionID):
+                return None, False
+            del data['sessions'][key]
+            return None, True
+        self._update(remove)
+
+    def get_version_info(self, host):
+        # What host's /rest/version returned (minimumVersion and
+        # currentVersion), or None
+        def lookup(data):
+            entry = data['versions'].get(host)
+            if entry is None or \
+                    time.time() - entry['checked'] >= self._versionTimeout:
+                return None, False
+            return entry['version'], False
+        return self._update(lookup)
+
+    def put_version_info(self, host, version):
+        def store(data):
+            data['versions'][host] = {'version': version,
+                                      'checked': time.time()}
+            return None, True
+        self._update(store)
+
+    def clear(self):
+        def clear(data):
+            data['sessions'] = {}
+            data['versions'] = {}
+            return None, True
+        self._update(clear)
+
+    def _key(self, data, host, cred):
+        # One session per appliance, directory, user and password
+        if type(data.get('salt')) is not str:
+            data['salt'] = binascii.hexlify(os.urandom(16)).decode()
+        digest = self._digest(data['salt'], cred.get('password', ''))
+        return '%s|%s|%s|%s' % (host, cred.get('authLoginDomain', ''),
+                                cred.get('userName', ''), digest)
+
+    def _digest(self, salt, password):
+        # PBKDF2 of the password with the file's salt, computed once per
+        # process since it is deliberately slow
+        if (salt, password) not in self._digests:
+            self._digests[(salt, password)] = binascii.hexlify(
+                hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+                                    salt.encode('ascii'), 100000)).decode()
+        return self._digests[(salt, password)]
+
+    def _update(self, func):
+        # Runs func(data) with the file locked; func returns (value,
+        # changed) and the file is rewritten when changed is true
+        with self._lock:
+            directory = os.path.dirname(self._path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            lockFile = os.open(self._path + '.lock',
+                               os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lockFile, fcntl.LOCK_EX)
+                data = self._read()
+                value, changed = func(data)
+                if changed:
+                    self._write(data)
+                return value
+            finally:
+                os.close(lockFile)
+
+    def _read(self):
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            data = {}
+        if type(data) is not dict:
+            data = {}
+        data.setdefault('sessions', {})
+        data.setdefault('versions', {})
+        return data
+
+    def _write(self, data):
+        # Written to a private temporary file and renamed, so readers never
+        # see a partial file and the session IDs are never world readable
+        fd, tempPath = tempfile.mkstemp(
+            dir=os.path.dirname(self._path) or '.', prefix='.sessions')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.chmod(tempPath, 0o600)
+            os.replace(tempPath, self._path)
+        except Exception:
+            try:
+                os.remove(tempPath)
+            except OSError:
+                pass
+            raise
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -92,8 +92,10 @@ class settings(object):
         return body
 
     def get_spps(self):
-        body = self._con.get(uri['fwDrivers'])
-        return get_members(body)
+        return self._con.get_all_members(uri['fwDrivers'])
+
+    def iter_spps(self, count=None):
+        return self._con.iter_members(uri['fwDrivers'], count)
 
     def get_health_status(self):
         body = self._con.get(uri['healthStatus'])
@@ -116,12 +118,12 @@ class settings(object):
                 request)
         return body
 
-    def download_support_dump(self, dumpInfo):
-        body = self._con.get(dumpInfo['uri'])
-        f = open(dumpInfo['uri'].split('/')[-1], 'wb')
-        f.write(body)
-        f.close()
-        return
+    def download_support_dump(self, dumpInfo, progress=None, checksum=None,
+                              resume=False):
+        return self._con.download(dumpInfo['uri'],
+                                  dumpInfo['uri'].split('/')[-1],
+                                  progress=progress, checksum=checksum,
+                                  resume=resume)
 
     def generate_backup(self, blocking=True, verbose=False):
         resp, body = self._con.do_http('POST', uri['backups'], None)
@@ -135,12 +137,12 @@ class settings(object):
         backup = self._con.get(backupResource['resourceUri'])
         return backup
 
-    def download_backup(self, backup):
-        body = self._con.get(backup['downloadUri'])
-        f = open(backup['downloadUri'].split('/')[-1] + '.bkp', 'wb')
-        f.write(body)
-        f.close()
-        return
+    def download_backup(self, backup, progress=None, checksum=None,
+                        resume=False):
+        return self._con.download(backup['downloadUri'],
+                                  backup['downloadUri'].split('/')[-1] +
+                                  '.bkp', progress=progress,
+                                  checksum=checksum, resume=resume)
 
     def upload_backup(self, path, name, verbose=False, blocking=True):
         response, body = self._con.post_multipart(uri['archive'], '',
@@ -181,8 +183,10 @@ class settings(object):
         return body
 
     def get_licenses(self):
-        body = self._con.get(uri['licenses'])
-        return get_members(body)
+        return self._con.get_all_members(uri['licenses'])
+
+    def iter_licenses(self, count=None):
+        return self._con.iter_members(uri['licenses'], count)
 
     def add_license(self, licenseKey):
         request = {
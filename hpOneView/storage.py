@@ -74,12 +74,17 @@ class storage(object):
         return task
 
     def get_storage_systems(self):
-        body = get_members(self._con.get(uri['storage-systems']))
-        return body
+        return self._con.get_all_members(uri['storage-systems'])
+
+    def iter_storage_systems(self, count=None):
+        return self._con.iter_members(uri['storage-systems'], count)
 
     def get_storage_pools(self):
-        body = self._con.get(uri['storage-pools'])
-        return body
+        members = self._con.get_all_members(uri['storage-pools'])
+        return make_collection_dict(members)
+
+    def iter_storage_pools(self, count=None):
+        return self._con.iter_members(uri['storage-pools'], count)
 
     def add_storage_pool(self, name, storageSystemUri, blocking=True,
                          verbose=False):
@@ -94,42 +99,47 @@ class storage(object):
                 return server
         return task
 
-    # Temporarly modify the headers passed for POST and DELTE on storage volume
+    # Pass extra headers for POST and DELTE on storage volume
     # templates in order to work around a bug. Without these headers the call
     # cause a NullPointerException on the appliance and a 400 gets returned.
     def add_storage_volume_template(self, volTemplate, verbose=False):
-        ori_headers = self._con._headers
-        self._con._headers.update({'Accept-Language': 'en'})
-        self._con._headers.update({'Accept-Encoding': 'deflate'})
-        task, body = self._con.post(uri['vol-templates'], volTemplate)
-        self._con._headers = ori_headers
+        headers = {'Accept-Language': 'en', 'Accept-Encoding': 'deflate'}
+        task, body = self._con.post(uri['vol-templates'], volTemplate,
+                                    headers)
         return body
 
-    # Temporarly modify the headers passed for POST and DELTE on storage volume
+    # Pass extra headers for POST and DELTE on storage volume
     # templates in order to work around a bug. Without these headers the call
     # cause a NullPointerException on the appliance and a 400 gets returned.
     def remove_storage_volume_template(self, volTemplate, blocking=True,
                                        verbose=False):
-        ori_headers = self._con._headers
-        self._con._headers.update({'Accept-Language': 'en'})
-        task, body = self._con.delete(volTemplate['uri'])
-        self._con._headers = ori_headers
+        headers = {'Accept-Language': 'en'}
+        task, body = self._con.delete(volTemplate['uri'], headers)
         if blocking is True:
             task = self._activity.wait4task(task, tout=600, verbose=verbose)
             return body
         return task
 
     def get_attachable_volumes(self):
-        body = self._con.get(uri['attachable-volumes'])
-        return body
+        members = self._con.get_all_members(uri['attachable-volumes'])
+        return make_collection_dict(members)
+
+    def iter_attachable_volumes(self, count=None):
+        return self._con.iter_members(uri['attachable-volumes'], count)
 
     def get_storage_volume_templates(self):
-        body = self._con.get(uri['vol-templates'])
-        return body
+        members = self._con.get_all_members(uri['vol-templates'])
+        return make_collection_dict(members)
+
+    def iter_storage_volume_templates(self, count=None):
+        return self._con.iter_members(uri['vol-templates'], count)
 
     def get_connectable_storage_volume_templates(self):
-        body = self._con.get(uri['connectable-vol'])
-        return body
+        members = self._con.get_all_members(uri['connectable-vol'])
+        return make_collection_dict(members)
+
+    def iter_connectable_storage_volume_templates(self, count=None):
+        return self._con.iter_members(uri['connectable-vol'], count)
 
     def add_storage_volume(self, volume, blocking=True,
                            verbose=False):
@@ -150,7 +160,10 @@ class storage(object):
         return task
 
     def get_storage_volumes(self):
-        body = self._con.get(uri['storage-volumes'])
-        return body
+        members = self._con.get_all_members(uri['storage-volumes'])
+        return make_collection_dict(members)
+
+    def iter_storage_volumes(self, count=None):
+        return self._con.iter_members(uri['storage-volumes'], count)
 
 # vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+throttle.py
+~~~~~~~~~~~~
+
+Client-side rate and concurrency limits for an appliance
+"""
+
+__title__ = 'throttle'
+__version__ = '0.0.1'
+__copyright__ = '(C) Copyright 2012-2014 Hewlett-Packard Development ' \
+                ' Company, L.P.'
+__license__ = 'MIT'
+__status__ = 'Development'
+
+###
+# (C) Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+ReadMethods = ['GET', 'HEAD', 'OPTIONS']
+
+
+def verb_class(method):
+    # 'read' for methods that only fetch, 'write' for everything else
+    if method.upper() in ReadMethods:
+        return 'read'
+    return 'write'
+
+
+class token_bucket(object):
+
+    # rate tokens per second, holding at most burst. Callers reserve a
+    # token and then sleep for the returned time, so the lock is never held
+    # while waiting and waiters are served in order.
+    def __init__(self, rate, burst=None):
+        self._rate = float(rate)
+        self._burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token and returns the seconds to wait before using it
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens +
+                               (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+
+class throttle(object):
+
+    # Limits the requests a connection (or several connections to the same
+    # appliance sharing one throttle) sends. Reads (GET) and writes (POST,
+    # PUT, PATCH, DELETE) each have an optional rate in requests per second
+    # with a burst size and an optional limit on requests in flight;
+    # maxInFlight limits both together. None means unlimited.
+    #
+    #   con.set_throttle(throttle(maxInFlight=16, readRate=50,
+    #                             writeRate=5, writeInFlight=4))
+    def __init__(self, maxInFlight=None, readRate=None, readBurst=None,
+                 readInFlight=None, writeRate=None, writeBurst=None,
+                 writeInFlight=None):
+        self._buckets = {'read': None, 'write': None}
+        if readRate:
+            self._buckets['read'] = token_bucket(readRate, readBurst)
+        if writeRate:
+            self._buckets['write'] = token_bucket(writeRate, writeBurst)
+        self._slots = {'read': None, 'write': None, 'all': None}
+        if readInFlight:
+            self._slots['read'] = threading.Semaphore(readInFlight)
+        if writeInFlight:
+            self._slots['write'] = threading.Semaphore(writeInFlight)
+        if maxInFlight:
+            self._slots['all'] = threading.Semaphore(maxInFlight)
+        self._lock = threading.Lock()
+        self._inFlight = {'read': 0, 'write': 0}
+        self._asyncWaiters = deque()
+        self.reset_stats()
+
+    def acquire(self, method):
+        # Blocks until a request may be sent; returns the seconds waited.
+        # Every acquire must be followed by release(method).
+        kind = verb_class(method)
+        start = time.monotonic()
+        bucket = self._buckets[kind]
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay:
+                time.sleep(delay)
+        # The class slot is taken first so that requests waiting for it do
+        # not hold one of the shared slots
+        for slot in (self._slots[kind], self._slots['all']):
+            if slot is not None:
+                slot.acquire()
+        return self._acquired(kind, time.monotonic() - start)
+
+    async def acquire_async(self, method):
+        # acquire() for coroutines; waits without blocking the event loop
+        kind = verb_class(method)
+        start = time.monotonic()
+        bucket = self._buckets[kind]
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        for slot in (self._slots[kind], self._slots['all']):
+            if slot is not None:
+                await self._acquire_slot_async(slot)
+        return self._acquired(kind, time.monotonic() - start)
+
+    async def _acquire_slot_async(self, slot):
+        # A blocking acquire would stall the loop, and waiting in an executor
+        # thread could starve the loop's own DNS lookups. Instead wait to be
+        # woken by release(), checking again every 50ms in case the slot
+        # was freed for a waiter on a different slot.
+        loop = asyncio.get_event_loop()
+        while not slot.acquire(blocking=False):
+            waiter = (loop, loop.create_future())
+            with self._lock:
+                self._asyncWaiters.append(waiter)
+            try:
+                if slot.acquire(blocking=False):
+                    return
+                await asyncio.wait([waiter[1]], timeout=0.05)
+            finally:
+                with self._lock:
+                    try:
+                        self._asyncWaiters.remove(waiter)
+                    except ValueError:
+                        pass
+
+    def release(self, method):
+        kind = verb_class(method)
+        with self._lock:
+            self._inFlight[kind] -= 1
+        for slot in (self._slots['all'], self._slots[kind]):
+            if slot is not None:
+                slot.release()
+        if self._asyncWaiters:
+            with self._lock:
+                waiter = None
+                if self._asyncWaiters:
+                    waiter = self._asyncWaiters.popleft()
+            if waiter is not None:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._wake, future)
+
+    def _wake(self, future):
+        if not future.done():
+            future.set_result(None)
+
+    def _acquired(self, kind, waited):
+        with self._lock:
+            self._inFlight[kind] += 1
+            stats = self._stats[kind]
+            stats['requests'] += 1
+            if waited > 0.0005:
+                stats['throttled'] += 1
+                stats['throttledSeconds'] += waited
+                stats['maxThrottledSeconds'] = max(
+                    stats['maxThrottledSeconds'], waited)
+            stats['peakInFlight'] = max(stats['peakInFlight'],
+                                        self._inFlight[kind])
+        return waited
+
+    def get_stats(self):
+        # Per verb class: requests, how many were held back and for how
+        # long in total and at most, and the peak number in flight
+        with self._lock:
+            stats = {}
+            for kind, values in list(self._stats.items()):
+                stats[kind] = dict(values, inFlight=self._inFlight[kind])
+            return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+            for kind in ('read', 'write'):
+                self._stats[kind] = {'requests': 0, 'throttled': 0,
+                                     'throttledSeconds': 0.0,
+                                     'maxThrottledSeconds': 0.0,
+                                     'peakInFlight': 0}
+
+# vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
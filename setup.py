@@ -29,4 +29,5 @@ setup(name='hpOneView',
       url='http://hp.com/go/OneViewCommunity',
       author='Hewlett-Packard Development Company L.P.',
       license='MIT',
-      packages=['hpOneView'])
+      packages=['hpOneView'],
+      package_data={'hpOneView': ['mockappliance.pem']})